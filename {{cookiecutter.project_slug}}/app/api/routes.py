@@ -1,31 +1,113 @@
 """API routes for the Portia FastAPI integration."""
 
+import asyncio
+import contextlib
+import json
+import math
+import threading
 import time
-from typing import Any
+from collections.abc import AsyncIterator, Awaitable, Callable
+from datetime import UTC, datetime
+from typing import Annotated, Any, TypeVar
 
-from fastapi import APIRouter, HTTPException, status
+from fastapi import APIRouter, HTTPException, Query, Request, Response, status
+from fastapi.responses import PlainTextResponse, StreamingResponse
 from loguru import logger
 from portia import Config, PlanRunState, Portia, ToolRegistry
 from portia.end_user import EndUser
+from portia.errors import PlanRunNotFoundError
+from portia.model import GenerativeModel
+from portia.plan_run import PlanRun
+from portia.prefixed_uuid import PlanRunUUID
+from starlette.background import BackgroundTask
 
-from ..config import get_settings
+from ..cassette import CassetteGenerativeModel, CassetteTool, get_cassette
+from ..config import LLMMode, StorageBackend, get_settings
+from ..executor import DEFAULT_LANE, ExecutorSaturatedError, get_executor
+from ..fake_llm import build_fake_model
+from ..hooks import build_execution_hooks, cancellation_scope, observe_run
+from ..http_clients import pooled_model
+from ..idempotency import IdempotencyKeyReusedError, get_idempotency_store
+from ..jobs import get_job_store
+from ..metrics import (
+    PLAN_RUNS_RATE_LIMITED,
+    PLAN_RUNS_REJECTED,
+    PLAN_RUNS_REPLAYED,
+    SERIALIZATION_DURATION,
+    record_plan_run,
+    set_labelled_tool_ids,
+    skip_planning,
+    time_plan_run,
+)
+from ..model_router import build_routing_model
+from ..plan_cache import get_plan_cache, make_plan_cache_key
+from ..profiling import (
+    RunProfile,
+    get_profile_sampler,
+    get_profile_store,
+    profile_run,
+    sample_current_thread,
+)
+from ..rate_limit import QuotaDecision, QuotaExceededError, QuotaLease, get_rate_limiter
 from ..schemas import (
+    BatchRunItem,
     ClarificationResponse,
+    PortiaBatchRunRequest,
+    PortiaBatchRunResponse,
+    PortiaClarificationRequest,
+    PortiaRunListResponse,
     PortiaRunRequest,
     PortiaRunResponse,
     PortiaStatusResponse,
+    RunSummary,
 )
 from ..schemas.response import PlanRunState as ResponsePlanRunState
+from ..singleflight import get_single_flight, request_fingerprint
+from ..storage import BoundedInMemoryStorage, PlanRunFilter, SQLiteStorage
+from ..tool_catalog import UnknownToolsError, etag_matches, get_tool_catalog, get_tool_index
 {%- if cookiecutter.include_example_tools == 'y' %}
-from ..tools import custom_tools
+from ..tools import custom_tools, deterministic_tool_ids
+{%- else %}
+from ..tools import deterministic_tool_ids
 {%- endif %}
 
 router = APIRouter()
 
+T = TypeVar("T")
+
+# Header that asks for a request to be profiled; "?profile=true" works too
+PROFILE_HEADER = "X-Portia-Profile"
+
+# Header that makes POST /run safe to retry, and the header marking a replayed response
+IDEMPOTENCY_HEADER = "Idempotency-Key"
+IDEMPOTENT_REPLAYED_HEADER = "Idempotent-Replayed"
+MAX_IDEMPOTENCY_KEY_LENGTH = 255
+
+# Page sizes for GET /runs
+DEFAULT_RUN_PAGE_SIZE = 50
+MAX_RUN_PAGE_SIZE = 500
+
 # Global Portia instance (initialized at startup)
 _portia_instance: Portia | None = None
 
 
+def _live_model(config: Config, config_kwargs: dict[str, Any]) -> GenerativeModel:
+    """Build the model that calls the LLM providers, for LIVE and RECORD modes."""
+    settings = get_settings()
+    if settings.llm_routing_enabled:
+        model: GenerativeModel = build_routing_model(**config_kwargs)
+    else:
+        # Send the configured provider's calls through its shared connection pool
+        model = pooled_model(config.get_default_model(), config)
+
+    if settings.llm_mode == LLMMode.RECORD:
+        logger.warning(
+            f"LLM_MODE is RECORD: LLM and tool calls are saved to {settings.cassette_path}"
+        )
+        return CassetteGenerativeModel(get_cassette(), model)
+    return model
+
+
 def get_portia() -> Portia:
     """Get the global Portia instance."""
     global _portia_instance
@@ -33,37 +115,77 @@ def get_portia() -> Portia:
     if _portia_instance is None:
         settings = get_settings()
 
-        # Validate that we have at least one LLM API key
-        if not settings.has_llm_api_key():
+        # The fake LLM and cassette replay need no API key; otherwise validate that we have one
+        model_config: dict[str, Any] = {}
+        if settings.llm_mode == LLMMode.FAKE:
+            model_config["default_model"] = build_fake_model()
+            logger.warning("LLM_MODE is FAKE: plan runs get scripted responses, not real LLM calls")
+        elif settings.llm_mode == LLMMode.REPLAY:
+            model_config["default_model"] = CassetteGenerativeModel(get_cassette())
+            logger.warning(
+                f"LLM_MODE is REPLAY: plan runs are answered from {settings.cassette_path}"
+            )
+        elif not settings.has_llm_api_key():
             raise HTTPException(
                 status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
                 detail="No LLM API key configured. Please set OPENAI_API_KEY or another supported LLM API key.",
             )
 
         # Create Portia configuration
-        config = Config.from_default(
-            default_log_level=settings.portia_log_level,
-            storage_class=settings.get_portia_storage_class(),
-        )
+        config_kwargs: dict[str, Any] = {
+            "default_log_level": settings.portia_log_level,
+            "storage_class": settings.get_portia_storage_class(),
+        }
+        config = Config.from_default(**config_kwargs, **model_config)
+        if not model_config:
+            model = _live_model(config, config_kwargs)
+            config = Config.from_default(**config_kwargs, default_model=model)
+        {%- if cookiecutter.include_example_tools == 'y' %}
+
+        tools = custom_tools
+        {%- else %}
+
+        # No custom tools yet - add your tools to this registry
+        tools = ToolRegistry([])
+        {%- endif %}
+        if settings.llm_mode in (LLMMode.RECORD, LLMMode.REPLAY):
+            tools = ToolRegistry(
+                [CassetteTool.wrap(tool, get_cassette()) for tool in tools.get_tools()]
+            )
 
         # Initialize Portia with tools
-        {%- if cookiecutter.include_example_tools == 'y' %}
         _portia_instance = Portia(
             config=config,
-            tools=custom_tools,
+            tools=tools,
+            execution_hooks=build_execution_hooks(),
         )
+        {%- if cookiecutter.include_example_tools == 'y' %}
 
-        logger.info(f"Initialized Portia with {len(custom_tools.get_tools())} tools")
+        logger.info(f"Initialized Portia with {len(tools.get_tools())} tools")
         {%- else %}
-        # Initialize without custom tools - you can add your own tools later
-        _portia_instance = Portia(
-            config=config,
-            tools=ToolRegistry([]),  # Empty registry - add your tools here
-        )
 
         logger.info("Initialized Portia with no tools - add your custom tools in app/tools/")
         {%- endif %}
 
+        # Install the storage backends this service provides on top of Portia's
+        storage_backend = settings.get_storage_backend()
+        if storage_backend == StorageBackend.SQLITE:
+            _portia_instance.storage = SQLiteStorage(settings.sqlite_storage_path)
+        elif storage_backend == StorageBackend.MEMORY:
+            # Bound what the in-memory storage keeps over the life of the process
+            _portia_instance.storage = BoundedInMemoryStorage(
+                max_entries=settings.memory_storage_max_entries,
+                max_bytes=settings.memory_storage_max_bytes,
+                ttl=settings.memory_storage_ttl,
+            )
+
+        # Label metrics with registered tool IDs only, not whatever a plan names
+        set_labelled_tool_ids(tool.id for tool in _portia_instance.tool_registry.get_tools())
+
+        # Index and serialize the tools up front rather than on the first request
+        get_tool_catalog(_portia_instance.tool_registry)
+        get_tool_index(_portia_instance.tool_registry)
+
     return _portia_instance
 
 
@@ -74,13 +196,15 @@ async def get_status() -> PortiaStatusResponse:
     portia = get_portia()
 
     # Get available tool IDs
-    tool_ids = [tool.id for tool in portia.tool_registry.get_tools()]
+    catalog = get_tool_catalog(portia.tool_registry)
 
     return PortiaStatusResponse(
         status="healthy",
         version=settings.app_version,
         portia_version="0.4.3",  # You might want to get this dynamically
-        available_tools=tool_ids,
+        available_tools=list(catalog.tool_ids),
+        executor=get_executor().stats(),
+        plan_cache=get_plan_cache().stats(),
     )
 
 
@@ -97,19 +221,15 @@ def _filter_tools(portia: Portia, requested_tools: list[str] | None) -> ToolRegi
     """Filter tools based on request."""
     if not requested_tools:
         return portia.tool_registry
-    
-    filtered_tools = [
-        tool for tool in portia.tool_registry.get_tools()
-        if tool.id in requested_tools
-    ]
-
-    if not filtered_tools:
-        raise HTTPException(
-            status_code=status.HTTP_400_BAD_REQUEST,
-            detail=f"None of the requested tools found: {requested_tools}",
-        )
 
-    return ToolRegistry(filtered_tools)
+    try:
+        return get_tool_index(portia.tool_registry).filter(requested_tools)
+    except UnknownToolsError as e:
+        if len(e.unknown) == len(e.requested):
+            detail = f"None of the requested tools found: {requested_tools}"
+        else:
+            detail = f"Unknown tool IDs: {e.unknown}"
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=detail) from e
 
 
 def _process_plan_run_result(plan_run) -> tuple[Any, str | None, list[ClarificationResponse]]:
@@ -155,27 +275,73 @@ def _get_tools_used(plan_run) -> list[str]:
     return tools_used
 
 
-@router.post("/run", response_model=PortiaRunResponse)
-async def run_query(request: PortiaRunRequest) -> PortiaRunResponse:
-    """
-    Execute a query using the Portia SDK.
+def _planning_model_name(portia: Portia) -> str:
+    """Get the name of the model used for planning, for plan cache keys."""
+    try:
+        return str(portia.config.get_planning_model())
+    except Exception:
+        return "default"
 
-    This endpoint accepts a query and optional tool list, executes it using
-    the Portia SDK, and returns the result or any clarifications needed.
+
+def _run_with_plan_cache(
+    portia: Portia, request: PortiaRunRequest, tools: list[Any], end_user: EndUser | None
+) -> tuple[PlanRun, bool]:
+    """Run a request, reusing a cached plan when one exists.
+
+    Returns the plan run and whether the plan came from the cache. Runs on
+    the plan-run pool, as both planning and execution block.
     """
-    start_time = time.time()
+    plan_cache = get_plan_cache()
+    input_names = list(request.plan_run_inputs or {})
+    key = make_plan_cache_key(
+        request.query, [tool.id for tool in tools], input_names, _planning_model_name(portia)
+    )
 
-    try:
-        portia = get_portia()
-        tools_to_use = _filter_tools(portia, request.tools)
+    plan = plan_cache.get(key)
+    plan_cache_hit = plan is not None
+    if plan is None:
+        plan = portia.plan(
+            request.query,
+            tools=tools,
+            end_user=end_user,
+            plan_inputs=input_names or None,
+        )
+        plan_cache.put(key, plan)
+    else:
+        # Reusing a plan takes no planning time; don't pull the histogram towards zero
+        skip_planning()
+
+    plan_run = portia.run_plan(plan, end_user=end_user, plan_run_inputs=request.plan_run_inputs)
+    return plan_run, plan_cache_hit
 
-        # Create end user if provided
-        end_user = None
-        if request.user_id:
-            end_user = EndUser(external_id=request.user_id)
 
-        # Execute the query
-        logger.info(f"Executing query: {request.query}")
+def _can_coalesce(request: PortiaRunRequest, tools_to_use: ToolRegistry) -> bool:
+    """Check whether a run may share the result of an identical in-flight run."""
+    settings = get_settings()
+    if not (settings.singleflight_enabled and request.coalesce):
+        return False
+
+    allowed = deterministic_tool_ids.union(settings.singleflight_tool_ids)
+    return all(tool.id in allowed for tool in tools_to_use.get_tools())
+
+
+def _run_plan(
+    portia: Portia,
+    request: PortiaRunRequest,
+    tools_to_use: ToolRegistry,
+    end_user: EndUser | None,
+) -> tuple[PlanRun, str]:
+    """Plan and execute a request, returning the plan run and its plan cache status.
+
+    Blocks, so it runs on the plan-run pool.
+    """
+    with time_plan_run(), sample_current_thread():
+        if get_settings().plan_cache_enabled and request.use_plan_cache:
+            plan_run, plan_cache_hit = _run_with_plan_cache(
+                portia, request, tools_to_use.get_tools(), end_user
+            )
+            return plan_run, "hit" if plan_cache_hit else "miss"
+
         plan_run = portia.run(
             query=request.query,
             tools=tools_to_use.get_tools() if tools_to_use else None,
@@ -183,25 +349,317 @@ async def run_query(request: PortiaRunRequest) -> PortiaRunResponse:
             plan_run_inputs=request.plan_run_inputs,
             # structured_output_schema=request.structured_output_schema,  # Type mismatch, commented out
         )
+        return plan_run, "bypass"
+
+
+def _effective_timeout(request: PortiaRunRequest) -> float:
+    """Get a request's deadline in seconds; requests may only lower the server limit."""
+    limit = get_settings().request_timeout
+    return min(request.timeout, limit) if request.timeout else limit
+
+
+async def _execute_run(
+    request: PortiaRunRequest,
+    tools_to_use: ToolRegistry | None = None,
+    *,
+    coalesce: bool = True,
+) -> PortiaRunResponse:
+    """Execute a run request on the plan-run pool and build its response.
+
+    ``tools_to_use`` may be passed when the caller has already filtered the
+    registry for ``request.tools``. Identical concurrent requests that only use
+    deterministic tools share one execution unless ``coalesce`` is false.
+    """
+    portia = get_portia()
+    if tools_to_use is None:
+        tools_to_use = _filter_tools(portia, request.tools)
+
+    if not (coalesce and _can_coalesce(request, tools_to_use)):
+        return await _execute_plan_run(portia, request, tools_to_use)
+
+    registry = tools_to_use
+    response, shared = await get_single_flight().do(
+        request_fingerprint(request),
+        lambda: _execute_plan_run(portia, request, registry),
+    )
+    if shared:
+        response = response.model_copy(deep=True)
+        response.metadata["coalesced"] = True
+    return response
+
+
+def _overloaded(detail: str) -> HTTPException:
+    """Count a plan run shed under load and build its 503 error."""
+    PLAN_RUNS_REJECTED.inc()
+    return HTTPException(
+        status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+        detail=detail,
+        headers={"Retry-After": str(get_settings().overload_retry_after)},
+    )
+
+
+def _check_capacity() -> None:
+    """Reject a request up front if its plan run could not be queued."""
+    if get_executor().saturated:
+        raise _overloaded("Server is at capacity, retry later")
+
+
+def _quota_headers(decision: QuotaDecision) -> dict[str, str]:
+    """Describe a user's remaining budget in response headers."""
+    headers = {
+        "X-RateLimit-Limit": str(decision.limit),
+        "X-RateLimit-Remaining": str(decision.remaining),
+        "X-Concurrency-Limit": str(decision.max_concurrent),
+        "X-Concurrency-Remaining": str(max(0, decision.max_concurrent - decision.running)),
+    }
+    if not decision.allowed:
+        headers["Retry-After"] = str(max(1, math.ceil(decision.retry_after)))
+    return headers
+
+
+async def _acquire_quota(
+    user_id: str | None, response: Response | None = None
+) -> QuotaLease | None:
+    """Take one of ``user_id``'s plan runs, or raise 429 if they have none left.
+
+    Returns the lease on the user's concurrent slot, to hand to
+    ``_release_quota`` when the run ends, or None for requests without a
+    ``user_id``, which are not limited. The backend is called from a worker
+    thread, as the SQLite backend can wait on other processes' locks.
+    """
+    if not (get_settings().rate_limit_enabled and user_id):
+        return None
+
+    try:
+        lease, decision = await get_rate_limiter().aacquire(user_id)
+    except QuotaExceededError as e:
+        PLAN_RUNS_RATE_LIMITED.labels(reason=e.decision.reason).inc()
+        raise HTTPException(
+            status_code=status.HTTP_429_TOO_MANY_REQUESTS,
+            detail=str(e),
+            headers=_quota_headers(e.decision),
+        ) from e
+
+    if response is not None:
+        response.headers.update(_quota_headers(decision))
+    return lease
+
+
+async def _release_quota(lease: QuotaLease | None) -> None:
+    """Give back a slot taken by ``_acquire_quota``; releasing twice does nothing."""
+    if lease is not None:
+        # Finish the release even if the caller is being cancelled
+        await asyncio.shield(lease.arelease())
+
+
+async def _await_plan_run(
+    func: Callable[..., T], *args: Any, timeout: float, lane: str = DEFAULT_LANE
+) -> T:
+    """Run blocking plan-run work on the plan-run pool with a deadline.
+
+    The work waits for a free worker in the scheduling ``lane``. Raises
+    ``TimeoutError`` once ``timeout`` seconds pass. The plan run is then told
+    to stop at its next step, as it is when the caller is cancelled.
+    Raises a 503 ``HTTPException`` if the plan-run queue is full.
+    """
+    cancel_event = threading.Event()
+    try:
+        with cancellation_scope(cancel_event):
+            return await asyncio.wait_for(
+                get_executor().run(func, *args, lane=lane), timeout=timeout
+            )
+    except ExecutorSaturatedError as e:
+        raise _overloaded(f"Server is at capacity, retry later: {e}") from e
+    except (TimeoutError, asyncio.CancelledError):
+        # Cancellation also covers callers that went away (e.g. a streaming
+        # client disconnected)
+        cancel_event.set()
+        raise
+
+
+def _timed_out_response(
+    start_time: float, timeout: float, tools_available: int, plan_run_id: str | None = None
+) -> PortiaRunResponse:
+    """Build the response for a plan run that missed its deadline."""
+    record_plan_run(ResponsePlanRunState.FAILED.value, time.time() - start_time, timed_out=True)
+    return PortiaRunResponse(
+        status=ResponsePlanRunState.FAILED,
+        plan_run_id=plan_run_id,
+        error=f"Plan run timed out after {timeout:g}s",
+        metadata={
+            "execution_time": round(time.time() - start_time, 2),
+            "timed_out": True,
+            "timeout": timeout,
+            "tools_available": tools_available,
+        },
+    )
+
+
+def _build_run_response(
+    plan_run: PlanRun, start_time: float, tools_available: int, **metadata: Any
+) -> PortiaRunResponse:
+    """Record a finished plan run and turn it into a response."""
+    serialization_start = time.perf_counter()
+    result, error, clarifications = _process_plan_run_result(plan_run)
+    execution_time = time.time() - start_time
+    tools_used = _get_tools_used(plan_run)
+    run_status = _convert_plan_run_state(plan_run.state)
+    record_plan_run(run_status.value, execution_time, tools_used)
+
+    response = PortiaRunResponse(
+        status=run_status,
+        result=result,
+        clarifications=clarifications,
+        plan_run_id=str(plan_run.id) if hasattr(plan_run, "id") else "unknown",
+        error=error,
+        metadata={
+            "execution_time": round(execution_time, 2),
+            "tools_used": list(set(tools_used)),
+            "tools_available": tools_available,
+            **metadata,
+        },
+    )
+    SERIALIZATION_DURATION.observe(time.perf_counter() - serialization_start)
+    return response
+
+
+async def _execute_plan_run(
+    portia: Portia, request: PortiaRunRequest, tools_to_use: ToolRegistry
+) -> PortiaRunResponse:
+    """Run a request's plan on the plan-run pool and build its response."""
+    start_time = time.time()
+
+    # Create end user if provided
+    end_user = None
+    if request.user_id:
+        end_user = EndUser(external_id=request.user_id)
+
+    # Execute the query on the plan-run pool so the event loop stays responsive.
+    # On timeout the run is told to stop at its next step and the caller gets
+    # a FAILED response straight away.
+    logger.info(f"Executing query: {request.query}")
+    timeout = _effective_timeout(request)
+    tools_available = len(tools_to_use.get_tools())
+    try:
+        plan_run, plan_cache_status = await _await_plan_run(
+            _run_plan,
+            portia,
+            request,
+            tools_to_use,
+            end_user,
+            timeout=timeout,
+            lane=request.priority.value,
+        )
+    except TimeoutError:
+        logger.warning(f"Plan run timed out after {timeout:g}s: {request.query}")
+        return _timed_out_response(start_time, timeout, tools_available)
+    except HTTPException:
+        # Shed before it started, so not a failed plan run
+        raise
+    except Exception:
+        record_plan_run(ResponsePlanRunState.FAILED.value, time.time() - start_time)
+        raise
+
+    return _build_run_response(plan_run, start_time, tools_available, plan_cache=plan_cache_status)
+
+
+def _wants_profile(http_request: Request) -> bool:
+    """Check whether profiling is allowed and the request asked for it."""
+    settings = get_settings()
+    if not (settings.debug or settings.profiling_enabled):
+        return False
+    flag = http_request.headers.get(PROFILE_HEADER) or http_request.query_params.get("profile")
+    return flag is not None and flag.lower() in ("1", "true", "yes")
+
+
+async def _execute_profiled_run(
+    request: PortiaRunRequest, http_request: Request, response: Response
+) -> PortiaRunResponse:
+    """Execute a request while sampling its plan run, and store the profile."""
+    profile = RunProfile(interval=get_settings().profiling_interval)
+    with profile_run(profile):
+        # A coalesced run would be sampled in another request's context
+        run_response = await _execute_run(request, coalesce=False)
 
-        # Process results
-        result, error, clarifications = _process_plan_run_result(plan_run)
-        execution_time = time.time() - start_time
-        tools_used = _get_tools_used(plan_run)
+    get_profile_store().add(profile)
+    profile_url = str(http_request.url_for("get_profile", profile_id=profile.id))
+    run_response.metadata["profile_id"] = profile.id
+    run_response.metadata["profile_url"] = profile_url
+    response.headers["X-Profile-Id"] = profile.id
+    return run_response
 
-        return PortiaRunResponse(
-            status=_convert_plan_run_state(plan_run.state),
-            result=result,
-            clarifications=clarifications,
-            plan_run_id=str(plan_run.id) if hasattr(plan_run, "id") else "unknown",
-            error=error,
-            metadata={
-                "execution_time": round(execution_time, 2),
-                "tools_used": list(set(tools_used)),
-                "tools_available": len(tools_to_use.get_tools()),
-            },
+
+def _replayable(run_response: PortiaRunResponse) -> bool:
+    """Check whether a response may be replayed for its idempotency key.
+
+    Failed and timed-out runs are not kept, so a client retrying after a
+    deadline runs the query again instead of getting the failure back.
+    """
+    return run_response.status != ResponsePlanRunState.FAILED and not run_response.metadata.get(
+        "timed_out"
+    )
+
+
+async def _execute_idempotent_run(
+    request: PortiaRunRequest,
+    key: str,
+    response: Response,
+    execute: Callable[[], Awaitable[PortiaRunResponse]],
+) -> PortiaRunResponse:
+    """Execute a request at most once per idempotency key.
+
+    A repeat of a key returns the stored response, or waits for the plan run
+    that the first request started. Keys are scoped to the requesting user.
+    """
+    if not key or len(key) > MAX_IDEMPOTENCY_KEY_LENGTH:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=f"{IDEMPOTENCY_HEADER} must be 1 to {MAX_IDEMPOTENCY_KEY_LENGTH} characters",
+        )
+
+    try:
+        run_response, replayed = await get_idempotency_store().run(
+            f"{request.user_id or ''}:{key}",
+            request_fingerprint(request),
+            execute,
+            keep=_replayable,
         )
+    except IdempotencyKeyReusedError as e:
+        raise HTTPException(status_code=status.HTTP_409_CONFLICT, detail=str(e)) from e
+
+    if replayed:
+        PLAN_RUNS_REPLAYED.inc()
+        response.headers[IDEMPOTENT_REPLAYED_HEADER] = "true"
+    return run_response
+
+
+@router.post("/run", response_model=PortiaRunResponse)
+async def run_query(
+    request: PortiaRunRequest, http_request: Request, response: Response
+) -> PortiaRunResponse:
+    """
+    Execute a query using the Portia SDK.
 
+    This endpoint accepts a query and optional tool list, executes it using
+    the Portia SDK, and returns the result or any clarifications needed.
+    Send an ``Idempotency-Key`` header to make retries safe: a repeat of the
+    key returns the first request's response instead of running again.
+    """
+
+    async def execute() -> PortiaRunResponse:
+        lease = await _acquire_quota(request.user_id, response)
+        try:
+            if _wants_profile(http_request) and get_profile_sampler().should_profile():
+                return await _execute_profiled_run(request, http_request, response)
+            return await _execute_run(request)
+        finally:
+            await _release_quota(lease)
+
+    try:
+        key = http_request.headers.get(IDEMPOTENCY_HEADER)
+        if key is None:
+            return await execute()
+        return await _execute_idempotent_run(request, key, response, execute)
     except HTTPException:
         raise
     except Exception as e:
@@ -212,26 +670,484 @@ async def run_query(request: PortiaRunRequest) -> PortiaRunResponse:
         ) from e
 
 
-@router.get("/tools")
-async def get_tools() -> list[dict[str, Any]]:
-    """Get detailed information about available tools."""
+@router.get("/profiles/{profile_id}", response_class=PlainTextResponse)
+async def get_profile(profile_id: str) -> PlainTextResponse:
+    """Download a stored plan-run profile as collapsed stacks.
+
+    Each line is a semicolon-separated stack, outermost frame first, followed
+    by its sample count. Open it in speedscope or feed it to flamegraph.pl.
+    """
+    profile = get_profile_store().get(profile_id)
+    if profile is None:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail=f"Profile not found: {profile_id}",
+        )
+
+    return PlainTextResponse(
+        profile.to_collapsed(),
+        headers={
+            "Content-Disposition": f'attachment; filename="{profile_id}.collapsed"',
+            "X-Profile-Samples": str(profile.sample_count),
+        },
+    )
+
+
+async def _execute_batch_item(
+    index: int,
+    request: PortiaRunRequest,
+    tools_to_use: ToolRegistry | HTTPException,
+    semaphore: asyncio.Semaphore,
+    user_slots: asyncio.Semaphore | None,
+) -> BatchRunItem:
+    """Execute one batch item, reporting failures on the item instead of raising.
+
+    The item waits for one of its user's ``user_slots`` before taking a batch
+    slot, so a user's items never hold more quota leases than the user may.
+    """
+    async with user_slots or contextlib.nullcontext(), semaphore:
+        try:
+            if isinstance(tools_to_use, HTTPException):
+                raise tools_to_use
+            lease = await _acquire_quota(request.user_id)
+            try:
+                response = await _execute_run(request, tools_to_use)
+            finally:
+                await _release_quota(lease)
+            return BatchRunItem(index=index, status_code=status.HTTP_200_OK, response=response)
+        except HTTPException as e:
+            return BatchRunItem(index=index, status_code=e.status_code, error=str(e.detail))
+        except Exception as e:
+            logger.exception(f"Error executing batch item {index}")
+            return BatchRunItem(
+                index=index,
+                status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+                error=f"Error executing query: {e!s}",
+            )
+
+
+@router.post(
+    "/run/batch",
+    response_model=PortiaBatchRunResponse,
+    responses={200: {"content": {"application/x-ndjson": {}}}},
+)
+async def run_batch(batch: PortiaBatchRunRequest) -> PortiaBatchRunResponse | StreamingResponse:
+    """
+    Execute many queries in one request.
+
+    Items run concurrently, up to ``concurrency`` at a time. A failing item is
+    reported in its own result and does not fail the batch. With ``stream``
+    set, results are written as NDJSON lines in completion order; otherwise
+    they are returned together in request order.
+    """
+    settings = get_settings()
+    if len(batch.requests) > settings.batch_max_size:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=f"Batch of {len(batch.requests)} items exceeds the maximum of {settings.batch_max_size}",
+        )
+
+    start_time = time.time()
     portia = get_portia()
 
-    tools_info = []
-    for tool in portia.tool_registry.get_tools():
-        tool_info: dict[str, Any] = {
-            "id": tool.id,
-            "name": tool.name,
-            "description": tool.description,
+    # Filter the registry once per distinct tool set rather than once per item
+    registries: dict[tuple[str, ...], ToolRegistry | HTTPException] = {}
+    for request in batch.requests:
+        key = tuple(sorted(request.tools or ()))
+        if key not in registries:
+            try:
+                registries[key] = _filter_tools(portia, request.tools)
+            except HTTPException as e:
+                registries[key] = e
+
+    concurrency = min(
+        batch.concurrency or settings.batch_max_concurrency, settings.batch_max_concurrency
+    )
+    semaphore = asyncio.Semaphore(concurrency)
+    # Each item takes its own quota lease; keep a user's items within their concurrency quota
+    user_slots: dict[str, asyncio.Semaphore] = {}
+    if settings.rate_limit_enabled:
+        max_concurrent = get_rate_limiter().policy.max_concurrent
+        user_slots = {
+            request.user_id: asyncio.Semaphore(max_concurrent)
+            for request in batch.requests
+            if request.user_id
         }
+    tasks = [
+        asyncio.create_task(
+            _execute_batch_item(
+                index,
+                request,
+                registries[tuple(sorted(request.tools or ()))],
+                semaphore,
+                user_slots.get(request.user_id or ""),
+            )
+        )
+        for index, request in enumerate(batch.requests)
+    ]
+
+    if batch.stream:
+
+        async def lines() -> AsyncIterator[str]:
+            try:
+                for next_item in asyncio.as_completed(tasks):
+                    item = await next_item
+                    yield item.model_dump_json() + "\n"
+            finally:
+                # Stop outstanding items if the client disconnects
+                for task in tasks:
+                    task.cancel()
+
+        return StreamingResponse(lines(), media_type="application/x-ndjson")
+
+    results = await asyncio.gather(*tasks)
+    return PortiaBatchRunResponse(
+        results=list(results),
+        metadata={
+            "execution_time": round(time.time() - start_time, 2),
+            "succeeded": sum(1 for item in results if item.response is not None),
+            "failed": sum(1 for item in results if item.response is None),
+            "concurrency": concurrency,
+        },
+    )
+
+
+def _format_sse(event: str, data: Any) -> str:
+    """Format a Server-Sent Events message."""
+    return f"event: {event}\ndata: {json.dumps(data, default=str)}\n\n"
+
+
+@router.post(
+    "/run/stream",
+    response_class=StreamingResponse,
+    responses={200: {"content": {"text/event-stream": {}}}},
+)
+async def stream_run(request: PortiaRunRequest) -> StreamingResponse:
+    """
+    Execute a query and stream its progress as Server-Sent Events.
 
-        # Add schema information if available
-        if hasattr(tool, "args_schema") and tool.args_schema:
+    Events are ``started``, ``plan`` once the plan is created, ``step_started``
+    and ``step_completed`` for each step with its ``tool_id``, one
+    ``clarification`` per outstanding clarification, and finally ``complete``
+    with the full ``PortiaRunResponse`` (or ``error`` if the run raised).
+    """
+    # Reject bad configuration, unknown tools, overload and exhausted quotas
+    # before the stream starts
+    _filter_tools(get_portia(), request.tools)
+    _check_capacity()
+    lease = await _acquire_quota(request.user_id)
+
+    loop = asyncio.get_running_loop()
+    queue: asyncio.Queue[tuple[str, Any] | None] = asyncio.Queue()
+
+    def emit(event: str, data: Any) -> None:
+        # Hooks fire on the plan-run worker thread
+        loop.call_soon_threadsafe(queue.put_nowait, (event, data))
+
+    async def execute() -> None:
+        try:
+            # Coalesced runs would not deliver step events to this stream
             try:
-                tool_info["args_schema"] = tool.args_schema.model_json_schema()
-            except Exception:
-                tool_info["args_schema"] = None
+                with observe_run(emit):
+                    response = await _execute_run(request, coalesce=False)
+            finally:
+                await _release_quota(lease)
+            for clarification in response.clarifications:
+                queue.put_nowait(("clarification", clarification.model_dump(mode="json")))
+            queue.put_nowait(("complete", response.model_dump(mode="json")))
+        except HTTPException as e:
+            queue.put_nowait(("error", {"detail": e.detail}))
+        except Exception as e:
+            logger.exception("Error executing streamed query")
+            queue.put_nowait(("error", {"detail": f"Error executing query: {e!s}"}))
+        finally:
+            queue.put_nowait(None)
+
+    async def events() -> AsyncIterator[str]:
+        task: asyncio.Task[None] | None = None
+        try:
+            yield _format_sse("started", {"status": ResponsePlanRunState.IN_PROGRESS.value})
+            task = asyncio.create_task(execute())
+            while (item := await queue.get()) is not None:
+                yield _format_sse(*item)
+        finally:
+            # Stop waiting on the plan run if the client disconnects, and free
+            # the slot now rather than when the run (if it started) gives up
+            if task is not None:
+                task.cancel()
+            await _release_quota(lease)
+
+    # A client that disconnects while an event is being sent can leave the
+    # generator suspended, so the response releases the slot too
+    return StreamingResponse(
+        events(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+        background=BackgroundTask(_release_quota, lease),
+    )
+
+
+@router.post("/runs", response_model=PortiaRunResponse, status_code=status.HTTP_202_ACCEPTED)
+async def submit_run(
+    request: PortiaRunRequest, http_request: Request, response: Response
+) -> PortiaRunResponse:
+    """
+    Submit a query for asynchronous execution.
+
+    The plan run executes in the background and this endpoint returns at once
+    with a ``NOT_STARTED`` response. Poll ``GET /runs/{plan_run_id}`` with the
+    returned ``plan_run_id`` until the status is no longer ``IN_PROGRESS``.
+    """
+    # Reject bad configuration, unknown tools, overload and exhausted quotas
+    # before accepting the job
+    _filter_tools(get_portia(), request.tools)
+    _check_capacity()
+    lease = await _acquire_quota(request.user_id, response)
+
+    job = get_job_store().submit(request, _execute_run)
+    if lease is not None and job.task is not None:
+        # Release when the job ends, including jobs cancelled before they start
+        loop, release = asyncio.get_running_loop(), lease.release
+        job.task.add_done_callback(lambda _task: loop.run_in_executor(None, release))
+    response.headers["Location"] = str(http_request.url_for("get_run", plan_run_id=job.id))
+    return job.response
+
+
+def _to_timestamp(value: datetime | None) -> float | None:
+    if value is None:
+        return None
+    # Treat times without a zone as UTC, matching the times in the response
+    if value.tzinfo is None:
+        value = value.replace(tzinfo=UTC)
+    return value.timestamp()
+
+
+@router.get("/runs", response_model=PortiaRunListResponse)
+async def list_runs(
+    user_id: Annotated[str | None, Query(description="Only runs for this end user")] = None,
+    state: Annotated[
+        ResponsePlanRunState | None, Query(description="Only runs in this state")
+    ] = None,
+    created_after: Annotated[
+        datetime | None, Query(description="Only runs created at or after this time")
+    ] = None,
+    created_before: Annotated[
+        datetime | None, Query(description="Only runs created before this time")
+    ] = None,
+    tool: Annotated[str | None, Query(description="Only runs whose plan uses this tool")] = None,
+    cursor: Annotated[str | None, Query(description="next_cursor from the previous page")] = None,
+    limit: Annotated[int, Query(ge=1, le=MAX_RUN_PAGE_SIZE)] = DEFAULT_RUN_PAGE_SIZE,
+) -> PortiaRunListResponse:
+    """
+    List stored plan runs, newest first.
+
+    Returns compact summaries rather than full plan runs. Pass the returned
+    ``next_cursor`` as ``cursor`` to get the next page. Needs the ``MEMORY``
+    or ``SQLITE`` storage class.
+    """
+    storage = get_portia().storage
+    if not isinstance(storage, BoundedInMemoryStorage | SQLiteStorage):
+        raise HTTPException(
+            status_code=status.HTTP_501_NOT_IMPLEMENTED,
+            detail="Listing plan runs needs the MEMORY or SQLITE storage class",
+        )
+
+    filters = PlanRunFilter(
+        end_user_id=user_id,
+        state=PlanRunState(state.value) if state is not None else None,
+        created_after=_to_timestamp(created_after),
+        created_before=_to_timestamp(created_before),
+        tool_id=tool,
+    )
+    try:
+        page = await asyncio.to_thread(storage.list_plan_run_summaries, filters, limit, cursor)
+    except ValueError as e:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=str(e)) from e
+
+    return PortiaRunListResponse(
+        runs=[
+            RunSummary(
+                plan_run_id=summary.plan_run_id,
+                plan_id=summary.plan_id,
+                user_id=summary.end_user_id,
+                status=_convert_plan_run_state(PlanRunState(summary.state)),
+                query=summary.query,
+                created_at=datetime.fromtimestamp(summary.created_at, tz=UTC),
+                updated_at=datetime.fromtimestamp(summary.updated_at, tz=UTC),
+            )
+            for summary in page.summaries
+        ],
+        next_cursor=page.next_cursor,
+    )
+
+
+@router.get("/runs/{plan_run_id}", response_model=PortiaRunResponse)
+async def get_run(plan_run_id: str) -> PortiaRunResponse:
+    """Get the current state of a run submitted with ``POST /runs``."""
+    job = get_job_store().get(plan_run_id)
+    if job is None:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail=f"Plan run not found: {plan_run_id}",
+        )
+
+    return job.response
+
+
+def _plan_run_user_id(portia: Portia, plan_run_id: str) -> str | None:
+    """Get the ``user_id`` a stored plan run was started with, if any.
+
+    Blocks on storage, so it runs in a worker thread. Unknown plan runs give
+    None; resuming them reports the 404.
+    """
+    try:
+        plan_run = portia.storage.get_plan_run(PlanRunUUID.from_string(plan_run_id))
+    except (PlanRunNotFoundError, ValueError):
+        return None
+    if plan_run.end_user_id == _ANONYMOUS_END_USER:
+        return None
+    return plan_run.end_user_id
+
+
+def _resume_plan_run(
+    portia: Portia, plan_run_id: str, clarification_id: str, value: Any
+) -> PlanRun:
+    """Resolve a clarification and resume the stored plan run where it stopped.
+
+    Blocks, so it runs on the plan-run pool. The plan is not regenerated and
+    steps that already finished are not run again.
+    """
+    try:
+        plan_run = portia.storage.get_plan_run(PlanRunUUID.from_string(plan_run_id))
+    except (PlanRunNotFoundError, ValueError) as e:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail=f"Plan run not found: {plan_run_id}",
+        ) from e
+
+    if plan_run.state != PlanRunState.NEED_CLARIFICATION:
+        raise HTTPException(
+            status_code=status.HTTP_409_CONFLICT,
+            detail=f"Plan run is not waiting for clarification: {plan_run.state.value}",
+        )
+
+    clarification = next(
+        (
+            outstanding
+            for outstanding in plan_run.get_outstanding_clarifications()
+            if str(outstanding.id) == clarification_id
+        ),
+        None,
+    )
+    if clarification is None:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail=f"Clarification not found: {clarification_id}",
+        )
+
+    plan_run = portia.resolve_clarification(clarification, value, plan_run)
+    if plan_run.get_outstanding_clarifications():
+        # Wait until every clarification for the current step is answered
+        return plan_run
+
+    with time_plan_run(planning=False), sample_current_thread():
+        return portia.resume(plan_run)
+
+
+# Plan runs currently being resumed, so one run is never resumed twice at once
+_resuming_plan_runs: set[str] = set()
+
+# The end user Portia gives plan runs started without a user_id
+_ANONYMOUS_END_USER = "portia:default_user"
+
+
+@router.post(
+    "/runs/{plan_run_id}/clarifications/{clarification_id}",
+    response_model=PortiaRunResponse,
+)
+async def resolve_clarification(
+    plan_run_id: str,
+    clarification_id: str,
+    request: PortiaClarificationRequest,
+    response: Response,
+) -> PortiaRunResponse:
+    """
+    Answer a clarification and resume the plan run that raised it.
+
+    The stored plan run continues from the step that asked for clarification,
+    without planning again. The response has the same shape as ``POST /run``
+    and may contain further clarifications. Resuming counts against the rate
+    limit and concurrency quota of the user the run was started for, and
+    waits for a worker in the request's ``priority`` lane.
+    """
+    job_store = get_job_store()
+    job = job_store.get(plan_run_id)
+    if job is not None and job.response.plan_run_id not in (None, job.id):
+        # Accept the job ID handed out by POST /runs as well
+        plan_run_id = job.response.plan_run_id
+
+    if plan_run_id in _resuming_plan_runs:
+        raise HTTPException(
+            status_code=status.HTTP_409_CONFLICT,
+            detail=f"Plan run is already being resumed: {plan_run_id}",
+        )
+
+    portia = get_portia()
+    tools_available = len(portia.tool_registry.get_tools())
+    timeout = float(get_settings().request_timeout)
+    start_time = time.time()
+
+    _resuming_plan_runs.add(plan_run_id)
+    lease = None
+    try:
+        user_id = await asyncio.to_thread(_plan_run_user_id, portia, plan_run_id)
+        lease = await _acquire_quota(user_id, response)
+        plan_run = await _await_plan_run(
+            _resume_plan_run,
+            portia,
+            plan_run_id,
+            clarification_id,
+            request.response,
+            timeout=timeout,
+            lane=request.priority.value,
+        )
+    except TimeoutError:
+        logger.warning(f"Resumed plan run timed out after {timeout:g}s: {plan_run_id}")
+        return _timed_out_response(start_time, timeout, tools_available, plan_run_id)
+    except HTTPException:
+        raise
+    except Exception as e:
+        record_plan_run(ResponsePlanRunState.FAILED.value, time.time() - start_time)
+        logger.exception("Error resuming plan run")
+        raise HTTPException(
+            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+            detail=f"Error resuming plan run: {e!s}",
+        ) from e
+    finally:
+        _resuming_plan_runs.discard(plan_run_id)
+        await _release_quota(lease)
+
+    run_response = _build_run_response(plan_run, start_time, tools_available, resumed=True)
+    if job is not None and job.done:
+        # Keep GET /runs/{plan_run_id} in step with the resumed run
+        job.response = run_response.model_copy(
+            update={"metadata": {**run_response.metadata, "job_id": job.id}}
+        )
+    return run_response
+
+
+@router.get("/tools", response_model=list[dict[str, Any]])
+async def get_tools(request: Request) -> Response:
+    """Get detailed information about available tools.
+
+    The catalog is serialized once per tool registry. Clients that send the
+    returned ETag in ``If-None-Match`` get ``304 Not Modified`` until it changes.
+    """
+    portia = get_portia()
+    catalog = get_tool_catalog(portia.tool_registry)
+    headers = {"ETag": catalog.etag, "Cache-Control": "no-cache"}
 
-        tools_info.append(tool_info)
+    if etag_matches(request.headers.get("if-none-match"), catalog.etag):
+        return Response(status_code=status.HTTP_304_NOT_MODIFIED, headers=headers)
 
-    return tools_info
+    return Response(content=catalog.body, media_type="application/json", headers=headers)
@@ -0,0 +1,370 @@
+"""Record and replay of LLM and tool calls.
+
+With ``LLM_MODE=RECORD`` every LLM call and tool call made while running plans
+is passed through to the real model or tool and appended to a cassette: a
+JSON Lines file. With ``LLM_MODE=REPLAY`` the same calls are
+answered from the cassette without network access or delay, so recorded
+traffic can be replayed at full speed and slow runs reproduced exactly.
+The time each call took is recorded too, and with
+``CASSETTE_REPLAY_LATENCY=true`` replay waits that long before answering.
+
+Calls are matched by a hash of what was sent. UUIDs and timestamps are
+blanked out first, so the IDs of a new plan run do not prevent a match.
+Identical calls are answered in the order they were recorded, repeating the
+last answer once the recording runs out.
+
+Each call is written as one line and flushed, so a recording process that
+dies leaves at most a partial last line. That line is ignored on replay and
+cut off before recording appends to the file again.
+"""
+
+import asyncio
+import hashlib
+import json
+import os
+import re
+import threading
+import time
+from collections import defaultdict, deque
+from collections.abc import Callable, Mapping, Sequence
+from pathlib import Path
+from typing import Any, BinaryIO, TypeVar
+
+from langchain_core.language_models.chat_models import BaseChatModel
+from langchain_core.messages import BaseMessage, message_to_dict, messages_from_dict
+from langchain_core.outputs import ChatGeneration, ChatResult
+from langchain_core.runnables import Runnable
+from portia import ToolHardError, ToolSoftError
+from portia.model import GenerativeModel, Message
+from portia.tool import Tool, ToolRunContext
+from pydantic import BaseModel, ConfigDict, Field, SkipValidation
+
+from .config import LLMMode, get_settings
+
+T = TypeVar("T")
+BaseModelT = TypeVar("BaseModelT", bound=BaseModel)
+
+# Values that change from run to run and must not affect matching
+_VOLATILE = re.compile(
+    r"[0-9a-f]{8}-[0-9a-f]{4}-[0-9a-f]{4}-[0-9a-f]{4}-[0-9a-f]{12}"
+    r"|\d{4}-\d{2}-\d{2}[T ]\d{2}:\d{2}:\d{2}(?:\.\d+)?(?:Z|[+-]\d{2}:?\d{2})?",
+    re.IGNORECASE,
+)
+
+# Tool errors that are raised again with their own type on replay
+_TOOL_ERRORS: dict[str, type[Exception]] = {
+    "ToolHardError": ToolHardError,
+    "ToolSoftError": ToolSoftError,
+}
+
+
+class CassetteMissError(LookupError):
+    """Raised on replay when a call was never recorded."""
+
+
+class CassetteReplayedError(RuntimeError):
+    """A recorded error whose original type cannot be raised again."""
+
+
+def call_key(kind: str, request: Any) -> str:
+    """Hash a call so that the same call in another plan run gets the same key."""
+    payload = json.dumps([kind, request], sort_keys=True, separators=(",", ":"), default=str)
+    return hashlib.sha256(_VOLATILE.sub("*", payload).encode()).hexdigest()[:32]
+
+
+class Cassette:
+    """A file of recorded calls, opened for recording or for replay."""
+
+    def __init__(self, path: str | Path, *, recording: bool, replay_latency: bool = False) -> None:
+        """Open ``path`` to append new calls, or load it to replay them.
+
+        With ``replay_latency``, replayed calls take as long as they did when recorded.
+        """
+        self.path = Path(path)
+        self.recording = recording
+        self.replay_latency = replay_latency
+        self.recorded = 0
+        self.replayed = 0
+        self._lock = threading.Lock()
+        self._entries: dict[str, deque[dict[str, Any]]] = defaultdict(deque)
+        self._file: BinaryIO | None = None
+
+        if recording:
+            self.path.parent.mkdir(parents=True, exist_ok=True)
+            _drop_partial_line(self.path)
+            self._file = self.path.open("ab")
+        else:
+            with self.path.open("rb") as f:
+                for line in f:
+                    # A line without a newline was cut off by a recorder that died
+                    if line.endswith(b"\n"):
+                        entry = json.loads(line)
+                        self._entries[entry["key"]].append(entry)
+
+    def __len__(self) -> int:
+        with self._lock:
+            return sum(len(entries) for entries in self._entries.values())
+
+    def call(
+        self,
+        kind: str,
+        request: Any,
+        compute: Callable[[], T],
+        *,
+        encode: Callable[[T], Any] = lambda value: value,
+        decode: Callable[[Any], T] = lambda value: value,
+        errors: Mapping[str, type[Exception]] | None = None,
+    ) -> T:
+        """Make a call through the cassette.
+
+        When recording, ``compute`` makes the real call and its result (or
+        error) is saved after ``encode``. When replaying, the saved result is
+        returned after ``decode``, and a saved error of a type in ``errors``
+        is raised again. The time the call took is saved with it.
+        """
+        key = call_key(kind, request)
+        if self.recording:
+            start = time.monotonic()
+            try:
+                result = compute()
+            except Exception as e:
+                duration = round(time.monotonic() - start, 6)
+                self._write(
+                    {
+                        "kind": kind,
+                        "key": key,
+                        "duration": duration,
+                        "error": [type(e).__name__, str(e)],
+                    }
+                )
+                raise
+            duration = round(time.monotonic() - start, 6)
+            self._write(
+                {"kind": kind, "key": key, "duration": duration, "response": encode(result)}
+            )
+            return result
+
+        entry = self._take(kind, key)
+        # Cassettes recorded before durations were saved replay without waiting
+        if self.replay_latency and entry.get("duration"):
+            time.sleep(entry["duration"])
+        if "error" in entry:
+            name, message = entry["error"]
+            raise (errors or {}).get(name, CassetteReplayedError)(message)
+        return decode(entry["response"])
+
+    def stats(self) -> dict[str, int]:
+        """Return a snapshot of the cassette counters."""
+        return {"entries": len(self), "recorded": self.recorded, "replayed": self.replayed}
+
+    def close(self) -> None:
+        """Flush and close the file being recorded."""
+        with self._lock:
+            if self._file is not None:
+                self._file.close()
+                self._file = None
+
+    def _write(self, entry: dict[str, Any]) -> None:
+        line = json.dumps(entry, separators=(",", ":"), default=str) + "\n"
+        with self._lock:
+            if self._file is None:
+                raise RuntimeError(f"Cassette {self.path} is closed")
+            self._file.write(line.encode())
+            # Hand each call to the OS, so a process that dies loses at most this line
+            self._file.flush()
+            self.recorded += 1
+
+    def _take(self, kind: str, key: str) -> dict[str, Any]:
+        with self._lock:
+            entries = self._entries.get(key)
+            if not entries:
+                raise CassetteMissError(f"No {kind} call with key {key} in cassette {self.path}")
+            self.replayed += 1
+            # Keep the last answer for calls repeated more often than recorded
+            return entries.popleft() if len(entries) > 1 else entries[0]
+
+
+def _drop_partial_line(path: Path) -> None:
+    """Cut off a last line left partly written by a recorder that died."""
+    if not path.exists():
+        return
+    with path.open("r+b") as f:
+        end = f.seek(0, os.SEEK_END)
+        # Read back in chunks to the last newline; a complete file ends with one
+        while end > 0:
+            start = max(0, end - 4096)
+            f.seek(start)
+            newline = f.read(end - start).rfind(b"\n")
+            if newline >= 0:
+                f.truncate(start + newline + 1)
+                return
+            end = start
+        f.truncate(0)
+
+
+def _messages_request(messages: Sequence[Message]) -> list[Any]:
+    return [message.model_dump(mode="json") for message in messages]
+
+
+def _chat_request(messages: Sequence[BaseMessage]) -> list[Any]:
+    # Tool call IDs differ between providers and runs; names and arguments don't
+    return [
+        [
+            message.type,
+            message.content,
+            [[call["name"], call["args"]] for call in getattr(message, "tool_calls", [])],
+        ]
+        for message in messages
+    ]
+
+
+class CassetteGenerativeModel(GenerativeModel):
+    """Records the calls made to a model, or replays them without the model."""
+
+    def __init__(self, cassette: Cassette, model: GenerativeModel | None = None) -> None:
+        """Record ``model``'s calls to ``cassette``; ``model`` is not needed for replay."""
+        if cassette.recording and model is None:
+            raise ValueError("A model is needed to record calls")
+        super().__init__(model.model_name if model is not None else "cassette")
+        self.cassette = cassette
+        self.model = model
+
+    def __str__(self) -> str:
+        return str(self.model) if self.model is not None else f"cassette/{self.model_name}"
+
+    def get_response(self, messages: list[Message]) -> Message:
+        """Get (or replay) a plain response."""
+        return self.cassette.call(
+            "llm",
+            _messages_request(messages),
+            lambda: self._model.get_response(messages),
+            encode=lambda message: message.model_dump(mode="json"),
+            decode=Message.model_validate,
+        )
+
+    def get_structured_response(
+        self, messages: list[Message], schema: type[BaseModelT]
+    ) -> BaseModelT:
+        """Get (or replay) a response in the shape of ``schema``."""
+        return self.cassette.call(
+            "structured",
+            [schema.__name__, _messages_request(messages)],
+            lambda: self._model.get_structured_response(messages, schema),
+            encode=lambda response: response.model_dump(mode="json"),
+            decode=schema.model_validate,
+        )
+
+    async def aget_response(self, messages: list[Message]) -> Message:
+        """Get (or replay) a plain response without blocking the event loop."""
+        return await asyncio.to_thread(self.get_response, messages)
+
+    async def aget_structured_response(
+        self, messages: list[Message], schema: type[BaseModelT]
+    ) -> BaseModelT:
+        """Get (or replay) a structured response without blocking the event loop."""
+        return await asyncio.to_thread(self.get_structured_response, messages, schema)
+
+    def to_langchain(self) -> BaseChatModel:
+        """Get a LangChain chat model that records or replays through the cassette."""
+        chat = self.model.to_langchain() if self.model is not None else None
+        return CassetteChatModel(cassette=self.cassette, chat=chat)
+
+    @property
+    def _model(self) -> GenerativeModel:
+        if self.model is None:
+            raise CassetteMissError("Cannot make a real call while replaying a cassette")
+        return self.model
+
+
+class CassetteChatModel(BaseChatModel):
+    """LangChain chat model that records or replays through a cassette."""
+
+    model_config = ConfigDict(arbitrary_types_allowed=True)
+
+    cassette: Cassette
+    chat: Runnable[Any, Any] | None = None
+    tool_names: list[str] = Field(default_factory=list)
+
+    @property
+    def _llm_type(self) -> str:
+        return "cassette"
+
+    def bind_tools(self, tools: Sequence[Any], **kwargs: Any) -> "CassetteChatModel":
+        """Bind ``tools`` to the recorded model; replays are told apart by tool name."""
+        names = [getattr(t, "name", None) or getattr(t, "__name__", str(t)) for t in tools]
+        chat = self.chat.bind_tools(tools, **kwargs) if self.chat is not None else None  # type: ignore[attr-defined]
+        return self.model_copy(update={"chat": chat, "tool_names": names})
+
+    def _generate(
+        self,
+        messages: list[BaseMessage],
+        stop: list[str] | None = None,
+        run_manager: Any = None,  # noqa: ARG002
+        **kwargs: Any,
+    ) -> ChatResult:
+        def invoke() -> BaseMessage:
+            if self.chat is None:
+                raise CassetteMissError("Cannot make a real call while replaying a cassette")
+            return self.chat.invoke(messages, stop=stop, **kwargs)
+
+        message = self.cassette.call(
+            "chat",
+            [self.tool_names, _chat_request(messages)],
+            invoke,
+            encode=message_to_dict,
+            decode=lambda data: messages_from_dict([data])[0],
+        )
+        return ChatResult(generations=[ChatGeneration(message=message)])
+
+
+class CassetteTool(Tool[Any]):
+    """Records the calls made to a tool, or replays them without running it."""
+
+    model_config = ConfigDict(arbitrary_types_allowed=True)
+
+    # Validating against Tool[Any] would rebuild a subclass instance as a plain Tool
+    tool: SkipValidation[Tool[Any]] = Field(exclude=True)
+    cassette: Cassette = Field(exclude=True)
+
+    @classmethod
+    def wrap(cls, tool: Tool[Any], cassette: Cassette) -> "CassetteTool":
+        """Wrap ``tool``, keeping its ID, description and schemas."""
+        fields = {name: getattr(tool, name) for name in Tool.model_fields}
+        return cls(**fields, tool=tool, cassette=cassette)
+
+    def run(self, ctx: ToolRunContext, *args: Any, **kwargs: Any) -> Any:
+        """Run (or replay) the wrapped tool."""
+        return self.cassette.call(
+            "tool",
+            [self.id, args, kwargs],
+            lambda: self.tool.run(ctx, *args, **kwargs),
+            errors=_TOOL_ERRORS,
+        )
+
+
+# Global cassette for LLM_MODE=RECORD and REPLAY
+_cassette_instance: Cassette | None = None
+
+
+def get_cassette() -> Cassette:
+    """Get the global cassette, opened for the configured LLM mode."""
+    global _cassette_instance
+
+    if _cassette_instance is None:
+        settings = get_settings()
+        _cassette_instance = Cassette(
+            settings.cassette_path,
+            recording=settings.llm_mode == LLMMode.RECORD,
+            replay_latency=settings.cassette_replay_latency,
+        )
+
+    return _cassette_instance
+
+
+def close_cassette() -> None:
+    """Close the global cassette if it was opened."""
+    global _cassette_instance
+
+    if _cassette_instance is not None:
+        _cassette_instance.close()
+        _cassette_instance = None
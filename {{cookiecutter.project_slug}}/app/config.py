@@ -1,5 +1,6 @@
 """Configuration management using Pydantic settings."""
 
+from enum import StrEnum
 from functools import lru_cache
 
 from portia import LogLevel, StorageClass
@@ -7,6 +8,43 @@ from pydantic import Field, field_validator
 from pydantic_settings import BaseSettings, SettingsConfigDict
 
 
+class StorageBackend(StrEnum):
+    """Where plans and plan runs are stored.
+
+    Extends Portia's storage classes with backends provided by this service.
+    """
+
+    MEMORY = "MEMORY"
+    DISK = "DISK"
+    CLOUD = "CLOUD"
+    SQLITE = "SQLITE"
+
+
+class RateLimitBackend(StrEnum):
+    """Where per-user rate limit state is kept."""
+
+    MEMORY = "MEMORY"
+    SQLITE = "SQLITE"
+
+
+class LLMMode(StrEnum):
+    """Where plan runs get their LLM responses from."""
+
+    LIVE = "LIVE"
+    FAKE = "FAKE"
+    RECORD = "RECORD"
+    REPLAY = "REPLAY"
+
+
+class LatencyDistribution(StrEnum):
+    """Shape of the simulated latency of fake LLM calls."""
+
+    CONSTANT = "CONSTANT"
+    UNIFORM = "UNIFORM"
+    NORMAL = "NORMAL"
+    LOGNORMAL = "LOGNORMAL"
+
+
 class Settings(BaseSettings):
     """Application settings managed via environment variables."""
 
@@ -25,9 +63,13 @@ class Settings(BaseSettings):
         default=LogLevel.{{ cookiecutter.portia_log_level }},
         description="Portia SDK log level",
     )
-    portia_storage_class: StorageClass = Field(
-        default=StorageClass.{{ cookiecutter.portia_storage_class }},
-        description="Portia storage class (MEMORY, DISK, or CLOUD)",
+    portia_storage_class: StorageBackend = Field(
+        default=StorageBackend.{{ cookiecutter.portia_storage_class }},
+        description="Portia storage class (MEMORY, DISK, CLOUD, or SQLITE)",
+    )
+    sqlite_storage_path: str = Field(
+        default="data/portia.sqlite3",
+        description="Database file used by the SQLITE storage class",
     )
 
     # API Keys (loaded from environment)
@@ -37,9 +79,121 @@ class Settings(BaseSettings):
     google_api_key: str | None = Field(default=None, description="Google API key")
     portia_api_key: str | None = Field(default=None, description="Portia Cloud API key")
 
+    # LLM Configuration
+    llm_mode: LLMMode = Field(
+        default=LLMMode.LIVE,
+        description=(
+            "LIVE calls the configured LLM providers; FAKE answers offline with scripted "
+            "responses; RECORD calls them and saves LLM and tool calls to the cassette; "
+            "REPLAY answers from the cassette"
+        ),
+    )
+    fake_llm_latency_distribution: LatencyDistribution = Field(
+        default=LatencyDistribution.CONSTANT,
+        description="Distribution of simulated fake LLM call latency",
+    )
+    fake_llm_latency_mean: float = Field(
+        default=0.0,
+        ge=0,
+        description="Mean seconds a fake LLM call takes",
+    )
+    fake_llm_latency_stddev: float = Field(
+        default=0.0,
+        ge=0,
+        description="Standard deviation of fake LLM call latency in seconds",
+    )
+    fake_llm_seed: int | None = Field(
+        default=None,
+        description="Seed for fake LLM latency, for repeatable load tests",
+    )
+    fake_llm_script_path: str | None = Field(
+        default=None,
+        description="JSON file of scripted fake LLM responses",
+    )
+    cassette_path: str = Field(
+        default="data/cassette.jsonl",
+        description="JSON Lines file of LLM and tool calls for RECORD and REPLAY",
+    )
+    cassette_replay_latency: bool = Field(
+        default=False,
+        description="On REPLAY, wait as long as each call took when it was recorded",
+    )
+
+    # LLM Provider Connection Pools
+    llm_http2: bool = Field(
+        default=True,
+        description="Use HTTP/2 to LLM providers when they support it",
+    )
+    llm_http_max_connections: int = Field(
+        default=100,
+        ge=1,
+        description="Maximum open connections to each LLM provider",
+    )
+    llm_http_max_keepalive_connections: int = Field(
+        default=20,
+        ge=0,
+        description="Maximum idle connections kept open to each LLM provider",
+    )
+    llm_http_keepalive_expiry: float = Field(
+        default=60.0,
+        ge=0,
+        description="Seconds an idle connection to an LLM provider is kept open",
+    )
+
+    # LLM Provider Routing
+    llm_routing_enabled: bool = Field(
+        default=False,
+        description="Route LLM calls between every provider with an API key, failing over on errors",
+    )
+    llm_routing_timeout: float | None = Field(
+        default=120.0,
+        gt=0,
+        description="Seconds before an LLM call is abandoned and retried on the next provider",
+    )
+    llm_routing_alpha: float = Field(
+        default=0.3,
+        gt=0,
+        le=1,
+        description="Weight of the latest call in each provider's moving-average latency and error rate",
+    )
+    llm_routing_max_error_rate: float = Field(
+        default=0.5,
+        ge=0,
+        le=1,
+        description="Moving-average error rate above which a provider is skipped",
+    )
+    llm_routing_cooldown: float = Field(
+        default=30.0,
+        ge=0,
+        description="Seconds a provider over the error rate is skipped before it is tried again",
+    )
+    llm_routing_max_pending_calls: int = Field(
+        default=64,
+        ge=1,
+        description="Most routed LLM calls in flight, counting timed-out calls still running",
+    )
+
+    # In-memory Storage Retention (MEMORY storage class only)
+    memory_storage_max_entries: int = Field(
+        default=10_000,
+        ge=1,
+        description="Maximum plans and plan runs kept in memory before the least recently used are evicted",
+    )
+    memory_storage_max_bytes: int = Field(
+        default=256_000_000,
+        ge=1,
+        description="Maximum serialized bytes of plans, plan runs and outputs kept in memory",
+    )
+    memory_storage_ttl: int = Field(
+        default=86_400,
+        ge=1,
+        description="Seconds an unused plan or plan run is kept in memory",
+    )
+
     # Additional Configuration
     max_request_size: int = Field(
         default=1_000_000,  # 1MB
+        ge=1,
         description="Maximum request size in bytes",
     )
     request_timeout: int = Field(
@@ -47,6 +201,162 @@ class Settings(BaseSettings):
         description="Request timeout in seconds",
     )
 
+    # Execution Configuration
+    plan_run_max_workers: int = Field(
+        default=8,
+        ge=1,
+        description="Maximum number of plan runs executed concurrently per process",
+    )
+    plan_run_max_queue: int = Field(
+        default=64,
+        ge=0,
+        description="Plan runs allowed to wait for a free worker before new ones are rejected with 503",
+    )
+    plan_run_weight_interactive: int = Field(
+        default=8,
+        ge=1,
+        description="Scheduling weight of interactive plan runs",
+    )
+    plan_run_weight_default: int = Field(
+        default=4,
+        ge=1,
+        description="Scheduling weight of plan runs with the default priority",
+    )
+    plan_run_weight_batch: int = Field(
+        default=1,
+        ge=1,
+        description="Scheduling weight of batch plan runs",
+    )
+    plan_run_max_wait: float = Field(
+        default=30.0,
+        gt=0,
+        description="Seconds a queued plan run may wait before it starts next regardless of priority",
+    )
+    overload_retry_after: int = Field(
+        default=5,
+        ge=1,
+        description="Retry-After seconds sent with 503 responses when plan runs are rejected",
+    )
+    run_job_result_ttl: int = Field(
+        default=3600,  # 1 hour
+        description="Seconds a finished background run stays available for polling",
+    )
+    run_job_max_entries: int = Field(
+        default=10_000,
+        ge=1,
+        description="Maximum number of background runs tracked per process",
+    )
+    batch_max_size: int = Field(
+        default=100,
+        ge=1,
+        description="Maximum number of items accepted in one batch run",
+    )
+    batch_max_concurrency: int = Field(
+        default=8,
+        ge=1,
+        description="Maximum number of batch items executed at once",
+    )
+
+    # Idempotency Configuration
+    idempotency_ttl: int = Field(
+        default=86400,  # 24 hours
+        ge=1,
+        description="Seconds a response is replayed for repeats of its Idempotency-Key",
+    )
+    idempotency_max_entries: int = Field(
+        default=10_000,
+        ge=1,
+        description="Maximum number of idempotency keys remembered per process",
+    )
+
+    # Plan Cache Configuration
+    plan_cache_enabled: bool = Field(
+        default=False,
+        description="Reuse plans for repeated queries instead of planning every run",
+    )
+    plan_cache_max_size: int = Field(
+        default=1024,
+        ge=1,
+        description="Maximum number of cached plans",
+    )
+    plan_cache_ttl: int = Field(
+        default=3600,  # 1 hour
+        gt=0,
+        description="Seconds a cached plan stays valid",
+    )
+
+    # Single-flight Configuration
+    singleflight_enabled: bool = Field(
+        default=True,
+        description="Coalesce identical concurrent runs that only use deterministic tools",
+    )
+    singleflight_tool_ids: list[str] = Field(
+        default_factory=list,
+        description="Extra tool IDs to treat as deterministic for single-flight coalescing",
+    )
+
+    # Per-user Rate Limit Configuration
+    rate_limit_enabled: bool = Field(
+        default=False,
+        description="Limit plan runs per user_id with a token bucket and a concurrency quota",
+    )
+    rate_limit_per_minute: float = Field(
+        default=60.0,
+        gt=0,
+        description="Plan runs each user may start per minute, on average",
+    )
+    rate_limit_burst: int = Field(
+        default=10,
+        ge=1,
+        description="Plan runs each user may start at once before the per-minute rate applies",
+    )
+    rate_limit_max_concurrent: int = Field(
+        default=4,
+        ge=1,
+        description="Plan runs each user may have in progress at once",
+    )
+    rate_limit_backend: RateLimitBackend = Field(
+        default=RateLimitBackend.MEMORY,
+        description="Where rate limit state is kept (MEMORY per process, or SQLITE shared by workers)",
+    )
+    rate_limit_sqlite_path: str = Field(
+        default="data/rate_limits.sqlite3",
+        description="Database file used by the SQLITE rate limit backend",
+    )
+
+    # Metrics Configuration
+    metrics_enabled: bool = Field(
+        default=True,
+        description="Expose Prometheus metrics at /metrics",
+    )
+
+    # Profiling Configuration
+    profiling_enabled: bool = Field(
+        default=False,
+        description="Allow requests to ask for a plan-run profile (always allowed in debug mode)",
+    )
+    profiling_sample_rate: float = Field(
+        default=1.0,
+        ge=0,
+        le=1,
+        description="Fraction of requests asking for a profile that are actually profiled",
+    )
+    profiling_max_per_minute: int = Field(
+        default=10,
+        ge=0,
+        description="Maximum number of profiled requests per minute",
+    )
+    profiling_interval: float = Field(
+        default=0.005,
+        gt=0,
+        description="Seconds between stack samples of a profiled plan run",
+    )
+    profiling_max_stored: int = Field(
+        default=100,
+        ge=1,
+        description="Maximum number of profiles kept for download",
+    )
+
     model_config = SettingsConfigDict(
         env_file=".env",
         env_file_encoding="utf-8",
@@ -67,12 +377,19 @@ class Settings(BaseSettings):
 
     def get_portia_storage_class(self) -> StorageClass:
         """Get the appropriate storage class based on configuration."""
-        if self.portia_api_key and self.portia_storage_class == StorageClass.CLOUD:
+        if self.portia_api_key and self.portia_storage_class == StorageBackend.CLOUD:
             return StorageClass.CLOUD
-        elif self.portia_storage_class == StorageClass.DISK:
+        elif self.portia_storage_class == StorageBackend.DISK:
             return StorageClass.DISK
+        # SQLite storage replaces Portia's in-memory storage once Portia is created
         return StorageClass.MEMORY
 
+    def get_storage_backend(self) -> StorageBackend:
+        """Get the storage backend in effect, after falling back from unusable choices."""
+        if self.portia_storage_class == StorageBackend.SQLITE:
+            return StorageBackend.SQLITE
+        return StorageBackend(self.get_portia_storage_class().value)
+
     @field_validator("port")
     @classmethod
     def validate_port(cls, v: int) -> int:
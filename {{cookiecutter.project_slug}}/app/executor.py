@@ -0,0 +1,255 @@
+"""Dedicated thread pool for running blocking Portia plan runs."""
+
+import asyncio
+import contextvars
+import threading
+import time
+from collections import deque
+from collections.abc import Callable, Mapping
+from concurrent.futures import Future, ThreadPoolExecutor
+from dataclasses import dataclass, field
+from typing import Any, TypeVar
+
+from .config import get_settings
+
+T = TypeVar("T")
+
+# Lane used when a caller does not name one
+DEFAULT_LANE = "default"
+
+
+class ExecutorSaturatedError(RuntimeError):
+    """Raised when a plan run is submitted while the executor's queue is full."""
+
+
+@dataclass
+class _Work:
+    future: Future[Any]
+    context: contextvars.Context
+    func: Callable[..., Any]
+    args: tuple[Any, ...]
+    kwargs: dict[str, Any]
+    enqueued_at: float = field(default_factory=time.monotonic)
+
+
+class PlanRunExecutor:
+    """Bounded executor that keeps blocking plan runs off the event loop.
+
+    ``Portia.run`` is synchronous, so calling it from an ``async def`` route blocks
+    every other request on the worker. Plan runs are submitted to a dedicated
+    thread pool instead, keeping the default executor free for FastAPI's own use.
+
+    With ``max_queue`` set, at most that many plan runs wait for a free worker;
+    further submissions raise ``ExecutorSaturatedError`` at once instead of
+    queueing without bound.
+
+    Waiting plan runs are queued in priority lanes. Free workers are shared
+    between lanes by weighted fair queuing, so a lane with weight 8 starts
+    about eight runs for every one started from a lane with weight 1 while
+    both have work waiting. A run that has waited ``max_wait`` seconds starts
+    next whatever its lane, so low-weight lanes are never starved.
+    """
+
+    def __init__(
+        self,
+        max_workers: int,
+        max_queue: int | None = None,
+        lane_weights: Mapping[str, int] | None = None,
+        max_wait: float | None = None,
+    ) -> None:
+        """Create an executor running at most ``max_workers`` plan runs at once."""
+        if max_workers < 1:
+            raise ValueError("max_workers must be at least 1")
+        if max_queue is not None and max_queue < 0:
+            raise ValueError("max_queue must not be negative")
+        lane_weights = dict(lane_weights or {DEFAULT_LANE: 1})
+        if any(weight < 1 for weight in lane_weights.values()):
+            raise ValueError("lane weights must be at least 1")
+
+        self.max_workers = max_workers
+        self.max_queue = max_queue
+        self.lane_weights = lane_weights
+        self.max_wait = max_wait
+        self.rejected = 0
+        self._pool = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="plan-run")
+        self._lock = threading.Lock()
+        self._queued = 0
+        self._in_flight = 0
+        self._lanes: dict[str, deque[_Work]] = {lane: deque() for lane in lane_weights}
+        # Weighted fair queuing: the virtual time at which each lane's next run
+        # starts, and the latest start time dispatched
+        self._lane_start = dict.fromkeys(lane_weights, 0.0)
+        self._virtual_time = 0.0
+
+    @property
+    def queue_depth(self) -> int:
+        """Number of plan runs waiting for a free worker."""
+        return self._queued
+
+    @property
+    def in_flight(self) -> int:
+        """Number of plan runs currently executing."""
+        return self._in_flight
+
+    @property
+    def saturated(self) -> bool:
+        """Whether a plan run submitted now would be rejected."""
+        with self._lock:
+            return self._is_saturated()
+
+    def stats(self) -> dict[str, int]:
+        """Return a snapshot of the executor gauges."""
+        with self._lock:
+            return {
+                "max_workers": self.max_workers,
+                "queue_depth": self._queued,
+                "in_flight": self._in_flight,
+            }
+
+    def lane_depths(self) -> dict[str, int]:
+        """Return the number of plan runs waiting in each lane."""
+        with self._lock:
+            return {
+                lane: sum(not work.future.cancelled() for work in queue)
+                for lane, queue in self._lanes.items()
+            }
+
+    async def run(
+        self, func: Callable[..., T], /, *args: Any, lane: str = DEFAULT_LANE, **kwargs: Any
+    ) -> T:
+        """Run ``func`` on the plan-run pool and await its result.
+
+        The caller's context variables are visible to ``func``, so execution
+        hooks can tell which request a plan run belongs to. Raises
+        ``ExecutorSaturatedError`` if the queue is full.
+        """
+        if lane not in self._lanes:
+            raise ValueError(f"Unknown lane: {lane}")
+
+        future: Future[T] = Future()
+        work = _Work(future, contextvars.copy_context(), func, args, kwargs)
+        with self._lock:
+            if self._is_saturated():
+                self.rejected += 1
+                raise ExecutorSaturatedError(
+                    f"All {self.max_workers} plan-run workers are busy and "
+                    f"{self._queued} plan runs are already queued"
+                )
+            if not self._lanes[lane]:
+                # A lane that sat idle starts from the current virtual time
+                # rather than spending credit it built up with nothing to run
+                self._lane_start[lane] = max(self._lane_start[lane], self._virtual_time)
+            self._queued += 1
+            self._lanes[lane].append(work)
+            self._dispatch()
+
+        future.add_done_callback(self._on_done)
+        return await asyncio.wrap_future(future)
+
+    def shutdown(self, wait: bool = True) -> None:
+        """Stop accepting work and release the worker threads."""
+        with self._lock:
+            waiting = [work for queue in self._lanes.values() for work in queue]
+            for queue in self._lanes.values():
+                queue.clear()
+        for work in waiting:
+            work.future.cancel()
+        self._pool.shutdown(wait=wait, cancel_futures=True)
+
+    def _is_saturated(self) -> bool:
+        # Work only waits once every worker is busy
+        if self.max_queue is None:
+            return False
+        return self._in_flight + self._queued >= self.max_workers + self.max_queue
+
+    def _dispatch(self) -> None:
+        # Called with the lock held whenever a run is queued or a worker frees up
+        while self._in_flight < self.max_workers and self._queued > 0:
+            work = self._next_work()
+            if work is None:
+                return
+            if not work.future.set_running_or_notify_cancel():
+                continue
+            self._queued -= 1
+            self._in_flight += 1
+            self._pool.submit(work.context.run, self._call, work)
+
+    def _next_work(self) -> _Work | None:
+        for queue in self._lanes.values():
+            # Cancelled runs were already taken off the queue depth
+            while queue and queue[0].future.cancelled():
+                queue.popleft()
+        waiting = [lane for lane, queue in self._lanes.items() if queue]
+        if not waiting:
+            return None
+
+        oldest = min(waiting, key=lambda lane: self._lanes[lane][0].enqueued_at)
+        if (
+            self.max_wait is not None
+            and time.monotonic() - self._lanes[oldest][0].enqueued_at >= self.max_wait
+        ):
+            lane = oldest
+        else:
+            # Earliest virtual finish time first; ties go to the lane listed first
+            lane = min(waiting, key=self._finish_time)
+
+        self._virtual_time = max(self._virtual_time, self._lane_start[lane])
+        self._lane_start[lane] = self._finish_time(lane)
+        return self._lanes[lane].popleft()
+
+    def _finish_time(self, lane: str) -> float:
+        return self._lane_start[lane] + 1 / self.lane_weights[lane]
+
+    def _call(self, work: _Work) -> None:
+        try:
+            result = work.func(*work.args, **work.kwargs)
+        except BaseException as e:
+            self._finish()
+            work.future.set_exception(e)
+        else:
+            self._finish()
+            work.future.set_result(result)
+
+    def _finish(self) -> None:
+        with self._lock:
+            self._in_flight -= 1
+            self._dispatch()
+
+    def _on_done(self, future: Future[Any]) -> None:
+        # Work cancelled before it reached a worker never runs ``_call``.
+        if future.cancelled():
+            with self._lock:
+                self._queued -= 1
+
+
+# Global executor instance (created lazily, shut down with the application)
+_executor_instance: PlanRunExecutor | None = None
+
+
+def get_executor() -> PlanRunExecutor:
+    """Get the global plan-run executor."""
+    global _executor_instance
+
+    if _executor_instance is None:
+        settings = get_settings()
+        _executor_instance = PlanRunExecutor(
+            max_workers=settings.plan_run_max_workers,
+            max_queue=settings.plan_run_max_queue,
+            lane_weights={
+                "interactive": settings.plan_run_weight_interactive,
+                "default": settings.plan_run_weight_default,
+                "batch": settings.plan_run_weight_batch,
+            },
+            max_wait=settings.plan_run_max_wait,
+        )
+
+    return _executor_instance
+
+
+def shutdown_executor() -> None:
+    """Shut down the global plan-run executor if it was started."""
+    global _executor_instance
+
+    if _executor_instance is not None:
+        _executor_instance.shutdown(wait=False)
+        _executor_instance = None
@@ -0,0 +1,248 @@
+"""Deterministic fake LLM for running plan runs offline.
+
+``FakeGenerativeModel`` stands in for a real provider when ``LLM_MODE=FAKE``.
+Every call sleeps for a latency drawn from a configurable distribution and
+then answers from a script, so the service can be load tested and profiled
+without API keys or network access.
+
+A script is a JSON object with any of these keys:
+
+- ``text``: the answer to plain completions and the final answer of steps
+- ``structured``: field values for structured responses, keyed by schema name
+  (for example ``{"StepsOrError": {"steps": [...]}}`` to script plans)
+- ``tool_args``: arguments passed when a step calls a tool, keyed by tool name
+
+Anything not scripted gets placeholder values, which are always the same.
+"""
+
+import asyncio
+import json
+import math
+import random
+import threading
+import time
+import types
+from collections.abc import Mapping, Sequence
+from dataclasses import dataclass
+from enum import Enum
+from pathlib import Path
+from typing import Any, Literal, TypeVar, Union, get_args, get_origin
+
+from langchain_core.language_models.chat_models import BaseChatModel
+from langchain_core.messages import AIMessage, BaseMessage, ToolMessage
+from langchain_core.outputs import ChatGeneration, ChatResult
+from langchain_core.utils.function_calling import convert_to_openai_tool
+from portia.model import GenerativeModel, Message
+from pydantic import BaseModel, ConfigDict, Field
+
+from .config import LatencyDistribution, get_settings
+
+BaseModelT = TypeVar("BaseModelT", bound=BaseModel)
+
+# Answer given wherever the script does not provide one
+DEFAULT_FAKE_TEXT = "fake response"
+
+# Placeholder values by Python type, checked in order (bool before int)
+_TYPE_PLACEHOLDERS: tuple[tuple[type | types.UnionType, Any], ...] = (
+    (bool, False),
+    (int | float, 0),
+    (str, DEFAULT_FAKE_TEXT),
+    (Mapping, {}),
+    (Sequence | set | frozenset, []),
+)
+
+_JSON_PLACEHOLDERS: dict[str, Any] = {
+    "string": DEFAULT_FAKE_TEXT,
+    "integer": 0,
+    "number": 0,
+    "boolean": False,
+    "array": [],
+    "object": {},
+}
+
+
+@dataclass(frozen=True)
+class LatencyModel:
+    """Distribution of simulated call latency, in seconds."""
+
+    distribution: LatencyDistribution = LatencyDistribution.CONSTANT
+    mean: float = 0.0
+    stddev: float = 0.0
+
+    def sample(self, rng: random.Random) -> float:
+        """Draw one latency from the distribution; never negative."""
+        if self.mean <= 0 or self.distribution == LatencyDistribution.CONSTANT:
+            return max(0.0, self.mean)
+        if self.distribution == LatencyDistribution.UNIFORM:
+            # A uniform distribution with this standard deviation is this wide
+            half_width = self.stddev * math.sqrt(3)
+            return max(0.0, rng.uniform(self.mean - half_width, self.mean + half_width))
+        if self.distribution == LatencyDistribution.NORMAL:
+            return max(0.0, rng.gauss(self.mean, self.stddev))
+        # Log-normal with the configured mean and standard deviation, for long tails
+        sigma = math.sqrt(math.log1p((self.stddev / self.mean) ** 2))
+        return rng.lognormvariate(math.log(self.mean) - sigma**2 / 2, sigma)
+
+
+def placeholder(schema: type[BaseModel]) -> dict[str, Any]:
+    """Build values for every required field of ``schema``."""
+    return {
+        name: _placeholder_value(field.annotation)
+        for name, field in schema.model_fields.items()
+        if field.is_required()
+    }
+
+
+def _placeholder_value(annotation: Any) -> Any:
+    origin = get_origin(annotation)
+    args = get_args(annotation)
+    if origin is Literal:
+        return args[0]
+    if origin in (Union, types.UnionType):
+        return None if type(None) in args else _placeholder_value(args[0])
+    if origin is not None:
+        annotation = origin
+    if not isinstance(annotation, type):
+        return None
+    if issubclass(annotation, Enum):
+        return next(iter(annotation)).value
+    if issubclass(annotation, BaseModel):
+        return placeholder(annotation)
+    return next((value for kind, value in _TYPE_PLACEHOLDERS if issubclass(annotation, kind)), None)
+
+
+def _tool_placeholder_args(parameters: Mapping[str, Any]) -> dict[str, Any]:
+    properties = parameters.get("properties", {})
+    return {
+        name: _JSON_PLACEHOLDERS.get(properties.get(name, {}).get("type", "string"))
+        for name in parameters.get("required", [])
+    }
+
+
+class FakeGenerativeModel(GenerativeModel):
+    """A generative model that answers from a script after a simulated delay.
+
+    Latencies come from a seeded random generator, so a load test with the
+    same seed sees the same sequence of delays.
+    """
+
+    def __init__(
+        self,
+        latency: LatencyModel | None = None,
+        script: Mapping[str, Any] | None = None,
+        seed: int | None = None,
+        model_name: str = "fake",
+    ) -> None:
+        """Create a fake model answering from ``script``."""
+        super().__init__(model_name)
+        self.latency = latency or LatencyModel()
+        self.script = dict(script or {})
+        self.calls = 0
+        self._rng = random.Random(seed)
+        self._lock = threading.Lock()
+
+    def __str__(self) -> str:
+        return f"fake/{self.model_name}"
+
+    @property
+    def text(self) -> str:
+        """The scripted plain-text answer."""
+        return self.script.get("text", DEFAULT_FAKE_TEXT)
+
+    def wait(self) -> None:
+        """Count a call and sleep for its simulated latency."""
+        with self._lock:
+            self.calls += 1
+            delay = self.latency.sample(self._rng)
+        if delay > 0:
+            time.sleep(delay)
+
+    def get_response(self, messages: list[Message]) -> Message:  # noqa: ARG002
+        """Answer with the scripted text."""
+        self.wait()
+        return Message(role="assistant", content=self.text)
+
+    def get_structured_response(
+        self,
+        messages: list[Message],  # noqa: ARG002
+        schema: type[BaseModelT],
+    ) -> BaseModelT:
+        """Answer with the scripted values for ``schema``, or placeholders."""
+        self.wait()
+        scripted = self.script.get("structured", {}).get(schema.__name__, {})
+        return schema.model_validate({**placeholder(schema), **scripted})
+
+    async def aget_response(self, messages: list[Message]) -> Message:
+        """Answer with the scripted text without blocking the event loop."""
+        return await asyncio.to_thread(self.get_response, messages)
+
+    async def aget_structured_response(
+        self, messages: list[Message], schema: type[BaseModelT]
+    ) -> BaseModelT:
+        """Answer with structured values without blocking the event loop."""
+        return await asyncio.to_thread(self.get_structured_response, messages, schema)
+
+    def to_langchain(self) -> BaseChatModel:
+        """Get a LangChain chat model backed by this fake, for the execution agents."""
+        return FakeChatModel(fake=self)
+
+
+class FakeChatModel(BaseChatModel):
+    """LangChain view of a ``FakeGenerativeModel``.
+
+    With tools bound, the first turn calls the first tool and the turn after
+    its result gives the scripted answer, which is how an execution agent
+    drives a single step.
+    """
+
+    model_config = ConfigDict(arbitrary_types_allowed=True)
+
+    fake: FakeGenerativeModel
+    tools: list[dict[str, Any]] = Field(default_factory=list)
+
+    @property
+    def _llm_type(self) -> str:
+        return "fake"
+
+    def bind_tools(self, tools: Sequence[Any], **_kwargs: Any) -> "FakeChatModel":
+        """Return a copy that calls the first of ``tools``."""
+        return self.model_copy(update={"tools": [convert_to_openai_tool(t) for t in tools]})
+
+    def _generate(
+        self,
+        messages: list[BaseMessage],
+        stop: list[str] | None = None,  # noqa: ARG002
+        run_manager: Any = None,  # noqa: ARG002
+        **_kwargs: Any,
+    ) -> ChatResult:
+        self.fake.wait()
+        if self.tools and not any(isinstance(message, ToolMessage) for message in messages):
+            function = self.tools[0]["function"]
+            args = self.fake.script.get("tool_args", {}).get(function["name"])
+            if args is None:
+                args = _tool_placeholder_args(function.get("parameters", {}))
+            message = AIMessage(
+                content="",
+                tool_calls=[{"name": function["name"], "args": args, "id": "call_fake"}],
+            )
+        else:
+            message = AIMessage(content=self.fake.text)
+        return ChatResult(generations=[ChatGeneration(message=message)])
+
+
+def build_fake_model() -> FakeGenerativeModel:
+    """Create the fake model described by the settings."""
+    settings = get_settings()
+    script: dict[str, Any] = {}
+    if settings.fake_llm_script_path:
+        script = json.loads(Path(settings.fake_llm_script_path).read_text())
+
+    return FakeGenerativeModel(
+        latency=LatencyModel(
+            distribution=settings.fake_llm_latency_distribution,
+            mean=settings.fake_llm_latency_mean,
+            stddev=settings.fake_llm_latency_stddev,
+        ),
+        script=script,
+        seed=settings.fake_llm_seed,
+    )
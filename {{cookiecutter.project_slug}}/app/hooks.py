@@ -0,0 +1,135 @@
+"""Portia execution hooks that tie each plan run to the request that started it.
+
+A single ``Portia`` instance serves every request, so its hooks are installed
+once and dispatch to whichever listener and cancellation event are bound in
+the current context. The plan-run executor copies the caller's context into
+the worker thread, which lets each request observe and cancel only its own
+plan run. The hooks also time planning, steps and tool calls for the metrics.
+"""
+
+import threading
+from collections.abc import Callable, Iterator
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Any
+
+from loguru import logger
+from portia.execution_hooks import BeforeStepExecutionOutcome, ExecutionHooks
+
+from . import metrics
+
+RunEventListener = Callable[[str, dict[str, Any]], None]
+
+_current_listener: ContextVar[RunEventListener | None] = ContextVar(
+    "current_listener", default=None
+)
+_current_cancel_event: ContextVar[threading.Event | None] = ContextVar(
+    "current_cancel_event", default=None
+)
+
+
+class PlanRunCancelledError(RuntimeError):
+    """Raised inside a plan run whose caller has given up on it."""
+
+
+@contextmanager
+def observe_run(listener: RunEventListener) -> Iterator[None]:
+    """Send progress events for plan runs started in this context to ``listener``."""
+    token = _current_listener.set(listener)
+    try:
+        yield
+    finally:
+        _current_listener.reset(token)
+
+
+@contextmanager
+def cancellation_scope(cancel_event: threading.Event) -> Iterator[None]:
+    """Stop plan runs started in this context at their next step once ``cancel_event`` is set.
+
+    Cancellation is cooperative: a step or tool call that is already running
+    finishes first, then the plan run raises ``PlanRunCancelledError``.
+    """
+    token = _current_cancel_event.set(cancel_event)
+    try:
+        yield
+    finally:
+        _current_cancel_event.reset(token)
+
+
+def _check_cancelled(plan_run: Any) -> None:
+    cancel_event = _current_cancel_event.get()
+    if cancel_event is not None and cancel_event.is_set():
+        raise PlanRunCancelledError(f"Plan run {plan_run.id} was cancelled")
+
+
+def _emit(event: str, payload: dict[str, Any]) -> None:
+    listener = _current_listener.get()
+    if listener is None:
+        return
+    try:
+        listener(event, payload)
+    except Exception:
+        # A broken listener must never fail the plan run itself
+        logger.exception(f"Error delivering plan run event: {event}")
+
+
+def _step_payload(plan_run: Any, step: Any) -> dict[str, Any]:
+    return {
+        "plan_run_id": str(plan_run.id),
+        "index": plan_run.current_step_index,
+        "task": step.task,
+        "tool_id": step.tool_id,
+    }
+
+
+def _before_plan_run(plan: Any, plan_run: Any) -> None:
+    _check_cancelled(plan_run)
+    metrics.observe_planning_finished()
+    _emit(
+        "plan",
+        {
+            "plan_id": str(plan.id),
+            "plan_run_id": str(plan_run.id),
+            "steps": [
+                {"index": index, "task": step.task, "tool_id": step.tool_id}
+                for index, step in enumerate(plan.steps)
+            ],
+        },
+    )
+
+
+def _before_step_execution(_plan: Any, plan_run: Any, step: Any) -> BeforeStepExecutionOutcome:
+    _check_cancelled(plan_run)
+    metrics.mark_step_started()
+    _emit("step_started", _step_payload(plan_run, step))
+    return BeforeStepExecutionOutcome.CONTINUE
+
+
+def _after_step_execution(_plan: Any, plan_run: Any, step: Any, output: Any) -> None:
+    metrics.observe_step_finished(step.tool_id)
+    payload = _step_payload(plan_run, step)
+    try:
+        payload["output"] = output.get_value()
+    except Exception:
+        payload["output"] = None
+    _emit("step_completed", payload)
+
+
+def _before_tool_call(_tool: Any, _args: dict[str, Any], plan_run: Any, _step: Any) -> None:
+    _check_cancelled(plan_run)
+    metrics.mark_tool_call_started()
+
+
+def _after_tool_call(tool: Any, _output: Any, _plan_run: Any, _step: Any) -> None:
+    metrics.observe_tool_call_finished(tool.id)
+
+
+def build_execution_hooks() -> ExecutionHooks:
+    """Create the execution hooks installed on the global Portia instance."""
+    return ExecutionHooks(
+        before_plan_run=_before_plan_run,
+        before_step_execution=_before_step_execution,
+        after_step_execution=_after_step_execution,
+        before_tool_call=_before_tool_call,
+        after_tool_call=_after_tool_call,
+    )
@@ -0,0 +1,239 @@
+"""Shared HTTP connection pools for LLM providers.
+
+Each provider gets one long-lived pair of sync and async HTTP clients, so
+planning and execution calls reuse open (HTTP/2 where the provider offers
+it) connections instead of paying a TCP and TLS handshake each time. The
+pools are created when Portia is initialized at startup and closed when the
+application shuts down.
+"""
+
+import threading
+from typing import Any
+
+import httpx
+from portia import Config
+from portia.model import GenerativeModel, MistralAIGenerativeModel, OpenAIGenerativeModel
+from pydantic import SecretStr
+
+from .config import get_settings
+from .metrics import LLM_HTTP_CONNECTIONS, LLM_HTTP_REQUESTS, LLM_HTTP_TLS_HANDSHAKES
+
+
+class ProviderPool:
+    """Sync and async HTTP clients for one provider, counting connection reuse."""
+
+    def __init__(
+        self,
+        provider: str,
+        *,
+        http2: bool = True,
+        max_connections: int = 100,
+        max_keepalive_connections: int = 20,
+        keepalive_expiry: float = 60.0,
+        **client_options: Any,
+    ) -> None:
+        """Create the clients; connections are opened on first use.
+
+        ``client_options``, such as a base URL and headers, are passed on to
+        both clients for integrations that send relative requests.
+        """
+        self.provider = provider
+        self.requests = 0
+        self.connections = 0
+        self.tls_handshakes = 0
+        self._lock = threading.Lock()
+
+        limits = httpx.Limits(
+            max_connections=max_connections,
+            max_keepalive_connections=max_keepalive_connections,
+            keepalive_expiry=keepalive_expiry,
+        )
+        # Unless told otherwise, leave timeouts to the SDKs, which set one per request
+        options: dict[str, Any] = {"timeout": None, **client_options}
+        self.client = httpx.Client(
+            http2=http2,
+            limits=limits,
+            event_hooks={"request": [self._on_request]},
+            **options,
+        )
+        self.async_client = httpx.AsyncClient(
+            http2=http2,
+            limits=limits,
+            event_hooks={"request": [self._on_async_request]},
+            **options,
+        )
+
+    @property
+    def reuse_rate(self) -> float:
+        """Fraction of requests sent over an already open connection."""
+        with self._lock:
+            return 1 - self.connections / self.requests if self.requests else 0.0
+
+    def stats(self) -> dict[str, Any]:
+        """Return a snapshot of the pool counters."""
+        with self._lock:
+            stats: dict[str, Any] = {
+                "requests": self.requests,
+                "connections": self.connections,
+                "tls_handshakes": self.tls_handshakes,
+            }
+        stats["reuse_rate"] = self.reuse_rate
+        return stats
+
+    def close(self) -> None:
+        """Close the sync client's connections."""
+        self.client.close()
+
+    async def aclose(self) -> None:
+        """Close both clients' connections."""
+        self.close()
+        await self.async_client.aclose()
+
+    def _on_request(self, request: httpx.Request) -> None:
+        # httpcore reports connection events to the request's trace callback
+        request.extensions["trace"] = self._trace
+        self._count("requests", LLM_HTTP_REQUESTS)
+
+    async def _on_async_request(self, request: httpx.Request) -> None:
+        request.extensions["trace"] = self._async_trace
+        self._count("requests", LLM_HTTP_REQUESTS)
+
+    def _trace(self, event: str, _info: dict[str, Any]) -> None:
+        if event == "connection.connect_tcp.complete":
+            self._count("connections", LLM_HTTP_CONNECTIONS)
+        elif event == "connection.start_tls.complete":
+            self._count("tls_handshakes", LLM_HTTP_TLS_HANDSHAKES)
+
+    async def _async_trace(self, event: str, info: dict[str, Any]) -> None:
+        self._trace(event, info)
+
+    def _count(self, counter: str, metric: Any) -> None:
+        with self._lock:
+            setattr(self, counter, getattr(self, counter) + 1)
+        metric.labels(provider=self.provider).inc()
+
+
+# ChatOpenAI settings carried over when a model is rebuilt on a shared pool
+_OPENAI_SETTINGS = (
+    "temperature",
+    "seed",
+    "max_retries",
+    "max_tokens",
+    "top_p",
+    "model_kwargs",
+    "request_timeout",
+    "openai_api_base",
+    "openai_organization",
+    "default_headers",
+    "default_query",
+    "disabled_params",
+)
+
+# ChatMistralAI settings carried over when a model is rebuilt on a shared pool
+_MISTRAL_SETTINGS = (
+    "temperature",
+    "max_retries",
+    "max_tokens",
+    "top_p",
+    "random_seed",
+    "safe_mode",
+    "model_kwargs",
+    "timeout",
+    "endpoint",
+)
+
+
+def pooled_model(model: GenerativeModel, config: Config) -> GenerativeModel:
+    """Rebuild ``model`` to send its LangChain requests through its provider's shared pool.
+
+    The rebuilt model keeps the original's settings, such as its base URL,
+    temperature and seed. OpenAI and Mistral models are rebuilt, and only
+    their LangChain calls use the pool: structured output through instructor
+    still opens its own client. Other models are returned unchanged, as
+    their integrations take no HTTP client: LangChain's Anthropic model
+    builds its own (cached) client, the Google model does not use httpx, and
+    the Azure OpenAI model's endpoint and API version are not carried over.
+    """
+    if type(model) is OpenAIGenerativeModel and config.openai_api_key:
+        return _pooled_openai_model(model, config.openai_api_key)
+    if type(model) is MistralAIGenerativeModel and config.mistralai_api_key:
+        return _pooled_mistral_model(model, config.mistralai_api_key)
+    return model
+
+
+def _settings(chat: Any, names: tuple[str, ...]) -> dict[str, Any]:
+    settings = {name: getattr(chat, name, None) for name in names}
+    return {name: value for name, value in settings.items() if value is not None}
+
+
+def _pooled_openai_model(model: GenerativeModel, api_key: SecretStr) -> GenerativeModel:
+    pool = get_http_pool("openai")
+    return OpenAIGenerativeModel(
+        model_name=model.model_name,
+        api_key=api_key,
+        http_client=pool.client,
+        http_async_client=pool.async_client,
+        **_settings(model.to_langchain(), _OPENAI_SETTINGS),
+    )
+
+
+def _pooled_mistral_model(model: GenerativeModel, api_key: SecretStr) -> GenerativeModel:
+    settings = _settings(model.to_langchain(), _MISTRAL_SETTINGS)
+    # ChatMistralAI sends relative requests with no timeout, leaving both to its client
+    pool = get_http_pool(
+        "mistralai",
+        base_url=settings["endpoint"],
+        headers={
+            "Content-Type": "application/json",
+            "Accept": "application/json",
+            "Authorization": f"Bearer {api_key.get_secret_value()}",
+        },
+        timeout=settings["timeout"],
+    )
+    return MistralAIGenerativeModel(
+        model_name=model.model_name,
+        api_key=api_key,
+        client=pool.client,
+        async_client=pool.async_client,
+        **settings,
+    )
+
+
+# Global pools, one per provider (created on first use, closed with the application)
+_pools: dict[str, ProviderPool] = {}
+_pools_lock = threading.Lock()
+
+
+def get_http_pool(provider: str, **client_options: Any) -> ProviderPool:
+    """Get the shared connection pool for ``provider``.
+
+    ``client_options`` are used when the pool is first created.
+    """
+    with _pools_lock:
+        if provider not in _pools:
+            settings = get_settings()
+            _pools[provider] = ProviderPool(
+                provider,
+                http2=settings.llm_http2,
+                max_connections=settings.llm_http_max_connections,
+                max_keepalive_connections=settings.llm_http_max_keepalive_connections,
+                keepalive_expiry=settings.llm_http_keepalive_expiry,
+                **client_options,
+            )
+        return _pools[provider]
+
+
+def get_http_pool_stats() -> dict[str, dict[str, Any]]:
+    """Return the counters of every pool, by provider."""
+    with _pools_lock:
+        pools = list(_pools.values())
+    return {pool.provider: pool.stats() for pool in pools}
+
+
+async def close_http_pools() -> None:
+    """Close every pool's connections."""
+    with _pools_lock:
+        pools = list(_pools.values())
+        _pools.clear()
+    for pool in pools:
+        await pool.aclose()
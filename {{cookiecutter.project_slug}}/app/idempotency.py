@@ -0,0 +1,136 @@
+"""Idempotency keys for plan runs, so client retries do not execute twice."""
+
+import asyncio
+import time
+from collections import OrderedDict
+from collections.abc import Awaitable, Callable
+from dataclasses import dataclass, field
+from typing import Any, Generic, TypeVar
+
+from .config import get_settings
+
+T = TypeVar("T")
+
+
+class IdempotencyKeyReusedError(Exception):
+    """Raised when an idempotency key is sent again with a different request."""
+
+    def __init__(self, key: str) -> None:
+        """Record the reused key."""
+        self.key = key
+        super().__init__(f"Idempotency key {key!r} was already used for a different request")
+
+
+@dataclass
+class _Entry(Generic[T]):
+    fingerprint: str
+    task: asyncio.Task[T] = field(repr=False)
+    keep: Callable[[T], bool] | None = field(default=None, repr=False)
+    finished_at: float | None = None
+
+
+class IdempotencyStore(Generic[T]):
+    """Remembers the execution started for each idempotency key.
+
+    The first request with a key starts the execution as its own task, so a
+    client that times out and goes away does not cancel it. A repeat with the
+    same key attaches to that task while it runs and gets its stored result
+    for ``ttl`` seconds after it finishes. Executions that raise, and results
+    the caller chooses not to keep, are forgotten, so the client can retry
+    them.
+    """
+
+    def __init__(self, ttl: float, max_entries: int) -> None:
+        """Create a store keeping finished results for ``ttl`` seconds."""
+        if max_entries < 1:
+            raise ValueError("max_entries must be at least 1")
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self.executions = 0
+        self.replays = 0
+        self._entries: OrderedDict[str, _Entry[T]] = OrderedDict()
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    async def run(
+        self,
+        key: str,
+        fingerprint: str,
+        func: Callable[[], Awaitable[T]],
+        *,
+        keep: Callable[[T], bool] | None = None,
+    ) -> tuple[T, bool]:
+        """Run ``func`` unless ``key`` already has an execution.
+
+        ``fingerprint`` identifies the request; reusing a key for a different
+        request raises ``IdempotencyKeyReusedError``. A result for which
+        ``keep`` returns False is only shared with repeats that arrived while
+        it ran. Returns the result and whether it came from an earlier request.
+        """
+        self._evict()
+        entry = self._entries.get(key)
+        replayed = entry is not None
+
+        if entry is None:
+            entry = _Entry(fingerprint, asyncio.ensure_future(func()), keep)
+            self._entries[key] = entry
+            entry.task.add_done_callback(lambda done: self._finish(key, done))
+            self.executions += 1
+        elif entry.fingerprint != fingerprint:
+            raise IdempotencyKeyReusedError(key)
+        else:
+            self.replays += 1
+
+        return await asyncio.shield(entry.task), replayed
+
+    def stats(self) -> dict[str, int]:
+        """Return a snapshot of the idempotency counters."""
+        return {
+            "entries": len(self._entries),
+            "executions": self.executions,
+            "replays": self.replays,
+        }
+
+    def _finish(self, key: str, task: asyncio.Task[Any]) -> None:
+        entry = self._entries.get(key)
+        if entry is None or entry.task is not task:
+            return
+        if (
+            task.cancelled()
+            or task.exception() is not None
+            or (entry.keep is not None and not entry.keep(task.result()))
+        ):
+            del self._entries[key]
+        else:
+            entry.finished_at = time.monotonic()
+
+    def _evict(self) -> None:
+        """Drop expired results, then the oldest finished ones while over capacity."""
+        now = time.monotonic()
+        overflow = len(self._entries) - self.max_entries + 1
+
+        for key, entry in list(self._entries.items()):
+            if entry.finished_at is None:
+                continue
+            if now - entry.finished_at > self.ttl or overflow > 0:
+                del self._entries[key]
+                overflow -= 1
+
+
+# Global idempotency store for plan runs
+_idempotency_store_instance: IdempotencyStore[Any] | None = None
+
+
+def get_idempotency_store() -> IdempotencyStore[Any]:
+    """Get the global idempotency store for plan runs."""
+    global _idempotency_store_instance
+
+    if _idempotency_store_instance is None:
+        settings = get_settings()
+        _idempotency_store_instance = IdempotencyStore(
+            ttl=settings.idempotency_ttl,
+            max_entries=settings.idempotency_max_entries,
+        )
+
+    return _idempotency_store_instance
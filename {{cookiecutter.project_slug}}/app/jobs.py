@@ -0,0 +1,146 @@
+"""Background job runner for asynchronous plan runs."""
+
+import asyncio
+import time
+import uuid
+from collections import OrderedDict
+from collections.abc import Awaitable, Callable
+from dataclasses import dataclass, field
+
+from fastapi import HTTPException
+from loguru import logger
+
+from .config import get_settings
+from .schemas import PortiaRunRequest, PortiaRunResponse
+from .schemas.response import PlanRunState
+
+RunHandler = Callable[[PortiaRunRequest], Awaitable[PortiaRunResponse]]
+
+
+@dataclass
+class RunJob:
+    """A plan run executing in the background on behalf of a client."""
+
+    id: str
+    request: PortiaRunRequest
+    response: PortiaRunResponse
+    finished_at: float | None = None
+    task: asyncio.Task[None] | None = field(default=None, repr=False)
+
+    @property
+    def done(self) -> bool:
+        """Whether the job has produced its final response."""
+        return self.finished_at is not None
+
+
+class RunJobStore:
+    """Runs plan runs as background tasks and keeps their results for polling.
+
+    Jobs are addressed by the ID handed out on submission. Once the plan run
+    finishes, Portia's own ``plan_run_id`` resolves to the same job.
+    """
+
+    def __init__(self, result_ttl: float, max_jobs: int) -> None:
+        """Create a store keeping finished jobs for ``result_ttl`` seconds."""
+        self.result_ttl = result_ttl
+        self.max_jobs = max_jobs
+        self._jobs: OrderedDict[str, RunJob] = OrderedDict()
+        self._aliases: dict[str, str] = {}
+
+    def __len__(self) -> int:
+        return len(self._jobs)
+
+    def submit(self, request: PortiaRunRequest, handler: RunHandler) -> RunJob:
+        """Start ``handler(request)`` in the background and return its job."""
+        self._evict()
+
+        job_id = f"job-{uuid.uuid4()}"
+        job = RunJob(
+            id=job_id,
+            request=request,
+            response=PortiaRunResponse(status=PlanRunState.NOT_STARTED, plan_run_id=job_id),
+        )
+        self._jobs[job_id] = job
+        job.task = asyncio.create_task(self._run(job, handler), name=job_id)
+        return job
+
+    def get(self, run_id: str) -> RunJob | None:
+        """Look up a job by its job ID or by the Portia plan run ID."""
+        self._evict()
+        return self._jobs.get(self._aliases.get(run_id, run_id))
+
+    def shutdown(self) -> None:
+        """Cancel jobs that are still running."""
+        for job in self._jobs.values():
+            if job.task is not None and not job.task.done():
+                job.task.cancel()
+
+    async def _run(self, job: RunJob, handler: RunHandler) -> None:
+        job.response = job.response.model_copy(update={"status": PlanRunState.IN_PROGRESS})
+
+        try:
+            response = await handler(job.request)
+        except HTTPException as e:
+            response = PortiaRunResponse(
+                status=PlanRunState.FAILED, plan_run_id=job.id, error=str(e.detail)
+            )
+        except Exception as e:
+            logger.exception(f"Error executing background job {job.id}")
+            response = PortiaRunResponse(
+                status=PlanRunState.FAILED,
+                plan_run_id=job.id,
+                error=f"Error executing query: {e!s}",
+            )
+
+        # The handler's response may be shared, e.g. by requests joined to the same run
+        response = response.model_copy(update={"metadata": {**response.metadata, "job_id": job.id}})
+        if response.plan_run_id and response.plan_run_id not in (job.id, "unknown"):
+            self._aliases[response.plan_run_id] = job.id
+
+        job.response = response
+        job.finished_at = time.monotonic()
+
+    def _evict(self) -> None:
+        """Drop expired results, then the oldest finished jobs while over capacity."""
+        now = time.monotonic()
+        overflow = len(self._jobs) - self.max_jobs + 1
+
+        for job in list(self._jobs.values()):
+            if job.finished_at is None:
+                continue
+            if now - job.finished_at > self.result_ttl or overflow > 0:
+                self._remove(job)
+                overflow -= 1
+
+    def _remove(self, job: RunJob) -> None:
+        del self._jobs[job.id]
+        plan_run_id = job.response.plan_run_id
+        if plan_run_id is not None and self._aliases.get(plan_run_id) == job.id:
+            del self._aliases[plan_run_id]
+
+
+# Global job store (created lazily, running jobs are cancelled on shutdown)
+_job_store_instance: RunJobStore | None = None
+
+
+def get_job_store() -> RunJobStore:
+    """Get the global background job store."""
+    global _job_store_instance
+
+    if _job_store_instance is None:
+        settings = get_settings()
+        _job_store_instance = RunJobStore(
+            result_ttl=settings.run_job_result_ttl,
+            max_jobs=settings.run_job_max_entries,
+        )
+
+    return _job_store_instance
+
+
+def shutdown_job_store() -> None:
+    """Cancel running background jobs and drop the global store."""
+    global _job_store_instance
+
+    if _job_store_instance is not None:
+        _job_store_instance.shutdown()
+        _job_store_instance = None
@@ -7,6 +7,13 @@ from loguru import logger
 
 from .config import get_settings
 
+LOG_FORMAT = (
+    "<green>{time:YYYY-MM-DD HH:mm:ss}</green> | "
+    "<level>{level: <8}</level> | "
+    "<cyan>{name}</cyan>:<cyan>{function}</cyan>:<cyan>{line}</cyan> - "
+    "<level>{message}</level>"
+)
+
 
 def setup_logging() -> None:
     """Configure logging for the application."""
@@ -16,16 +23,9 @@ def setup_logging() -> None:
     logger.remove()
 
     # Add custom handler with formatting
-    log_format = (
-        "<green>{time:YYYY-MM-DD HH:mm:ss}</green> | "
-        "<level>{level: <8}</level> | "
-        "<cyan>{name}</cyan>:<cyan>{function}</cyan>:<cyan>{line}</cyan> - "
-        "<level>{message}</level>"
-    )
-
     logger.add(
         sys.stderr,
-        format=log_format,
+        format=LOG_FORMAT,
         level=settings.log_level.upper(),
         colorize=True,
     )
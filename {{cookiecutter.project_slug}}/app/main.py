@@ -3,13 +3,19 @@
 from collections.abc import AsyncGenerator
 from contextlib import asynccontextmanager
 
-from fastapi import FastAPI
+from fastapi import FastAPI, Response
 from fastapi.middleware.cors import CORSMiddleware
 from loguru import logger
 
 from .api import router
+from .cassette import close_cassette
 from .config import get_settings
+from .executor import shutdown_executor
+from .http_clients import close_http_pools
+from .jobs import shutdown_job_store
 from .logging_config import setup_logging
+from .metrics import render_metrics
+from .middleware import RequestBodyLimitMiddleware
 
 
 @asynccontextmanager
@@ -20,9 +26,9 @@ async def lifespan(_app: FastAPI) -> AsyncGenerator[None, None]:
     settings = get_settings()
     logger.info(f"Starting {settings.app_name} v{settings.app_version}")
     logger.info(f"Debug mode: {settings.debug}")
-    logger.info(f"Storage class: {settings.get_portia_storage_class().value}")
+    logger.info(f"Storage class: {settings.get_storage_backend().value}")
 
-    # Initialize Portia on startup to validate configuration
+    # Initialize Portia (and the LLM provider connection pools) on startup to validate configuration
     try:
         from .api.routes import get_portia
         get_portia()
@@ -35,6 +41,11 @@ async def lifespan(_app: FastAPI) -> AsyncGenerator[None, None]:
 
     # Shutdown
     logger.info("Shutting down application")
+    shutdown_job_store()
+    shutdown_executor()
+    # After the executor so that runs finishing during shutdown are still recorded
+    close_cassette()
+    await close_http_pools()
 
 
 def create_app() -> FastAPI:
@@ -60,6 +71,9 @@ def create_app() -> FastAPI:
         allow_headers=["*"],
     )
 
+    # Reject oversized request bodies before they are buffered and parsed
+    app.add_middleware(RequestBodyLimitMiddleware, max_body_size=settings.max_request_size)
+
     # Include API routes
     app.include_router(router, prefix="/api/v1", tags=["portia"])
 
@@ -78,6 +92,14 @@ def create_app() -> FastAPI:
         """Health check endpoint."""
         return {"status": "healthy"}
 
+    if settings.metrics_enabled:
+
+        @app.get("/metrics", include_in_schema=False)
+        async def metrics() -> Response:
+            """Prometheus metrics endpoint."""
+            content, media_type = render_metrics()
+            return Response(content=content, media_type=media_type)
+
     return app
 
 
@@ -0,0 +1,298 @@
+"""Prometheus metrics for plan runs.
+
+Run-level metrics are recorded by the API routes. Planning, step and tool
+timings come from the execution hooks, which measure each stage on the
+plan-run worker thread.
+"""
+
+import time
+from collections.abc import Iterable, Iterator
+from contextlib import contextmanager
+from contextvars import ContextVar
+from dataclasses import dataclass
+
+from prometheus_client import (
+    CONTENT_TYPE_LATEST,
+    CollectorRegistry,
+    Counter,
+    Gauge,
+    Histogram,
+    ProcessCollector,
+    generate_latest,
+)
+
+from .executor import get_executor
+
+# Label used for steps that are answered by the LLM without a tool
+NO_TOOL_LABEL = "none"
+# Label shared by tool IDs that are not registered tools
+OTHER_TOOL_LABEL = "other"
+
+_RUN_BUCKETS = (0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0, 120.0, 300.0)
+_STEP_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+
+REGISTRY = CollectorRegistry()
+ProcessCollector(registry=REGISTRY)
+
+PLAN_RUN_DURATION = Histogram(
+    "portia_plan_run_duration_seconds",
+    "Total time to execute a plan run, including planning and queueing",
+    ["state"],
+    buckets=_RUN_BUCKETS,
+    registry=REGISTRY,
+)
+PLANNING_DURATION = Histogram(
+    "portia_planning_duration_seconds",
+    "Time from the start of a plan run until its plan is ready",
+    buckets=_RUN_BUCKETS,
+    registry=REGISTRY,
+)
+STEP_DURATION = Histogram(
+    "portia_step_duration_seconds",
+    "Time to execute one plan step",
+    ["tool_id"],
+    buckets=_STEP_BUCKETS,
+    registry=REGISTRY,
+)
+TOOL_CALL_DURATION = Histogram(
+    "portia_tool_call_duration_seconds",
+    "Time spent inside a single tool call",
+    ["tool_id"],
+    buckets=_STEP_BUCKETS,
+    registry=REGISTRY,
+)
+SERIALIZATION_DURATION = Histogram(
+    "portia_serialization_duration_seconds",
+    "Time to turn a finished plan run into an API response",
+    registry=REGISTRY,
+)
+PLAN_RUNS = Counter(
+    "portia_plan_runs_total",
+    "Plan runs by final state",
+    ["state"],
+    registry=REGISTRY,
+)
+PLAN_RUN_TIMEOUTS = Counter(
+    "portia_plan_run_timeouts_total",
+    "Plan runs abandoned because they exceeded their deadline",
+    registry=REGISTRY,
+)
+PLAN_RUN_TOOL_USES = Counter(
+    "portia_plan_run_tool_uses_total",
+    "Plan runs whose plan used each tool",
+    ["tool_id"],
+    registry=REGISTRY,
+)
+PLAN_RUNS_IN_FLIGHT = Gauge(
+    "portia_plan_runs_in_flight",
+    "Plan runs currently executing on the plan-run pool",
+    registry=REGISTRY,
+)
+PLAN_RUNS_QUEUED = Gauge(
+    "portia_plan_runs_queued",
+    "Plan runs waiting for a free plan-run worker",
+    registry=REGISTRY,
+)
+PLAN_RUN_MAX_WORKERS = Gauge(
+    "portia_plan_run_max_workers",
+    "Plan runs that can execute at once",
+    registry=REGISTRY,
+)
+PLAN_RUN_MAX_QUEUE = Gauge(
+    "portia_plan_run_max_queue",
+    "Plan runs that can wait for a worker before new ones are rejected (-1 if unbounded)",
+    registry=REGISTRY,
+)
+PLAN_RUNS_REJECTED = Counter(
+    "portia_plan_runs_rejected_total",
+    "Plan runs rejected with 503 because the plan-run queue was full",
+    registry=REGISTRY,
+)
+PLAN_RUNS_RATE_LIMITED = Counter(
+    "portia_plan_runs_rate_limited_total",
+    "Plan runs rejected with 429 because the user was over a quota",
+    ["reason"],
+    registry=REGISTRY,
+)
+PLAN_RUNS_REPLAYED = Counter(
+    "portia_plan_runs_replayed_total",
+    "Run requests answered from an earlier plan run with the same Idempotency-Key",
+    registry=REGISTRY,
+)
+LLM_HTTP_REQUESTS = Counter(
+    "portia_llm_http_requests_total",
+    "Requests sent to LLM providers through the shared connection pools",
+    ["provider"],
+    registry=REGISTRY,
+)
+LLM_HTTP_CONNECTIONS = Counter(
+    "portia_llm_http_connections_total",
+    "Connections opened to LLM providers; every other request reused an open one",
+    ["provider"],
+    registry=REGISTRY,
+)
+LLM_HTTP_TLS_HANDSHAKES = Counter(
+    "portia_llm_http_tls_handshakes_total",
+    "TLS handshakes with LLM providers",
+    ["provider"],
+    registry=REGISTRY,
+)
+LLM_PROVIDER_CALLS = Counter(
+    "portia_llm_provider_calls_total",
+    "LLM calls made through the provider router",
+    ["provider", "outcome"],
+    registry=REGISTRY,
+)
+LLM_PROVIDER_FAILOVERS = Counter(
+    "portia_llm_provider_failovers_total",
+    "LLM calls retried on this provider after failing on another",
+    ["provider"],
+    registry=REGISTRY,
+)
+LLM_PROVIDER_LATENCY = Gauge(
+    "portia_llm_provider_latency_seconds",
+    "Moving average latency of LLM calls that the provider router uses to pick a provider",
+    ["provider"],
+    registry=REGISTRY,
+)
+STORAGE_ENTRIES = Gauge(
+    "portia_storage_entries",
+    "Plans and plan runs held in bounded in-memory storage",
+    ["kind"],
+    registry=REGISTRY,
+)
+STORAGE_BYTES = Gauge(
+    "portia_storage_bytes",
+    "Serialized size of everything held in bounded in-memory storage",
+    registry=REGISTRY,
+)
+STORAGE_EVICTIONS = Counter(
+    "portia_storage_evictions_total",
+    "Entries evicted from bounded in-memory storage",
+    ["reason"],
+    registry=REGISTRY,
+)
+
+
+def _max_queue() -> int:
+    max_queue = get_executor().max_queue
+    return -1 if max_queue is None else max_queue
+
+
+PLAN_RUNS_IN_FLIGHT.set_function(lambda: get_executor().in_flight)
+PLAN_RUNS_QUEUED.set_function(lambda: get_executor().queue_depth)
+PLAN_RUN_MAX_WORKERS.set_function(lambda: get_executor().max_workers)
+PLAN_RUN_MAX_QUEUE.set_function(_max_queue)
+
+
+@dataclass
+class _RunTimer:
+    started_at: float | None
+    step_started_at: float | None = None
+    tool_call_started_at: float | None = None
+
+
+# Shared by reference, so timings marked in one hook are visible to the next
+# even if Portia calls them from a copied context
+_current_timer: ContextVar[_RunTimer | None] = ContextVar("current_run_timer", default=None)
+
+
+# Tools that get their own label; set when Portia is initialized
+_labelled_tool_ids: frozenset[str] = frozenset()
+
+
+def set_labelled_tool_ids(tool_ids: Iterable[str]) -> None:
+    """Set the tool IDs that get their own label; other tool IDs share one."""
+    global _labelled_tool_ids
+    _labelled_tool_ids = frozenset(tool_ids)
+
+
+def tool_label(tool_id: str | None) -> str:
+    """Get the metric label for a tool ID, which may be missing.
+
+    Plans are written by an LLM and can name tools that do not exist, so only
+    registered tools get their own label, which keeps the label set bounded.
+    """
+    if not tool_id:
+        return NO_TOOL_LABEL
+    return tool_id if tool_id in _labelled_tool_ids else OTHER_TOOL_LABEL
+
+
+@contextmanager
+def time_plan_run(*, planning: bool = True) -> Iterator[None]:
+    """Time the stages of the plan run started in this context.
+
+    Pass ``planning=False`` when resuming a plan run that is already planned.
+    """
+    started_at = time.perf_counter() if planning else None
+    token = _current_timer.set(_RunTimer(started_at=started_at))
+    try:
+        yield
+    finally:
+        _current_timer.reset(token)
+
+
+def observe_planning_finished() -> None:
+    """Record how long the current plan run took to get its plan."""
+    timer = _current_timer.get()
+    if timer is not None and timer.started_at is not None:
+        PLANNING_DURATION.observe(time.perf_counter() - timer.started_at)
+        timer.started_at = None
+
+
+def skip_planning() -> None:
+    """Record no planning time for the current plan run, as its plan came from the cache."""
+    timer = _current_timer.get()
+    if timer is not None:
+        timer.started_at = None
+
+
+def mark_step_started() -> None:
+    """Note that the current plan run has started a step."""
+    timer = _current_timer.get()
+    if timer is not None:
+        timer.step_started_at = time.perf_counter()
+
+
+def observe_step_finished(tool_id: str | None) -> None:
+    """Record the duration of the step that the current plan run just finished."""
+    timer = _current_timer.get()
+    if timer is not None and timer.step_started_at is not None:
+        STEP_DURATION.labels(tool_id=tool_label(tool_id)).observe(
+            time.perf_counter() - timer.step_started_at
+        )
+        timer.step_started_at = None
+
+
+def mark_tool_call_started() -> None:
+    """Note that the current plan run is about to call a tool."""
+    timer = _current_timer.get()
+    if timer is not None:
+        timer.tool_call_started_at = time.perf_counter()
+
+
+def observe_tool_call_finished(tool_id: str | None) -> None:
+    """Record the duration of the tool call that the current plan run just made."""
+    timer = _current_timer.get()
+    if timer is not None and timer.tool_call_started_at is not None:
+        TOOL_CALL_DURATION.labels(tool_id=tool_label(tool_id)).observe(
+            time.perf_counter() - timer.tool_call_started_at
+        )
+        timer.tool_call_started_at = None
+
+
+def record_plan_run(
+    state: str, duration: float, tools_used: Iterable[str] = (), *, timed_out: bool = False
+) -> None:
+    """Record a finished plan run."""
+    PLAN_RUN_DURATION.labels(state=state).observe(duration)
+    PLAN_RUNS.labels(state=state).inc()
+    if timed_out:
+        PLAN_RUN_TIMEOUTS.inc()
+    for label in {tool_label(tool_id) for tool_id in tools_used}:
+        PLAN_RUN_TOOL_USES.labels(tool_id=label).inc()
+
+
+def render_metrics() -> tuple[bytes, str]:
+    """Render every metric in the Prometheus text format, with its content type."""
+    return generate_latest(REGISTRY), CONTENT_TYPE_LATEST
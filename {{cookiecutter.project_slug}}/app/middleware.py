@@ -0,0 +1,86 @@
+"""ASGI middleware for the Portia FastAPI application."""
+
+from fastapi import HTTPException
+from fastapi.responses import JSONResponse
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
+
+# Spelled out because Starlette renamed the status constant for 413
+HTTP_413_CONTENT_TOO_LARGE = 413
+
+
+class RequestBodyLimitMiddleware:
+    """Reject request bodies larger than ``max_body_size`` bytes with 413.
+
+    A declared ``Content-Length`` above the limit is rejected before the
+    application runs. Otherwise bytes are counted as they stream in, so a
+    chunked upload is stopped as soon as it crosses the limit rather than
+    after it has been buffered and parsed.
+    """
+
+    def __init__(self, app: ASGIApp, max_body_size: int) -> None:
+        """Wrap ``app`` with a body size limit."""
+        if max_body_size < 1:
+            raise ValueError("max_body_size must be at least 1")
+        self.app = app
+        self.max_body_size = max_body_size
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        """Apply the limit to HTTP requests and pass everything else through."""
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        content_length = _content_length(scope)
+        if content_length is not None and content_length > self.max_body_size:
+            await self._reject(scope, receive, send)
+            return
+
+        received = 0
+        response_started = False
+
+        async def limited_receive() -> Message:
+            nonlocal received
+            message = await receive()
+            if message["type"] == "http.request":
+                received += len(message.get("body", b""))
+                if received > self.max_body_size:
+                    raise HTTPException(
+                        status_code=HTTP_413_CONTENT_TOO_LARGE,
+                        detail=self._detail(),
+                    )
+            return message
+
+        async def tracking_send(message: Message) -> None:
+            nonlocal response_started
+            if message["type"] == "http.response.start":
+                response_started = True
+            await send(message)
+
+        try:
+            await self.app(scope, limited_receive, tracking_send)
+        except HTTPException as e:
+            # Routes turn this into a response themselves; this covers bodies
+            # read outside a route (for example by other middleware).
+            if e.status_code != HTTP_413_CONTENT_TOO_LARGE or response_started:
+                raise
+            await self._reject(scope, receive, send)
+
+    def _detail(self) -> str:
+        return f"Request body exceeds the maximum size of {self.max_body_size} bytes"
+
+    async def _reject(self, scope: Scope, receive: Receive, send: Send) -> None:
+        response = JSONResponse(
+            status_code=HTTP_413_CONTENT_TOO_LARGE,
+            content={"detail": self._detail()},
+        )
+        await response(scope, receive, send)
+
+
+def _content_length(scope: Scope) -> int | None:
+    for name, value in scope.get("headers", []):
+        if name == b"content-length":
+            try:
+                return int(value)
+            except ValueError:
+                return None
+    return None
@@ -0,0 +1,301 @@
+"""Latency-aware routing of LLM calls across providers, with failover.
+
+When several providers have API keys, each call goes to the healthy provider
+with the lowest moving-average latency. A call that fails or takes longer than
+the routing timeout is retried on the next provider, and a provider whose
+moving-average error rate gets too high is skipped for a cooldown period, so
+one provider's brownout slows the calls that hit it rather than every plan run.
+
+Calls with a timeout run on a bounded pool of threads shared by every
+provider. A call that times out keeps its thread until the provider client's
+own request timeout ends it, so when the pool is full new calls are rejected
+rather than piling up more threads.
+"""
+
+import asyncio
+import contextvars
+import threading
+import time
+from collections.abc import Callable, Mapping, Sequence
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass
+from typing import Any, TypeVar
+
+from langchain_core.language_models.chat_models import BaseChatModel
+from langchain_core.messages import BaseMessage
+from langchain_core.outputs import ChatGeneration, ChatResult
+from loguru import logger
+from portia import Config, LLMProvider
+from portia.model import GenerativeModel, Message
+from pydantic import BaseModel, ConfigDict
+
+from .config import get_settings
+from .http_clients import pooled_model
+from .metrics import LLM_PROVIDER_CALLS, LLM_PROVIDER_FAILOVERS, LLM_PROVIDER_LATENCY
+
+T = TypeVar("T")
+BaseModelT = TypeVar("BaseModelT", bound=BaseModel)
+
+
+class AllProvidersFailedError(RuntimeError):
+    """Raised when a call failed on every provider it was tried on."""
+
+
+class RouterSaturatedError(RuntimeError):
+    """Raised when every call thread is busy, most likely with calls that timed out."""
+
+
+@dataclass
+class ProviderHealth:
+    """Moving averages of one provider's latency and error rate."""
+
+    latency: float | None = None
+    error_rate: float = 0.0
+    calls: int = 0
+    failures: int = 0
+    unavailable_until: float = 0.0
+
+
+class ProviderRouter:
+    """Orders providers by health and latency and fails calls over between them."""
+
+    def __init__(
+        self,
+        providers: Sequence[str],
+        *,
+        timeout: float | None = None,
+        alpha: float = 0.3,
+        max_error_rate: float = 0.5,
+        cooldown: float = 30.0,
+        max_pending_calls: int = 64,
+    ) -> None:
+        """Route between ``providers``, preferring earlier ones until latencies are known."""
+        if not providers:
+            raise ValueError("At least one provider is needed")
+        self.providers = list(providers)
+        self.timeout = timeout
+        self.alpha = alpha
+        self.max_error_rate = max_error_rate
+        self.cooldown = cooldown
+        self._lock = threading.Lock()
+        self._health = {provider: ProviderHealth() for provider in self.providers}
+        # One slot per pool thread, so submitted calls never wait in the pool's queue
+        self._slots = threading.BoundedSemaphore(max_pending_calls)
+        self._pool = ThreadPoolExecutor(max_pending_calls, thread_name_prefix="llm-call")
+
+    def order(self) -> list[str]:
+        """Return the providers in the order a call should try them.
+
+        Available providers come first, fastest first; providers not tried
+        yet go before the others so every provider gets measured, but ones
+        that have only failed go after those with a latency. Providers
+        cooling down come last, as a last resort.
+        """
+        now = time.monotonic()
+        with self._lock:
+
+            def key(index: int) -> tuple[bool, bool, float, int]:
+                health = self._health[self.providers[index]]
+                # Errors leave the latency unset, which must not rank as fastest
+                never_succeeded = health.error_rate > 0 and health.latency is None
+                return (
+                    health.unavailable_until > now,
+                    never_succeeded,
+                    health.latency or 0.0,
+                    index,
+                )
+
+            return [self.providers[i] for i in sorted(range(len(self.providers)), key=key)]
+
+    def call(self, calls: Mapping[str, Callable[[], T]]) -> T:
+        """Make a call on the best provider, failing over to the next one on errors."""
+        errors: list[str] = []
+        for provider in self.order():
+            if provider not in calls:
+                continue
+            if errors:
+                LLM_PROVIDER_FAILOVERS.labels(provider=provider).inc()
+            started_at = time.monotonic()
+            try:
+                result = self._call_with_timeout(calls[provider])
+            except RouterSaturatedError:
+                LLM_PROVIDER_CALLS.labels(provider=provider, outcome="rejected").inc()
+                raise
+            except TimeoutError:
+                self.record(provider, self.timeout, ok=False)
+                LLM_PROVIDER_CALLS.labels(provider=provider, outcome="timeout").inc()
+                errors.append(f"{provider}: timed out after {self.timeout}s")
+            except Exception as e:
+                # A provider that fails fast is not fast, so errors leave latency alone
+                self.record(provider, None, ok=False)
+                LLM_PROVIDER_CALLS.labels(provider=provider, outcome="error").inc()
+                errors.append(f"{provider}: {type(e).__name__}: {e}")
+            else:
+                self.record(provider, time.monotonic() - started_at, ok=True)
+                LLM_PROVIDER_CALLS.labels(provider=provider, outcome="success").inc()
+                return result
+            logger.warning(f"LLM call failed on {errors[-1]}")
+
+        raise AllProvidersFailedError("; ".join(errors) or "No provider to call")
+
+    def _call_with_timeout(self, func: Callable[[], T]) -> T:
+        if self.timeout is None:
+            return func()
+        if not self._slots.acquire(blocking=False):
+            raise RouterSaturatedError("Every LLM call thread is busy, retry later")
+
+        # The call keeps its thread if it times out; its result is dropped
+        try:
+            future = self._pool.submit(contextvars.copy_context().run, func)
+        except BaseException:
+            self._slots.release()
+            raise
+        future.add_done_callback(lambda _future: self._slots.release())
+        return future.result(timeout=self.timeout)
+
+    def record(self, provider: str, latency: float | None, *, ok: bool) -> None:
+        """Update a provider's moving averages with the outcome of one call."""
+        with self._lock:
+            health = self._health[provider]
+            health.calls += 1
+            if not ok:
+                health.failures += 1
+            health.error_rate += self.alpha * ((0.0 if ok else 1.0) - health.error_rate)
+            if latency is not None:
+                if health.latency is None:
+                    health.latency = latency
+                else:
+                    health.latency += self.alpha * (latency - health.latency)
+                LLM_PROVIDER_LATENCY.labels(provider=provider).set(health.latency)
+            if not ok and health.error_rate > self.max_error_rate:
+                health.unavailable_until = time.monotonic() + self.cooldown
+
+    def stats(self) -> dict[str, dict[str, Any]]:
+        """Return each provider's health, by provider."""
+        now = time.monotonic()
+        with self._lock:
+            return {
+                provider: {
+                    "latency": health.latency,
+                    "error_rate": health.error_rate,
+                    "calls": health.calls,
+                    "failures": health.failures,
+                    "available": health.unavailable_until <= now,
+                }
+                for provider, health in self._health.items()
+            }
+
+
+class RoutingGenerativeModel(GenerativeModel):
+    """A model that sends each call to the best of several providers' models."""
+
+    def __init__(self, models: Mapping[str, GenerativeModel], router: ProviderRouter) -> None:
+        """Route calls between ``models``, keyed by provider."""
+        super().__init__(next(iter(models.values())).model_name)
+        self.models = dict(models)
+        self.router = router
+
+    def __str__(self) -> str:
+        return "routing/" + ",".join(str(model) for model in self.models.values())
+
+    def get_response(self, messages: list[Message]) -> Message:
+        """Get a plain response from the best provider."""
+        return self.router.call(
+            {
+                provider: lambda model=model: model.get_response(messages)
+                for provider, model in self.models.items()
+            }
+        )
+
+    def get_structured_response(
+        self, messages: list[Message], schema: type[BaseModelT]
+    ) -> BaseModelT:
+        """Get a response in the shape of ``schema`` from the best provider."""
+        return self.router.call(
+            {
+                provider: lambda model=model: model.get_structured_response(messages, schema)
+                for provider, model in self.models.items()
+            }
+        )
+
+    async def aget_response(self, messages: list[Message]) -> Message:
+        """Get a plain response without blocking the event loop."""
+        return await asyncio.to_thread(self.get_response, messages)
+
+    async def aget_structured_response(
+        self, messages: list[Message], schema: type[BaseModelT]
+    ) -> BaseModelT:
+        """Get a structured response without blocking the event loop."""
+        return await asyncio.to_thread(self.get_structured_response, messages, schema)
+
+    def to_langchain(self) -> BaseChatModel:
+        """Get a LangChain chat model that routes through the same providers."""
+        chats = {provider: model.to_langchain() for provider, model in self.models.items()}
+        return RoutingChatModel(router=self.router, chats=chats)
+
+
+class RoutingChatModel(BaseChatModel):
+    """LangChain chat model that sends each call to the best provider's chat model."""
+
+    model_config = ConfigDict(arbitrary_types_allowed=True)
+
+    router: ProviderRouter
+    chats: dict[str, Any]
+
+    @property
+    def _llm_type(self) -> str:
+        return "routing"
+
+    def bind_tools(self, tools: Sequence[Any], **kwargs: Any) -> "RoutingChatModel":
+        """Bind ``tools`` to every provider's chat model."""
+        chats = {
+            provider: chat.bind_tools(tools, **kwargs) for provider, chat in self.chats.items()
+        }
+        return self.model_copy(update={"chats": chats})
+
+    def _generate(
+        self,
+        messages: list[BaseMessage],
+        stop: list[str] | None = None,
+        run_manager: Any = None,  # noqa: ARG002
+        **kwargs: Any,
+    ) -> ChatResult:
+        message = self.router.call(
+            {
+                provider: lambda chat=chat: chat.invoke(messages, stop=stop, **kwargs)
+                for provider, chat in self.chats.items()
+            }
+        )
+        return ChatResult(generations=[ChatGeneration(message=message)])
+
+
+def build_routing_model(**config_kwargs: Any) -> RoutingGenerativeModel:
+    """Build a routing model over every provider that has an API key.
+
+    Each provider's model is the default Portia picks for it, on the
+    provider's shared connection pool where the integration allows.
+    """
+    settings = get_settings()
+    api_keys = {
+        LLMProvider.OPENAI: settings.openai_api_key,
+        LLMProvider.ANTHROPIC: settings.anthropic_api_key,
+        LLMProvider.MISTRALAI: settings.mistral_api_key,
+        LLMProvider.GOOGLE: settings.google_api_key,
+    }
+
+    models: dict[str, GenerativeModel] = {}
+    for provider, api_key in api_keys.items():
+        if api_key:
+            config = Config.from_default(llm_provider=provider, **config_kwargs)
+            models[provider.value] = pooled_model(config.get_default_model(), config)
+
+    router = ProviderRouter(
+        list(models),
+        timeout=settings.llm_routing_timeout,
+        alpha=settings.llm_routing_alpha,
+        max_error_rate=settings.llm_routing_max_error_rate,
+        cooldown=settings.llm_routing_cooldown,
+        max_pending_calls=settings.llm_routing_max_pending_calls,
+    )
+    logger.info(f"Routing LLM calls between {', '.join(models)}")
+    return RoutingGenerativeModel(models, router)
@@ -0,0 +1,109 @@
+"""In-process LRU/TTL cache of Portia plans.
+
+Planning is an LLM round trip. Queries that only differ in their
+``plan_run_inputs`` produce the same plan, so a plan can be reused for any
+request with the same normalized query, tool set, input names and model.
+"""
+
+import threading
+import time
+from collections import OrderedDict
+from collections.abc import Iterable
+from typing import Any
+
+from .config import get_settings
+
+PlanCacheKey = tuple[str, tuple[str, ...], tuple[str, ...], str]
+
+
+def normalize_query(query: str) -> str:
+    """Normalize a query so that whitespace differences share a plan.
+
+    Case is kept: plans copy literals from the query into step inputs and
+    task text, so "Reverse 'Hello'" must not reuse the plan for "reverse 'hello'".
+    """
+    return " ".join(query.split())
+
+
+def make_plan_cache_key(
+    query: str, tool_ids: Iterable[str], input_names: Iterable[str], model: str
+) -> PlanCacheKey:
+    """Build the cache key for a plan."""
+    return (normalize_query(query), tuple(sorted(tool_ids)), tuple(sorted(input_names)), model)
+
+
+class PlanCache:
+    """Thread-safe LRU cache with per-entry TTL and hit/miss counters."""
+
+    def __init__(self, max_size: int, ttl: float) -> None:
+        """Create a cache holding up to ``max_size`` plans for ``ttl`` seconds each."""
+        self.max_size = max_size
+        self.ttl = ttl
+        self._entries: OrderedDict[PlanCacheKey, tuple[float, Any]] = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def get(self, key: PlanCacheKey) -> Any | None:
+        """Return the cached plan for ``key``, or ``None`` on a miss."""
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and entry[0] <= time.monotonic():
+                del self._entries[key]
+                self.evictions += 1
+                entry = None
+
+            if entry is None:
+                self.misses += 1
+                return None
+
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return entry[1]
+
+    def put(self, key: PlanCacheKey, plan: Any) -> None:
+        """Cache ``plan`` under ``key``, evicting the least recently used entries."""
+        with self._lock:
+            self._entries[key] = (time.monotonic() + self.ttl, plan)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_size:
+                self._entries.popitem(last=False)
+                self.evictions += 1
+
+    def clear(self) -> None:
+        """Drop every cached plan."""
+        with self._lock:
+            self._entries.clear()
+
+    def stats(self) -> dict[str, int]:
+        """Return a snapshot of the cache counters."""
+        with self._lock:
+            return {
+                "size": len(self._entries),
+                "max_size": self.max_size,
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+            }
+
+
+# Global plan cache (created lazily)
+_plan_cache_instance: PlanCache | None = None
+
+
+def get_plan_cache() -> PlanCache:
+    """Get the global plan cache."""
+    global _plan_cache_instance
+
+    if _plan_cache_instance is None:
+        settings = get_settings()
+        _plan_cache_instance = PlanCache(
+            max_size=settings.plan_cache_max_size,
+            ttl=settings.plan_cache_ttl,
+        )
+
+    return _plan_cache_instance
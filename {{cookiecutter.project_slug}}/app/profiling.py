@@ -0,0 +1,199 @@
+"""Opt-in sampling profiler for individual plan runs.
+
+A profiled request binds a ``RunProfile`` to its context. The plan-run worker
+picks it up through ``sample_current_thread`` and a background thread samples
+the worker's stack at a fixed interval. Samples are kept as collapsed stacks,
+the text format read by speedscope and ``flamegraph.pl``.
+"""
+
+import random
+import sys
+import threading
+import time
+from collections import Counter, OrderedDict, deque
+from collections.abc import Iterator
+from contextlib import contextmanager
+from contextvars import ContextVar
+from types import FrameType
+from uuid import uuid4
+
+from .config import get_settings
+
+
+def _frame_name(frame: FrameType) -> str:
+    module = frame.f_globals.get("__name__", "?")
+    return f"{module}.{frame.f_code.co_qualname}"
+
+
+def collapse_stack(frame: FrameType | None) -> str:
+    """Render a stack as semicolon-separated frame names, outermost first."""
+    names = []
+    while frame is not None:
+        names.append(_frame_name(frame))
+        frame = frame.f_back
+    return ";".join(reversed(names))
+
+
+class RunProfile:
+    """Stack samples collected for one plan run."""
+
+    def __init__(self, interval: float) -> None:
+        """Create an empty profile sampled every ``interval`` seconds."""
+        self.id = f"profile-{uuid4()}"
+        self.interval = interval
+        self.created_at = time.time()
+        self.duration = 0.0
+        self._stacks: Counter[str] = Counter()
+        self._lock = threading.Lock()
+
+    @property
+    def sample_count(self) -> int:
+        """Total number of samples taken."""
+        with self._lock:
+            return sum(self._stacks.values())
+
+    def add_sample(self, stack: str) -> None:
+        """Count one occurrence of ``stack``."""
+        with self._lock:
+            self._stacks[stack] += 1
+
+    def to_collapsed(self) -> str:
+        """Render the profile in collapsed-stack format, one stack per line."""
+        with self._lock:
+            stacks = sorted(self._stacks.items())
+        return "".join(f"{stack} {count}\n" for stack, count in stacks)
+
+
+@contextmanager
+def _sample_thread(profile: RunProfile, thread_id: int) -> Iterator[None]:
+    stop = threading.Event()
+
+    def sample() -> None:
+        while not stop.wait(profile.interval):
+            frame = sys._current_frames().get(thread_id)
+            if frame is not None:
+                profile.add_sample(collapse_stack(frame))
+
+    sampler = threading.Thread(target=sample, name="profile-sampler", daemon=True)
+    started_at = time.perf_counter()
+    sampler.start()
+    try:
+        yield
+    finally:
+        stop.set()
+        sampler.join()
+        profile.duration = time.perf_counter() - started_at
+
+
+class ProfileSampler:
+    """Decides which requests are profiled.
+
+    A request that asks for a profile is profiled with probability
+    ``sample_rate``, and never more than ``max_per_minute`` times a minute.
+    """
+
+    def __init__(self, sample_rate: float, max_per_minute: int) -> None:
+        """Create a sampler with the given rate limits."""
+        if not 0 <= sample_rate <= 1:
+            raise ValueError("sample_rate must be between 0 and 1")
+        if max_per_minute < 0:
+            raise ValueError("max_per_minute must not be negative")
+        self.sample_rate = sample_rate
+        self.max_per_minute = max_per_minute
+        self._recent: deque[float] = deque()
+        self._lock = threading.Lock()
+
+    def should_profile(self) -> bool:
+        """Decide whether to profile one request that asked for it."""
+        if random.random() >= self.sample_rate:
+            return False
+        now = time.monotonic()
+        with self._lock:
+            while self._recent and now - self._recent[0] >= 60:
+                self._recent.popleft()
+            if len(self._recent) >= self.max_per_minute:
+                return False
+            self._recent.append(now)
+            return True
+
+
+class ProfileStore:
+    """Keeps the most recent profiles for download."""
+
+    def __init__(self, max_entries: int) -> None:
+        """Create a store that holds up to ``max_entries`` profiles."""
+        if max_entries < 1:
+            raise ValueError("max_entries must be at least 1")
+        self.max_entries = max_entries
+        self._profiles: OrderedDict[str, RunProfile] = OrderedDict()
+        self._lock = threading.Lock()
+
+    def __len__(self) -> int:
+        with self._lock:
+            return len(self._profiles)
+
+    def add(self, profile: RunProfile) -> None:
+        """Store ``profile``, dropping the oldest one if the store is full."""
+        with self._lock:
+            self._profiles[profile.id] = profile
+            while len(self._profiles) > self.max_entries:
+                self._profiles.popitem(last=False)
+
+    def get(self, profile_id: str) -> RunProfile | None:
+        """Look up a stored profile."""
+        with self._lock:
+            return self._profiles.get(profile_id)
+
+
+_current_profile: ContextVar[RunProfile | None] = ContextVar("current_profile", default=None)
+
+
+@contextmanager
+def profile_run(profile: RunProfile) -> Iterator[None]:
+    """Profile plan runs started in this context into ``profile``."""
+    token = _current_profile.set(profile)
+    try:
+        yield
+    finally:
+        _current_profile.reset(token)
+
+
+@contextmanager
+def sample_current_thread() -> Iterator[None]:
+    """Sample this thread's stack if a profile is bound to the current context."""
+    profile = _current_profile.get()
+    if profile is None:
+        yield
+        return
+
+    with _sample_thread(profile, threading.get_ident()):
+        yield
+
+
+# Global profile sampler and store
+_profile_sampler_instance: ProfileSampler | None = None
+_profile_store_instance: ProfileStore | None = None
+
+
+def get_profile_sampler() -> ProfileSampler:
+    """Get the global profile sampler."""
+    global _profile_sampler_instance
+
+    if _profile_sampler_instance is None:
+        settings = get_settings()
+        _profile_sampler_instance = ProfileSampler(
+            sample_rate=settings.profiling_sample_rate,
+            max_per_minute=settings.profiling_max_per_minute,
+        )
+
+    return _profile_sampler_instance
+
+
+def get_profile_store() -> ProfileStore:
+    """Get the global profile store."""
+    global _profile_store_instance
+
+    if _profile_store_instance is None:
+        _profile_store_instance = ProfileStore(max_entries=get_settings().profiling_max_stored)
+
+    return _profile_store_instance
@@ -0,0 +1,360 @@
+"""Per-user rate limits and concurrency quotas for plan runs.
+
+Each user has a token bucket that refills at a steady rate up to a burst
+size, and a cap on plan runs in progress. Every plan run takes a token and
+holds a lease on one of the user's concurrent slots until it finishes.
+
+The state lives in a backend: in process memory by default, or in a SQLite
+file that every worker process on a host shares. Other shared stores can be
+plugged in by implementing ``QuotaBackend``.
+"""
+
+import asyncio
+import math
+import sqlite3
+import threading
+import time
+from abc import ABC, abstractmethod
+from dataclasses import dataclass, field
+from pathlib import Path
+from types import TracebackType
+from uuid import uuid4
+
+from .config import RateLimitBackend, get_settings
+
+# Suggested wait before retrying a run rejected for too many runs in progress
+CONCURRENCY_RETRY_AFTER = 1.0
+
+
+@dataclass(frozen=True)
+class QuotaPolicy:
+    """Limits applied to every user."""
+
+    rate: float
+    burst: int
+    max_concurrent: int
+    lease_ttl: float
+
+
+@dataclass(frozen=True)
+class QuotaDecision:
+    """Outcome of asking for a plan run, with the user's remaining budget."""
+
+    allowed: bool
+    limit: int
+    remaining: int
+    max_concurrent: int
+    running: int
+    retry_after: float = 0.0
+    reason: str | None = None
+
+
+def _refill(tokens: float, updated_at: float, now: float, policy: QuotaPolicy) -> float:
+    return min(float(policy.burst), tokens + max(0.0, now - updated_at) * policy.rate)
+
+
+def _take(tokens: float, running: int, policy: QuotaPolicy) -> tuple[float, QuotaDecision]:
+    """Take a token and a slot if both are free; return the new token count and the decision."""
+    if running >= policy.max_concurrent:
+        reason, retry_after = "concurrency", CONCURRENCY_RETRY_AFTER
+    elif tokens < 1:
+        reason, retry_after = "rate", (1 - tokens) / policy.rate
+    else:
+        reason, retry_after = None, 0.0
+        tokens -= 1
+        running += 1
+
+    return tokens, QuotaDecision(
+        allowed=reason is None,
+        limit=policy.burst,
+        remaining=math.floor(tokens),
+        max_concurrent=policy.max_concurrent,
+        running=running,
+        retry_after=retry_after,
+        reason=reason,
+    )
+
+
+class QuotaBackend(ABC):
+    """Storage for token buckets and concurrency leases, keyed by user."""
+
+    @abstractmethod
+    def acquire(self, key: str, lease_id: str, now: float, policy: QuotaPolicy) -> QuotaDecision:
+        """Atomically take a token and record lease ``lease_id`` if ``key`` has budget left."""
+
+    @abstractmethod
+    def release(self, key: str, lease_id: str) -> None:
+        """Free the concurrent slot held by ``lease_id``."""
+
+
+@dataclass
+class _Bucket:
+    tokens: float
+    updated_at: float
+    leases: dict[str, float] = field(default_factory=dict)
+
+
+class InMemoryQuotaBackend(QuotaBackend):
+    """Quota state for a single process.
+
+    Users whose bucket has refilled and who have nothing running are dropped
+    once more than ``max_keys`` users are tracked.
+    """
+
+    def __init__(self, max_keys: int = 100_000) -> None:
+        """Create an empty backend tracking up to about ``max_keys`` users."""
+        if max_keys < 1:
+            raise ValueError("max_keys must be at least 1")
+        self.max_keys = max_keys
+        self._buckets: dict[str, _Bucket] = {}
+        self._lock = threading.Lock()
+
+    def __len__(self) -> int:
+        with self._lock:
+            return len(self._buckets)
+
+    def acquire(self, key: str, lease_id: str, now: float, policy: QuotaPolicy) -> QuotaDecision:
+        """Take a token and a slot for ``key`` if it has budget left."""
+        with self._lock:
+            bucket = self._buckets.get(key)
+            if bucket is None:
+                bucket = _Bucket(tokens=float(policy.burst), updated_at=now)
+                self._buckets[key] = bucket
+
+            bucket.leases = {
+                held: expires_at for held, expires_at in bucket.leases.items() if expires_at > now
+            }
+            tokens = _refill(bucket.tokens, bucket.updated_at, now, policy)
+            bucket.tokens, decision = _take(tokens, len(bucket.leases), policy)
+            bucket.updated_at = now
+            if decision.allowed:
+                bucket.leases[lease_id] = now + policy.lease_ttl
+
+            if len(self._buckets) > self.max_keys:
+                self._prune(now, policy)
+            return decision
+
+    def release(self, key: str, lease_id: str) -> None:
+        """Free the slot held by ``lease_id``."""
+        with self._lock:
+            bucket = self._buckets.get(key)
+            if bucket is not None:
+                bucket.leases.pop(lease_id, None)
+
+    def _prune(self, now: float, policy: QuotaPolicy) -> None:
+        # A user with a full bucket and nothing running is the same as an unseen one
+        idle = [
+            key
+            for key, bucket in self._buckets.items()
+            if not bucket.leases
+            and _refill(bucket.tokens, bucket.updated_at, now, policy) >= policy.burst
+        ]
+        for key in idle:
+            del self._buckets[key]
+
+
+_QUOTA_SCHEMA = """
+CREATE TABLE IF NOT EXISTS quota_buckets (
+    user_key TEXT PRIMARY KEY,
+    tokens REAL NOT NULL,
+    updated_at REAL NOT NULL
+);
+
+CREATE TABLE IF NOT EXISTS quota_leases (
+    user_key TEXT NOT NULL,
+    lease_id TEXT NOT NULL,
+    expires_at REAL NOT NULL,
+    PRIMARY KEY (user_key, lease_id)
+);
+"""
+
+
+class SQLiteQuotaBackend(QuotaBackend):
+    """Quota state in a SQLite file, shared by every process that opens it.
+
+    Each decision runs in its own write transaction, so workers never hand
+    out the same token twice. Leases expire after the policy's ``lease_ttl``,
+    which frees the slots of a worker that died mid-run.
+    """
+
+    def __init__(self, path: str | Path) -> None:
+        """Open (and if needed create) the quota database at ``path``."""
+        self.path = str(path)
+        Path(self.path).parent.mkdir(parents=True, exist_ok=True)
+        self._local = threading.local()
+        self._connection().executescript(_QUOTA_SCHEMA)
+
+    def _connection(self) -> sqlite3.Connection:
+        # One connection per thread, with transactions managed explicitly
+        connection = getattr(self._local, "connection", None)
+        if connection is None:
+            connection = sqlite3.connect(self.path, timeout=30, isolation_level=None)
+            connection.execute("PRAGMA journal_mode=WAL")
+            connection.execute("PRAGMA synchronous=NORMAL")
+            self._local.connection = connection
+        return connection
+
+    def acquire(self, key: str, lease_id: str, now: float, policy: QuotaPolicy) -> QuotaDecision:
+        """Take a token and a slot for ``key`` if it has budget left."""
+        connection = self._connection()
+        connection.execute("BEGIN IMMEDIATE")
+        try:
+            connection.execute(
+                "DELETE FROM quota_leases WHERE user_key = ? AND expires_at <= ?", (key, now)
+            )
+            (running,) = connection.execute(
+                "SELECT COUNT(*) FROM quota_leases WHERE user_key = ?", (key,)
+            ).fetchone()
+            row = connection.execute(
+                "SELECT tokens, updated_at FROM quota_buckets WHERE user_key = ?", (key,)
+            ).fetchone()
+            tokens = float(policy.burst) if row is None else _refill(row[0], row[1], now, policy)
+
+            tokens, decision = _take(tokens, running, policy)
+            connection.execute(
+                "INSERT INTO quota_buckets (user_key, tokens, updated_at) VALUES (?, ?, ?) "
+                "ON CONFLICT (user_key) DO UPDATE SET "
+                "tokens = excluded.tokens, updated_at = excluded.updated_at",
+                (key, tokens, now),
+            )
+            if decision.allowed:
+                connection.execute(
+                    "INSERT INTO quota_leases (user_key, lease_id, expires_at) VALUES (?, ?, ?)",
+                    (key, lease_id, now + policy.lease_ttl),
+                )
+            connection.execute("COMMIT")
+        except BaseException:
+            connection.execute("ROLLBACK")
+            raise
+        return decision
+
+    def release(self, key: str, lease_id: str) -> None:
+        """Free the slot held by ``lease_id``."""
+        self._connection().execute(
+            "DELETE FROM quota_leases WHERE user_key = ? AND lease_id = ?", (key, lease_id)
+        )
+
+
+class QuotaExceededError(Exception):
+    """Raised when a user has no rate or concurrency budget left."""
+
+    def __init__(self, user_id: str, decision: QuotaDecision) -> None:
+        """Record the rejected user and their remaining budget."""
+        self.user_id = user_id
+        self.decision = decision
+        if decision.reason == "concurrency":
+            message = (
+                f"User {user_id} already has {decision.running} plan runs in progress "
+                f"(limit {decision.max_concurrent})"
+            )
+        else:
+            message = (
+                f"Rate limit exceeded for user {user_id}, retry in {decision.retry_after:.1f}s"
+            )
+        super().__init__(message)
+
+
+class QuotaLease:
+    """A user's claim on one concurrent plan run, released when the run ends."""
+
+    def __init__(self, limiter: "UserRateLimiter", user_id: str, lease_id: str) -> None:
+        """Wrap a lease granted by ``limiter``."""
+        self.user_id = user_id
+        self.lease_id = lease_id
+        self._limiter = limiter
+        self._released = False
+
+    def release(self) -> None:
+        """Free the slot; later calls do nothing."""
+        if not self._released:
+            self._released = True
+            self._limiter.backend.release(self.user_id, self.lease_id)
+
+    async def arelease(self) -> None:
+        """Free the slot from a worker thread, so the backend never blocks the event loop."""
+        if not self._released:
+            await asyncio.to_thread(self.release)
+
+    def __enter__(self) -> "QuotaLease":
+        return self
+
+    def __exit__(
+        self,
+        exc_type: type[BaseException] | None,
+        exc: BaseException | None,
+        traceback: TracebackType | None,
+    ) -> None:
+        self.release()
+
+
+class UserRateLimiter:
+    """Applies one ``QuotaPolicy`` to every user through a backend."""
+
+    def __init__(self, backend: QuotaBackend, policy: QuotaPolicy) -> None:
+        """Create a limiter that keeps its state in ``backend``."""
+        self.backend = backend
+        self.policy = policy
+
+    def acquire(self, user_id: str) -> tuple[QuotaLease, QuotaDecision]:
+        """Take a token and a slot for ``user_id``.
+
+        Raises ``QuotaExceededError`` if the user has no budget left. Release
+        the returned lease when the plan run finishes.
+        """
+        lease_id = uuid4().hex
+        decision = self.backend.acquire(user_id, lease_id, time.time(), self.policy)
+        if not decision.allowed:
+            raise QuotaExceededError(user_id, decision)
+        return QuotaLease(self, user_id, lease_id), decision
+
+    async def aacquire(self, user_id: str) -> tuple[QuotaLease, QuotaDecision]:
+        """Take a token and a slot for ``user_id`` from a worker thread.
+
+        Backends such as SQLite can wait on other processes' locks, so async
+        callers use this instead of ``acquire``. A caller cancelled while the
+        backend is deciding does not leak the slot: the lease it would have
+        got is released once the decision is made.
+        """
+        # The thread cannot be stopped, so let it finish and hand back what it took
+        acquiring = asyncio.ensure_future(asyncio.to_thread(self.acquire, user_id))
+        try:
+            return await asyncio.shield(acquiring)
+        except asyncio.CancelledError:
+            acquiring.add_done_callback(_release_abandoned)
+            raise
+
+
+def _release_abandoned(acquiring: "asyncio.Future[tuple[QuotaLease, QuotaDecision]]") -> None:
+    """Release a lease granted after the caller that asked for it was cancelled."""
+    if acquiring.cancelled() or acquiring.exception() is not None:
+        return
+    lease, _decision = acquiring.result()
+    asyncio.get_running_loop().run_in_executor(None, lease.release)
+
+
+# Global rate limiter
+_rate_limiter_instance: UserRateLimiter | None = None
+
+
+def get_rate_limiter() -> UserRateLimiter:
+    """Get the global per-user rate limiter."""
+    global _rate_limiter_instance
+
+    if _rate_limiter_instance is None:
+        settings = get_settings()
+        if settings.rate_limit_backend == RateLimitBackend.SQLITE:
+            backend: QuotaBackend = SQLiteQuotaBackend(settings.rate_limit_sqlite_path)
+        else:
+            backend = InMemoryQuotaBackend()
+        _rate_limiter_instance = UserRateLimiter(
+            backend,
+            QuotaPolicy(
+                rate=settings.rate_limit_per_minute / 60,
+                burst=settings.rate_limit_burst,
+                max_concurrent=settings.rate_limit_max_concurrent,
+                # Outlive the longest plan run, so only crashed runs' leases expire
+                lease_ttl=float(settings.request_timeout) + 60,
+            ),
+        )
+
+    return _rate_limiter_instance
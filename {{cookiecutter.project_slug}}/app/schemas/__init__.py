@@ -1,15 +1,31 @@
 """Pydantic schemas for the FastAPI application."""
 
-from .request import PortiaRunRequest
+from .request import (
+    PortiaBatchRunRequest,
+    PortiaClarificationRequest,
+    PortiaRunRequest,
+    RunPriority,
+)
 from .response import (
+    BatchRunItem,
     ClarificationResponse,
+    PortiaBatchRunResponse,
+    PortiaRunListResponse,
     PortiaRunResponse,
     PortiaStatusResponse,
+    RunSummary,
 )
 
 __all__ = [
+    "BatchRunItem",
     "ClarificationResponse",
+    "PortiaBatchRunRequest",
+    "PortiaBatchRunResponse",
+    "PortiaClarificationRequest",
+    "PortiaRunListResponse",
     "PortiaRunRequest",
     "PortiaRunResponse",
     "PortiaStatusResponse",
+    "RunPriority",
+    "RunSummary",
 ]
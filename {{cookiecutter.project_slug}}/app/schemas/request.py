@@ -1,8 +1,22 @@
 """Request schemas for the Portia FastAPI integration."""
 
+import json
+from enum import StrEnum
 from typing import Any
 
-from pydantic import BaseModel, Field
+from pydantic import BaseModel, Field, field_validator
+
+# Per-field caps, applied on top of the overall request body limit
+MAX_QUERY_LENGTH = 10_000
+MAX_PLAN_RUN_INPUTS_SIZE = 100_000  # bytes, as serialized JSON
+
+
+class RunPriority(StrEnum):
+    """Scheduling lanes for plan runs waiting for a worker."""
+
+    INTERACTIVE = "interactive"
+    DEFAULT = "default"
+    BATCH = "batch"
 
 
 class PortiaRunRequest(BaseModel):
@@ -10,6 +24,7 @@ class PortiaRunRequest(BaseModel):
 
     query: str = Field(
         ...,
+        max_length=MAX_QUERY_LENGTH,
         description="The query or task to execute",
         examples=["Tell me a joke about programming", "Roll 2d6 dice"],
     )
@@ -32,6 +47,37 @@ class PortiaRunRequest(BaseModel):
         default=None,
         description="Optional JSON schema for structured output validation",
     )
+    timeout: float | None = Field(
+        default=None,
+        gt=0,
+        description="Optional deadline in seconds. Can only lower the server's request timeout.",
+        examples=[30],
+    )
+    use_plan_cache: bool = Field(
+        default=True,
+        description="Reuse a cached plan for this query and tool set when the plan cache is enabled",
+    )
+    coalesce: bool = Field(
+        default=True,
+        description="Share the result of an identical in-flight run when only deterministic tools are used",
+    )
+    priority: RunPriority = Field(
+        default=RunPriority.DEFAULT,
+        description="Scheduling lane while waiting for a worker: interactive, default or batch",
+    )
+
+    @field_validator("plan_run_inputs")
+    @classmethod
+    def validate_plan_run_inputs_size(cls, v: dict[str, Any] | None) -> dict[str, Any] | None:
+        """Reject plan run inputs whose serialized size exceeds the cap."""
+        if v is not None:
+            size = len(json.dumps(v, default=str).encode())
+            if size > MAX_PLAN_RUN_INPUTS_SIZE:
+                raise ValueError(
+                    f"plan_run_inputs is {size} bytes, "
+                    f"exceeding the maximum of {MAX_PLAN_RUN_INPUTS_SIZE} bytes"
+                )
+        return v
 
     model_config = {
         "json_schema_extra": {
@@ -52,3 +98,50 @@ class PortiaRunRequest(BaseModel):
             ]
         }
     }
+
+
+class PortiaBatchRunRequest(BaseModel):
+    """Request schema for running many Portia queries in one call."""
+
+    requests: list[PortiaRunRequest] = Field(
+        ...,
+        min_length=1,
+        description="The run requests to execute. Results are reported per item.",
+    )
+    concurrency: int | None = Field(
+        default=None,
+        ge=1,
+        description="Maximum number of items executed at once (capped by the server limit)",
+    )
+    stream: bool = Field(
+        default=False,
+        description="Stream results as NDJSON in completion order instead of one ordered response",
+    )
+
+    model_config = {
+        "json_schema_extra": {
+            "examples": [
+                {
+                    "requests": [
+                        {"query": "Tell me a programming joke"},
+                        {"query": "Roll 3d6", "tools": ["roll_dice"]},
+                    ],
+                    "concurrency": 4,
+                }
+            ]
+        }
+    }
+
+
+class PortiaClarificationRequest(BaseModel):
+    """Request schema for answering a clarification raised by a plan run."""
+
+    response: Any = Field(
+        ...,
+        description="The answer to the clarification, e.g. the chosen option or the requested value",
+        examples=["yes", "London", 42],
+    )
+    priority: RunPriority = Field(
+        default=RunPriority.DEFAULT,
+        description="Scheduling lane while waiting for a worker: interactive, default or batch",
+    )
@@ -86,6 +86,51 @@ class PortiaRunResponse(BaseModel):
     }
 
 
+class BatchRunItem(BaseModel):
+    """Result of a single item in a batch run."""
+
+    index: int = Field(..., description="Position of the item in the batch request")
+    status_code: int = Field(
+        ..., description="HTTP status the item would have received as a standalone request"
+    )
+    response: PortiaRunResponse | None = Field(
+        default=None, description="The run response if the item executed"
+    )
+    error: str | None = Field(default=None, description="Error message if the item failed")
+
+
+class PortiaBatchRunResponse(BaseModel):
+    """Response schema for a batch run, with results in request order."""
+
+    results: list[BatchRunItem] = Field(..., description="Per-item results in request order")
+    metadata: dict[str, Any] = Field(
+        default_factory=dict,
+        description="Additional metadata about the batch execution",
+    )
+
+
+class RunSummary(BaseModel):
+    """Compact description of a stored plan run."""
+
+    plan_run_id: str = Field(..., description="ID of the plan run")
+    plan_id: str = Field(..., description="ID of the plan the run executes")
+    user_id: str | None = Field(default=None, description="End user the run belongs to")
+    status: PlanRunState = Field(..., description="Current status of the plan run")
+    query: str | None = Field(default=None, description="Query the plan was made for")
+    created_at: datetime = Field(..., description="When the plan run was first stored")
+    updated_at: datetime = Field(..., description="When the plan run was last stored")
+
+
+class PortiaRunListResponse(BaseModel):
+    """Response schema for one page of the plan-run history."""
+
+    runs: list[RunSummary] = Field(..., description="Plan runs on this page, newest first")
+    next_cursor: str | None = Field(
+        default=None,
+        description="Cursor for the next page, or null on the last page",
+    )
+
+
 class PortiaStatusResponse(BaseModel):
     """Response schema for API status check."""
 
@@ -93,4 +138,12 @@ class PortiaStatusResponse(BaseModel):
     version: str = Field(..., description="API version")
     portia_version: str = Field(..., description="Portia SDK version")
     available_tools: list[str] = Field(..., description="List of available tool IDs")
+    executor: dict[str, int] = Field(
+        default_factory=dict,
+        description="Plan-run executor gauges (max_workers, queue_depth, in_flight)",
+    )
+    plan_cache: dict[str, int] = Field(
+        default_factory=dict,
+        description="Plan cache counters (size, max_size, hits, misses, evictions)",
+    )
     timestamp: datetime = Field(default_factory=datetime.now, description="Current timestamp")
@@ -0,0 +1,78 @@
+"""Single-flight coalescing of identical concurrent executions."""
+
+import asyncio
+import hashlib
+import json
+from collections.abc import Awaitable, Callable
+from typing import Any, Generic, TypeVar
+
+from pydantic import BaseModel
+
+T = TypeVar("T")
+
+
+def request_fingerprint(request: BaseModel) -> str:
+    """Hash a request so that identical payloads map to the same key."""
+    payload = json.dumps(request.model_dump(mode="json"), sort_keys=True, separators=(",", ":"))
+    return hashlib.sha256(payload.encode()).hexdigest()
+
+
+class SingleFlight(Generic[T]):
+    """Runs at most one execution per key; concurrent callers share its result.
+
+    The shared execution runs as its own task, so a caller that goes away
+    (for example a disconnected client) does not cancel it for the others.
+    """
+
+    def __init__(self) -> None:
+        """Create an empty single-flight group."""
+        self._in_flight: dict[str, asyncio.Task[T]] = {}
+        self.executions = 0
+        self.coalesced = 0
+
+    def __len__(self) -> int:
+        return len(self._in_flight)
+
+    async def do(self, key: str, func: Callable[[], Awaitable[T]]) -> tuple[T, bool]:
+        """Run ``func`` unless an execution for ``key`` is already in flight.
+
+        Returns the result and whether it was shared from another caller.
+        """
+        task = self._in_flight.get(key)
+        shared = task is not None
+
+        if task is None:
+            task = asyncio.ensure_future(func())
+            self._in_flight[key] = task
+            task.add_done_callback(lambda done: self._forget(key, done))
+            self.executions += 1
+        else:
+            self.coalesced += 1
+
+        return await asyncio.shield(task), shared
+
+    def stats(self) -> dict[str, int]:
+        """Return a snapshot of the single-flight counters."""
+        return {
+            "in_flight": len(self._in_flight),
+            "executions": self.executions,
+            "coalesced": self.coalesced,
+        }
+
+    def _forget(self, key: str, task: asyncio.Task[Any]) -> None:
+        if self._in_flight.get(key) is task:
+            del self._in_flight[key]
+
+
+# Global single-flight group for plan runs
+_single_flight_instance: SingleFlight[Any] | None = None
+
+
+def get_single_flight() -> SingleFlight[Any]:
+    """Get the global single-flight group for plan runs."""
+    global _single_flight_instance
+
+    if _single_flight_instance is None:
+        _single_flight_instance = SingleFlight()
+
+    return _single_flight_instance
@@ -0,0 +1,581 @@
+"""Portia storage backends used by the service.
+
+Besides the Portia storage interface, both backends list compact plan-run
+summaries a page at a time for the run history endpoint.
+"""
+
+import base64
+import binascii
+import json
+import math
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from collections.abc import Iterator
+from contextlib import contextmanager
+from dataclasses import dataclass, field
+from pathlib import Path
+from typing import Any
+
+from portia.errors import PlanNotFoundError, PlanRunNotFoundError, StorageError
+from portia.execution_agents.output import AgentMemoryValue, LocalDataValue, Output
+from portia.plan import Plan, PlanUUID
+from portia.plan_run import PlanRun, PlanRunState, PlanRunUUID
+from portia.storage import InMemoryStorage, PlanRunListResponse
+
+from .metrics import STORAGE_BYTES, STORAGE_ENTRIES, STORAGE_EVICTIONS
+
+# Storage keys: ("plan", plan_id) or ("run", plan_run_id)
+_Key = tuple[str, Any]
+
+# Output types read back from SQLite by name; others are read as LocalDataValue
+_OUTPUT_TYPES: dict[str, type[Output]] = {
+    output_type.__name__: output_type for output_type in (LocalDataValue, AgentMemoryValue)
+}
+
+
+@dataclass(frozen=True)
+class PlanRunFilter:
+    """Criteria for listing plan runs. Unset fields match every plan run."""
+
+    end_user_id: str | None = None
+    state: PlanRunState | None = None
+    created_after: float | None = None
+    created_before: float | None = None
+    tool_id: str | None = None
+
+
+@dataclass(frozen=True)
+class PlanRunSummary:
+    """The fields of a stored plan run shown in listings, without its steps and outputs."""
+
+    plan_run_id: str
+    plan_id: str
+    end_user_id: str | None
+    state: str
+    query: str | None
+    created_at: float
+    updated_at: float
+
+
+@dataclass(frozen=True)
+class PlanRunPage:
+    """One page of plan-run summaries, newest first."""
+
+    summaries: list[PlanRunSummary] = field(default_factory=list)
+    next_cursor: str | None = None
+
+
+def encode_cursor(created_at: float, plan_run_id: str) -> str:
+    """Encode the position after a plan run as an opaque cursor."""
+    raw = json.dumps([created_at, plan_run_id], separators=(",", ":")).encode()
+    return base64.urlsafe_b64encode(raw).decode().rstrip("=")
+
+
+def decode_cursor(cursor: str) -> tuple[float, str]:
+    """Decode a cursor made by ``encode_cursor``. Raises ``ValueError`` if it is malformed."""
+    try:
+        raw = base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4))
+        created_at, plan_run_id = json.loads(raw)
+        return float(created_at), str(plan_run_id)
+    except (binascii.Error, TypeError, ValueError) as e:
+        raise ValueError(f"Invalid cursor: {cursor}") from e
+
+
+def _plan_tool_ids(plan: Plan) -> frozenset[str]:
+    return frozenset(step.tool_id for step in plan.steps if step.tool_id)
+
+
+def _page(summaries: list[PlanRunSummary], limit: int) -> PlanRunPage:
+    # Callers fetch one summary more than the limit to learn whether there is a next page
+    if len(summaries) <= limit:
+        return PlanRunPage(summaries=summaries)
+    last = summaries[limit - 1]
+    return PlanRunPage(
+        summaries=summaries[:limit],
+        next_cursor=encode_cursor(last.created_at, last.plan_run_id),
+    )
+
+
+@dataclass
+class _Entry:
+    size: int
+    accessed_at: float
+    plan_id: PlanUUID | None = None
+    created_at: float = 0.0
+    updated_at: float = 0.0
+
+
+def _size_of(value: Any) -> int:
+    try:
+        return len(value.model_dump_json())
+    except Exception:
+        return len(str(value))
+
+
+class BoundedInMemoryStorage(InMemoryStorage):
+    """In-memory Portia storage with bounded retention.
+
+    Plans and plan runs are evicted least recently used first once there are
+    more than ``max_entries`` of them or they use more than ``max_bytes``
+    (measured as serialized JSON), and whenever they have not been used for
+    ``ttl`` seconds. A plan run's outputs count towards its size and are
+    evicted with it. Using a plan run also marks its plan as used, so a plan
+    is never evicted before the runs that reference it.
+    """
+
+    def __init__(self, max_entries: int, max_bytes: int, ttl: float) -> None:
+        """Create empty storage with the given retention limits."""
+        if max_entries < 1:
+            raise ValueError("max_entries must be at least 1")
+        if max_bytes < 1:
+            raise ValueError("max_bytes must be at least 1")
+        super().__init__()
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.ttl = ttl
+        self.total_bytes = 0
+        self._counts = {"plan": 0, "run": 0}
+        self._entries: OrderedDict[_Key, _Entry] = OrderedDict()
+        self._output_sizes: dict[PlanRunUUID, dict[str, int]] = {}
+        self._plan_tools: dict[PlanUUID, frozenset[str]] = {}
+        self._lock = threading.RLock()
+
+    def __len__(self) -> int:
+        with self._lock:
+            return len(self._entries)
+
+    def save_plan(self, plan: Plan) -> None:
+        """Save a plan, evicting older entries if needed."""
+        with self._lock:
+            super().save_plan(plan)
+            self._plan_tools[plan.id] = _plan_tool_ids(plan)
+            self._track(("plan", plan.id), _size_of(plan))
+
+    def get_plan(self, plan_id: PlanUUID) -> Plan:
+        """Get a plan and mark it as recently used."""
+        with self._lock:
+            self._expire()
+            self._update_metrics()
+            plan = super().get_plan(plan_id)
+            self._touch(("plan", plan_id))
+            return plan
+
+    def save_plan_run(self, plan_run: PlanRun) -> None:
+        """Save a plan run, evicting older entries if needed."""
+        with self._lock:
+            super().save_plan_run(plan_run)
+            outputs_size = sum(self._output_sizes.get(plan_run.id, {}).values())
+            self._track(
+                ("run", plan_run.id), _size_of(plan_run) + outputs_size, plan_id=plan_run.plan_id
+            )
+
+    def get_plan_run(self, plan_run_id: PlanRunUUID) -> PlanRun:
+        """Get a plan run and mark it and its plan as recently used."""
+        with self._lock:
+            self._expire()
+            self._update_metrics()
+            plan_run = super().get_plan_run(plan_run_id)
+            self._touch(("run", plan_run_id))
+            return plan_run
+
+    def get_plan_runs(self, *args: Any, **kwargs: Any) -> Any:
+        """List plan runs, after dropping expired entries."""
+        with self._lock:
+            self._expire()
+            self._update_metrics()
+            return super().get_plan_runs(*args, **kwargs)
+
+    def save_plan_run_output(self, output_name: str, output: Any, plan_run_id: PlanRunUUID) -> Any:
+        """Save a plan run output, counting its size towards the plan run."""
+        with self._lock:
+            saved = super().save_plan_run_output(output_name, output, plan_run_id)
+            sizes = self._output_sizes.setdefault(plan_run_id, {})
+            size = _size_of(output)
+            added = size - sizes.get(output_name, 0)
+            sizes[output_name] = size
+            entry = self._entries.get(("run", plan_run_id))
+            if entry is not None:
+                entry.size += added
+                self.total_bytes += added
+                self._touch(("run", plan_run_id))
+                self._evict(keep=("run", plan_run_id))
+            return saved
+
+    def list_plan_run_summaries(
+        self, filters: PlanRunFilter, limit: int, cursor: str | None = None
+    ) -> PlanRunPage:
+        """List summaries of the plan runs matching ``filters``, newest first.
+
+        Raises ``ValueError`` if ``cursor`` is malformed.
+        """
+        after = decode_cursor(cursor) if cursor else None
+        with self._lock:
+            self._expire()
+            self._update_metrics()
+            summaries = []
+            for (kind, plan_run_id), entry in self._entries.items():
+                if kind != "run" or not self._matches(plan_run_id, entry, filters):
+                    continue
+                if after is not None and (entry.created_at, str(plan_run_id)) >= after:
+                    continue
+                plan_run = self.runs[plan_run_id]
+                plan = self.plans.get(plan_run.plan_id)
+                summaries.append(
+                    PlanRunSummary(
+                        plan_run_id=str(plan_run_id),
+                        plan_id=str(plan_run.plan_id),
+                        end_user_id=plan_run.end_user_id,
+                        state=plan_run.state.value,
+                        query=plan.plan_context.query if plan is not None else None,
+                        created_at=entry.created_at,
+                        updated_at=entry.updated_at,
+                    )
+                )
+
+        summaries.sort(key=lambda summary: (summary.created_at, summary.plan_run_id), reverse=True)
+        return _page(summaries[: limit + 1], limit)
+
+    def _matches(self, plan_run_id: PlanRunUUID, entry: _Entry, filters: PlanRunFilter) -> bool:
+        plan_run = self.runs[plan_run_id]
+        if filters.end_user_id is not None and plan_run.end_user_id != filters.end_user_id:
+            return False
+        if filters.state is not None and plan_run.state != filters.state:
+            return False
+        if filters.created_after is not None and entry.created_at < filters.created_after:
+            return False
+        if filters.created_before is not None and entry.created_at >= filters.created_before:
+            return False
+        if filters.tool_id is not None:
+            return filters.tool_id in self._plan_tools.get(plan_run.plan_id, frozenset())
+        return True
+
+    def stats(self) -> dict[str, int]:
+        """Return the number of plans and plan runs held and the bytes they use."""
+        with self._lock:
+            return {
+                "plans": self._counts["plan"],
+                "plan_runs": self._counts["run"],
+                "bytes": self.total_bytes,
+            }
+
+    def _track(self, key: _Key, size: int, plan_id: PlanUUID | None = None) -> None:
+        entry = self._entries.get(key)
+        now = time.time()
+        if entry is None:
+            entry = _Entry(size=0, accessed_at=0.0, plan_id=plan_id, created_at=now)
+            self._entries[key] = entry
+            self._counts[key[0]] += 1
+        entry.updated_at = now
+        self.total_bytes += size - entry.size
+        entry.size = size
+        self._touch(key)
+        self._evict(keep=key)
+
+    def _touch(self, key: _Key) -> None:
+        entry = self._entries.get(key)
+        if entry is None:
+            return
+        now = time.monotonic()
+        entry.accessed_at = now
+        self._entries.move_to_end(key)
+        # Keep the plan more recently used than any of its runs
+        if entry.plan_id is not None:
+            plan_entry = self._entries.get(("plan", entry.plan_id))
+            if plan_entry is not None:
+                plan_entry.accessed_at = now
+                self._entries.move_to_end(("plan", entry.plan_id))
+
+    def _expire(self) -> None:
+        cutoff = time.monotonic() - self.ttl
+        while self._entries:
+            key, entry = next(iter(self._entries.items()))
+            if entry.accessed_at > cutoff:
+                break
+            self._remove(key, "ttl")
+
+    def _evict(self, keep: _Key) -> None:
+        self._expire()
+        # Stop at the entry that was just written: everything behind it is its
+        # own plan, which must outlive it
+        while len(self._entries) > self.max_entries:
+            oldest = next(iter(self._entries))
+            if oldest == keep:
+                break
+            self._remove(oldest, "max_entries")
+        while self.total_bytes > self.max_bytes:
+            oldest = next(iter(self._entries))
+            if oldest == keep:
+                break
+            self._remove(oldest, "max_bytes")
+        self._update_metrics()
+
+    def _remove(self, key: _Key, reason: str) -> None:
+        entry = self._entries.pop(key)
+        self.total_bytes -= entry.size
+        kind, entry_id = key
+        self._counts[kind] -= 1
+        if kind == "plan":
+            self.plans.pop(entry_id, None)
+            self._plan_tools.pop(entry_id, None)
+        else:
+            self.runs.pop(entry_id, None)
+            self.outputs.pop(entry_id, None)
+            self._output_sizes.pop(entry_id, None)
+        STORAGE_EVICTIONS.labels(reason=reason).inc()
+
+    def _update_metrics(self) -> None:
+        STORAGE_ENTRIES.labels(kind="plan").set(self._counts["plan"])
+        STORAGE_ENTRIES.labels(kind="plan_run").set(self._counts["run"])
+        STORAGE_BYTES.set(self.total_bytes)
+
+
+_SQLITE_SCHEMA = """
+CREATE TABLE IF NOT EXISTS plans (
+    id TEXT PRIMARY KEY,
+    query TEXT NOT NULL,
+    created_at REAL NOT NULL,
+    data TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS idx_plans_query ON plans (query);
+
+CREATE TABLE IF NOT EXISTS plan_tools (
+    plan_id TEXT NOT NULL,
+    tool_id TEXT NOT NULL,
+    PRIMARY KEY (plan_id, tool_id)
+);
+CREATE INDEX IF NOT EXISTS idx_plan_tools_tool ON plan_tools (tool_id);
+
+CREATE TABLE IF NOT EXISTS plan_runs (
+    id TEXT PRIMARY KEY,
+    plan_id TEXT NOT NULL,
+    end_user_id TEXT,
+    state TEXT NOT NULL,
+    created_at REAL NOT NULL,
+    updated_at REAL NOT NULL,
+    data TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS idx_plan_runs_end_user ON plan_runs (end_user_id, created_at, id);
+CREATE INDEX IF NOT EXISTS idx_plan_runs_state ON plan_runs (state, created_at, id);
+CREATE INDEX IF NOT EXISTS idx_plan_runs_created ON plan_runs (created_at, id);
+
+CREATE TABLE IF NOT EXISTS plan_run_outputs (
+    plan_run_id TEXT NOT NULL,
+    name TEXT NOT NULL,
+    type TEXT NOT NULL,
+    data TEXT NOT NULL,
+    PRIMARY KEY (plan_run_id, name)
+);
+"""
+
+
+class SQLiteStorage(InMemoryStorage):
+    """Portia storage that keeps plans, plan runs and their outputs in SQLite.
+
+    The database runs in WAL mode so that plan-run threads can read while
+    another thread writes. Plan runs are indexed by ID, end user, state and
+    creation time, and plans by the tools they use, so listings are answered
+    from the indexes without decoding stored plan runs. End users and tool
+    call logs keep the in-memory behaviour inherited from ``InMemoryStorage``.
+    """
+
+    def __init__(self, path: str | Path, *, page_size: int = 50) -> None:
+        """Open (and if needed create) the database at ``path``.
+
+        ``get_plan_runs`` returns ``page_size`` plan runs per page.
+        """
+        super().__init__()
+        self.path = str(path)
+        self.page_size = page_size
+        Path(self.path).parent.mkdir(parents=True, exist_ok=True)
+        self._local = threading.local()
+        with self._connection() as connection:
+            connection.executescript(_SQLITE_SCHEMA)
+
+    @contextmanager
+    def _connection(self) -> Iterator[sqlite3.Connection]:
+        # One connection per thread; sqlite3 connections must not be shared
+        connection = getattr(self._local, "connection", None)
+        if connection is None:
+            connection = sqlite3.connect(self.path, timeout=30)
+            connection.execute("PRAGMA journal_mode=WAL")
+            connection.execute("PRAGMA synchronous=NORMAL")
+            self._local.connection = connection
+        with connection:
+            yield connection
+
+    def save_plan(self, plan: Plan) -> None:
+        """Insert or replace a plan."""
+        with self._connection() as connection:
+            connection.execute(
+                "INSERT INTO plans (id, query, created_at, data) VALUES (?, ?, ?, ?) "
+                "ON CONFLICT (id) DO UPDATE SET query = excluded.query, data = excluded.data",
+                (str(plan.id), plan.plan_context.query, time.time(), plan.model_dump_json()),
+            )
+            connection.execute("DELETE FROM plan_tools WHERE plan_id = ?", (str(plan.id),))
+            connection.executemany(
+                "INSERT INTO plan_tools (plan_id, tool_id) VALUES (?, ?)",
+                [(str(plan.id), tool_id) for tool_id in _plan_tool_ids(plan)],
+            )
+
+    def get_plan(self, plan_id: PlanUUID) -> Plan:
+        """Get a plan by ID."""
+        with self._connection() as connection:
+            row = connection.execute(
+                "SELECT data FROM plans WHERE id = ?", (str(plan_id),)
+            ).fetchone()
+        if row is None:
+            raise PlanNotFoundError(plan_id)
+        return Plan.model_validate_json(row[0])
+
+    def plan_exists(self, plan_id: PlanUUID) -> bool:
+        """Check whether a plan is stored."""
+        with self._connection() as connection:
+            row = connection.execute("SELECT 1 FROM plans WHERE id = ?", (str(plan_id),)).fetchone()
+        return row is not None
+
+    def get_plan_by_query(self, query: str) -> Plan:
+        """Get the most recent plan made for ``query``."""
+        with self._connection() as connection:
+            row = connection.execute(
+                "SELECT data FROM plans WHERE query = ? ORDER BY created_at DESC LIMIT 1",
+                (query,),
+            ).fetchone()
+        if row is None:
+            raise StorageError(f"No plan found for query: {query}")
+        return Plan.model_validate_json(row[0])
+
+    def save_plan_run(self, plan_run: PlanRun) -> None:
+        """Insert or update a plan run, keeping its original creation time."""
+        now = time.time()
+        with self._connection() as connection:
+            connection.execute(
+                "INSERT INTO plan_runs "
+                "(id, plan_id, end_user_id, state, created_at, updated_at, data) "
+                "VALUES (?, ?, ?, ?, ?, ?, ?) "
+                "ON CONFLICT (id) DO UPDATE SET state = excluded.state, "
+                "end_user_id = excluded.end_user_id, updated_at = excluded.updated_at, "
+                "data = excluded.data",
+                (
+                    str(plan_run.id),
+                    str(plan_run.plan_id),
+                    plan_run.end_user_id,
+                    plan_run.state.value,
+                    now,
+                    now,
+                    plan_run.model_dump_json(),
+                ),
+            )
+
+    def get_plan_run(self, plan_run_id: PlanRunUUID) -> PlanRun:
+        """Get a plan run by ID."""
+        with self._connection() as connection:
+            row = connection.execute(
+                "SELECT data FROM plan_runs WHERE id = ?", (str(plan_run_id),)
+            ).fetchone()
+        if row is None:
+            raise PlanRunNotFoundError(plan_run_id)
+        return PlanRun.model_validate_json(row[0])
+
+    def get_plan_runs(
+        self, run_state: PlanRunState | None = None, page: int | None = None
+    ) -> PlanRunListResponse:
+        """List one page of plan runs, newest first, optionally only those in ``run_state``.
+
+        Pages are numbered from 1; ``count`` is the number of matching plan
+        runs across every page.
+        """
+        where = ""
+        params: tuple[Any, ...] = ()
+        if run_state is not None:
+            where = " WHERE state = ?"
+            params = (run_state.value,)
+        page = max(page or 1, 1)
+        with self._connection() as connection:
+            (count,) = connection.execute(
+                "SELECT COUNT(*) FROM plan_runs" + where, params
+            ).fetchone()
+            rows = connection.execute(
+                "SELECT data FROM plan_runs" + where + " ORDER BY created_at DESC, rowid DESC "
+                "LIMIT ? OFFSET ?",
+                (*params, self.page_size, (page - 1) * self.page_size),
+            ).fetchall()
+        return PlanRunListResponse(
+            results=[PlanRun.model_validate_json(row[0]) for row in rows],
+            count=count,
+            current_page=page,
+            total_pages=max(1, math.ceil(count / self.page_size)),
+        )
+
+    def list_plan_run_summaries(
+        self, filters: PlanRunFilter, limit: int, cursor: str | None = None
+    ) -> PlanRunPage:
+        """List summaries of the plan runs matching ``filters``, newest first.
+
+        Raises ``ValueError`` if ``cursor`` is malformed.
+        """
+        conditions = []
+        params: list[Any] = []
+        if filters.end_user_id is not None:
+            conditions.append("r.end_user_id = ?")
+            params.append(filters.end_user_id)
+        if filters.state is not None:
+            conditions.append("r.state = ?")
+            params.append(filters.state.value)
+        if filters.created_after is not None:
+            conditions.append("r.created_at >= ?")
+            params.append(filters.created_after)
+        if filters.created_before is not None:
+            conditions.append("r.created_at < ?")
+            params.append(filters.created_before)
+        if filters.tool_id is not None:
+            conditions.append("r.plan_id IN (SELECT plan_id FROM plan_tools WHERE tool_id = ?)")
+            params.append(filters.tool_id)
+        if cursor:
+            conditions.append("(r.created_at, r.id) < (?, ?)")
+            params.extend(decode_cursor(cursor))
+
+        query = (
+            "SELECT r.id, r.plan_id, r.end_user_id, r.state, p.query, r.created_at, r.updated_at "
+            "FROM plan_runs r LEFT JOIN plans p ON p.id = r.plan_id"
+        )
+        if conditions:
+            query += " WHERE " + " AND ".join(conditions)
+        query += " ORDER BY r.created_at DESC, r.id DESC LIMIT ?"
+        params.append(limit + 1)
+
+        with self._connection() as connection:
+            rows = connection.execute(query, params).fetchall()
+        return _page([PlanRunSummary(*row) for row in rows], limit)
+
+    def save_plan_run_output(
+        self, output_name: str, output: Output, plan_run_id: PlanRunUUID
+    ) -> AgentMemoryValue:
+        """Insert or replace one named output of a plan run.
+
+        Like ``InMemoryStorage``, returns a reference to the stored output
+        with its summary.
+        """
+        with self._connection() as connection:
+            connection.execute(
+                "INSERT INTO plan_run_outputs (plan_run_id, name, type, data) VALUES (?, ?, ?, ?) "
+                "ON CONFLICT (plan_run_id, name) DO UPDATE SET "
+                "type = excluded.type, data = excluded.data",
+                (str(plan_run_id), output_name, type(output).__name__, output.model_dump_json()),
+            )
+        return AgentMemoryValue(
+            output_name=output_name, plan_run_id=plan_run_id, summary=output.summary or ""
+        )
+
+    def get_plan_run_output(self, output_name: str, plan_run_id: PlanRunUUID) -> Output:
+        """Get one named output of a plan run, as the type it was saved as."""
+        with self._connection() as connection:
+            row = connection.execute(
+                "SELECT type, data FROM plan_run_outputs WHERE plan_run_id = ? AND name = ?",
+                (str(plan_run_id), output_name),
+            ).fetchone()
+        if row is None:
+            raise StorageError(f"No output named {output_name} for plan run {plan_run_id}")
+        output_type, data = row
+        return _OUTPUT_TYPES.get(output_type, LocalDataValue).model_validate_json(data)
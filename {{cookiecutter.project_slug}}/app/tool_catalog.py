@@ -0,0 +1,156 @@
+"""Precomputed views of the tool registry.
+
+The serialized catalog backs the tools and status endpoints, and the tool
+index resolves the tool IDs named in run requests. Both are built once per
+registry instead of once per request.
+"""
+
+import hashlib
+import json
+import threading
+from collections import OrderedDict
+from collections.abc import Iterable
+from dataclasses import dataclass
+from typing import Any
+
+from portia import ToolRegistry
+
+
+@dataclass(frozen=True)
+class ToolCatalog:
+    """Serialized description of every tool in a registry."""
+
+    tool_ids: tuple[str, ...]
+    body: bytes
+    etag: str
+
+
+def _describe_tool(tool: Any) -> dict[str, Any]:
+    tool_info: dict[str, Any] = {
+        "id": tool.id,
+        "name": tool.name,
+        "description": tool.description,
+    }
+
+    # Add schema information if available
+    if hasattr(tool, "args_schema") and tool.args_schema:
+        try:
+            tool_info["args_schema"] = tool.args_schema.model_json_schema()
+        except Exception:
+            tool_info["args_schema"] = None
+
+    return tool_info
+
+
+def build_tool_catalog(registry: ToolRegistry) -> ToolCatalog:
+    """Serialize the tools in ``registry`` once, with an ETag for the result."""
+    tools = registry.get_tools()
+    body = json.dumps(
+        [_describe_tool(tool) for tool in tools],
+        ensure_ascii=False,
+        separators=(",", ":"),
+        default=str,
+    ).encode()
+    etag = f'"{hashlib.sha256(body).hexdigest()[:32]}"'
+    return ToolCatalog(tool_ids=tuple(tool.id for tool in tools), body=body, etag=etag)
+
+
+def etag_matches(if_none_match: str | None, etag: str) -> bool:
+    """Check an ``If-None-Match`` header value against ``etag``."""
+    if not if_none_match:
+        return False
+    for candidate in if_none_match.split(","):
+        candidate = candidate.strip()
+        if candidate == "*" or candidate.removeprefix("W/") == etag:
+            return True
+    return False
+
+
+class UnknownToolsError(ValueError):
+    """Raised when a request names tools that are not in the registry."""
+
+    def __init__(self, unknown: list[str], requested: list[str]) -> None:
+        """Record which of the requested tool IDs are unknown."""
+        self.unknown = unknown
+        self.requested = requested
+        super().__init__(f"Unknown tool IDs: {unknown}")
+
+
+class ToolIndex:
+    """Tool lookup by ID with an LRU cache of filtered registries."""
+
+    def __init__(self, registry: ToolRegistry, max_filtered: int = 128) -> None:
+        """Index the tools in ``registry``."""
+        if max_filtered < 1:
+            raise ValueError("max_filtered must be at least 1")
+        self.registry = registry
+        self.max_filtered = max_filtered
+        self._tools = {tool.id: tool for tool in registry.get_tools()}
+        self._positions = {tool_id: position for position, tool_id in enumerate(self._tools)}
+        self._filtered: OrderedDict[frozenset[str], ToolRegistry] = OrderedDict()
+        self._lock = threading.Lock()
+
+    def filter(self, tool_ids: Iterable[str]) -> ToolRegistry:
+        """Get a registry with only ``tool_ids``, in registry order.
+
+        Raises ``UnknownToolsError`` if any of the IDs is not in the registry.
+        """
+        key = frozenset(tool_ids)
+        with self._lock:
+            cached = self._filtered.get(key)
+            if cached is not None:
+                self._filtered.move_to_end(key)
+                return cached
+
+        unknown = sorted(tool_id for tool_id in key if tool_id not in self._tools)
+        if unknown:
+            raise UnknownToolsError(unknown, sorted(key))
+
+        ordered = sorted(key, key=self._positions.__getitem__)
+        filtered = ToolRegistry([self._tools[tool_id] for tool_id in ordered])
+
+        with self._lock:
+            self._filtered[key] = filtered
+            self._filtered.move_to_end(key)
+            while len(self._filtered) > self.max_filtered:
+                self._filtered.popitem(last=False)
+
+        return filtered
+
+
+# Global catalog and index, and the registries they were built from
+_catalog_instance: ToolCatalog | None = None
+_catalog_registry: ToolRegistry | None = None
+_index_instance: ToolIndex | None = None
+
+
+def get_tool_catalog(registry: ToolRegistry) -> ToolCatalog:
+    """Get the catalog for ``registry``, rebuilding it only if the registry was replaced.
+
+    Call ``invalidate_tool_catalog`` after changing a registry in place.
+    """
+    global _catalog_instance, _catalog_registry
+
+    if _catalog_instance is None or _catalog_registry is not registry:
+        _catalog_instance = build_tool_catalog(registry)
+        _catalog_registry = registry
+
+    return _catalog_instance
+
+
+def get_tool_index(registry: ToolRegistry) -> ToolIndex:
+    """Get the tool index for ``registry``, rebuilding it only if the registry was replaced."""
+    global _index_instance
+
+    if _index_instance is None or _index_instance.registry is not registry:
+        _index_instance = ToolIndex(registry)
+
+    return _index_instance
+
+
+def invalidate_tool_catalog() -> None:
+    """Drop the cached catalog and tool index so the next request rebuilds them."""
+    global _catalog_instance, _catalog_registry, _index_instance
+    _catalog_instance = None
+    _catalog_registry = None
+    _index_instance = None
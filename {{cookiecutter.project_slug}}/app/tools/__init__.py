@@ -22,7 +22,16 @@ custom_tools = ToolRegistry([
     uppercase_text(),  # type: ignore[call-arg]
 ])
 
-__all__ = ["custom_tools"]
+# Tools whose output depends only on their arguments. Identical concurrent runs
+# that use only these tools may share a single execution.
+deterministic_tool_ids = frozenset({
+    "add_numbers",
+    "count_letters",
+    "reverse_text",
+    "uppercase_text",
+})
+
+__all__ = ["custom_tools", "deterministic_tool_ids"]
 {%- else %}
 """Custom tools for {{ cookiecutter.project_name }}.
 
@@ -45,5 +54,9 @@ from portia import ToolRegistry
 # Create an empty registry - add your tools here
 custom_tools = ToolRegistry([])
 
-__all__ = ["custom_tools"]
+# IDs of tools whose output depends only on their arguments. Identical concurrent
+# runs that use only these tools may share a single execution.
+deterministic_tool_ids: frozenset[str] = frozenset()
+
+__all__ = ["custom_tools", "deterministic_tool_ids"]
 {%- endif %}
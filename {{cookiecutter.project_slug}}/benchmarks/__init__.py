@@ -0,0 +1,4 @@
+"""Microbenchmarks for the request hot path.
+
+Run them with ``python -m benchmarks``; see ``python -m benchmarks --help``.
+"""
@@ -0,0 +1,81 @@
+"""Run the hot-path benchmarks and optionally compare them with a baseline.
+
+Usage:
+    python -m benchmarks --output results.json
+    python -m benchmarks --compare results.json --threshold 0.1
+    python -m benchmarks --only filter_tools tools_catalog --registry-sizes 10 10000
+"""
+
+import argparse
+import sys
+
+from loguru import logger
+
+from app.config import get_settings
+
+from .cases import DEFAULT_REGISTRY_SIZES, PAYLOAD_SIZES, all_cases
+from .harness import BenchmarkRun, compare, format_time, measure, print_results
+
+
+def main(argv: list[str] | None = None) -> int:
+    """Run the benchmarks; return 1 if any regressed past the threshold."""
+    parser = argparse.ArgumentParser(prog="python -m benchmarks", description=__doc__)
+    parser.add_argument(
+        "--registry-sizes",
+        type=int,
+        nargs="+",
+        default=list(DEFAULT_REGISTRY_SIZES),
+        help="Numbers of registered tools to benchmark with",
+    )
+    parser.add_argument(
+        "--payload-sizes",
+        nargs="+",
+        choices=list(PAYLOAD_SIZES),
+        default=list(PAYLOAD_SIZES),
+        help="Request and response payload sizes to benchmark with",
+    )
+    parser.add_argument("--only", nargs="+", help="Run only the benchmarks with these names")
+    parser.add_argument("--repeat", type=int, default=5, help="Timing repeats per case")
+    parser.add_argument("--output", help="Write the results to this JSON file")
+    parser.add_argument("--compare", help="Compare against results from an earlier --output")
+    parser.add_argument(
+        "--threshold",
+        type=float,
+        default=0.1,
+        help="Slowdown against --compare that counts as a regression (default: 0.1 = 10%%)",
+    )
+    args = parser.parse_args(argv)
+
+    # Log lines from the cases go only to the sinks the cases add, not to the terminal
+    logger.configure(handlers=[])
+
+    run = BenchmarkRun(version=get_settings().app_version)
+    for name, params, func in all_cases(args.registry_sizes, args.payload_sizes):
+        if args.only and name not in args.only:
+            continue
+        result = measure(name, func, params, repeat=args.repeat)
+        run.results.append(result)
+        print_results([result])
+
+    if args.output:
+        run.save(args.output)
+        print(f"Results written to {args.output}")
+
+    if not args.compare:
+        return 0
+
+    regressions = 0
+    print(f"\nCompared with {args.compare} (median times):")
+    for comparison in compare(BenchmarkRun.load(args.compare), run):
+        regressed = comparison.ratio > 1 + args.threshold
+        regressions += regressed
+        print(
+            f"{comparison.key:<55} {format_time(comparison.baseline):>10} -> "
+            f"{format_time(comparison.current):>10}  x{comparison.ratio:.2f}"
+            f"{'  REGRESSION' if regressed else ''}"
+        )
+    return 1 if regressions else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,192 @@
+"""Benchmark cases for the steps every run request goes through.
+
+Each case is built once for a registry or payload size and returns the call
+to time. Plan runs are stand-ins with the attributes the routes read, so the
+cases measure this service's code rather than Portia's.
+"""
+
+import json
+import os
+from collections.abc import Callable, Iterator
+from functools import lru_cache
+from types import SimpleNamespace
+from typing import Annotated, Any
+
+from fastapi.encoders import jsonable_encoder
+from loguru import logger
+from portia import PlanRunState, ToolRegistry, tool
+from portia.execution_agents.output import LocalDataValue
+
+from app.api.routes import _filter_tools, _process_plan_run_result
+from app.logging_config import LOG_FORMAT
+from app.schemas import PortiaRunRequest, PortiaRunResponse
+from app.schemas.request import MAX_QUERY_LENGTH
+from app.schemas.response import PlanRunState as ResponsePlanRunState
+from app.tool_catalog import ToolIndex, build_tool_catalog
+
+Case = tuple[str, dict[str, Any], Callable[[], Any]]
+
+# Query length and number of plan run inputs for each payload size
+PAYLOAD_SIZES: dict[str, tuple[int, int]] = {
+    "small": (40, 0),
+    "medium": (1_000, 10),
+    "large": (MAX_QUERY_LENGTH, 500),
+}
+DEFAULT_REGISTRY_SIZES = (10, 100, 1000)
+
+# Tools each request asks for when filtering
+REQUESTED_TOOLS = 3
+
+
+def _make_tool(index: int) -> Any:
+    def process_text(
+        text: Annotated[str, "Text to process"],
+        repeat: Annotated[int, "Times to repeat the text"] = 1,
+    ) -> str:
+        """Repeat the given text."""
+        return text * repeat
+
+    process_text.__name__ = process_text.__qualname__ = f"bench_tool_{index:04d}"
+    return tool(process_text)()
+
+
+@lru_cache
+def make_registry(size: int) -> ToolRegistry:
+    """Build (once) a registry of ``size`` tools shaped like the example tools."""
+    return ToolRegistry([_make_tool(index) for index in range(size)])
+
+
+def make_payload(size: str) -> dict[str, Any]:
+    """Build a run request body of the given payload size."""
+    query_length, inputs = PAYLOAD_SIZES[size]
+    payload: dict[str, Any] = {
+        "query": ("Reverse the text and add the numbers " * 300)[:query_length],
+        "user_id": "benchmark-user",
+    }
+    if inputs:
+        payload["plan_run_inputs"] = {f"$input_{i}": f"value {i}" for i in range(inputs)}
+    return payload
+
+
+def request_parsing_cases(payload_sizes: list[str]) -> Iterator[Case]:
+    """Decode and validate a run request body, as FastAPI does for each request."""
+    for size in payload_sizes:
+        body = json.dumps(make_payload(size)).encode()
+        yield (
+            "request_parsing",
+            {"payload": size},
+            lambda body=body: PortiaRunRequest.model_validate(json.loads(body)),
+        )
+
+
+def filter_tools_cases(registry_sizes: list[int]) -> Iterator[Case]:
+    """Resolve the tools named in a request, warm and with a fresh index."""
+    for size in registry_sizes:
+        registry = make_registry(size)
+        portia = SimpleNamespace(tool_registry=registry)
+        requested = [registered.id for registered in registry.get_tools()[:REQUESTED_TOOLS]]
+        yield (
+            "filter_tools",
+            {"registry": size},
+            lambda portia=portia, requested=requested: _filter_tools(portia, requested),
+        )
+        yield "tool_index_build", {"registry": size}, lambda registry=registry: ToolIndex(registry)
+
+
+def _plan_run(state: PlanRunState, result: Any, clarifications: int = 0) -> SimpleNamespace:
+    outstanding = [
+        SimpleNamespace(
+            id=f"clar-{i}",
+            question=f"Which option for step {i}?",
+            description="Pick one",
+            options=["a", "b", "c"],
+        )
+        for i in range(clarifications)
+    ]
+    return SimpleNamespace(
+        state=state,
+        outputs=SimpleNamespace(final_output=LocalDataValue(value=result)),
+        get_outstanding_clarifications=lambda: outstanding,
+    )
+
+
+def process_result_cases() -> Iterator[Case]:
+    """Turn a finished plan run into a result, error and clarifications."""
+    plan_runs = {
+        "COMPLETE": _plan_run(PlanRunState.COMPLETE, "done"),
+        "NEED_CLARIFICATION": _plan_run(PlanRunState.NEED_CLARIFICATION, None, clarifications=5),
+        "FAILED": _plan_run(PlanRunState.FAILED, "Tool failed"),
+    }
+    for state, plan_run in plan_runs.items():
+        yield (
+            "process_plan_run_result",
+            {"state": state},
+            lambda plan_run=plan_run: _process_plan_run_result(plan_run),
+        )
+
+
+def serialization_cases(payload_sizes: list[str]) -> Iterator[Case]:
+    """Serialize a run response with pydantic and with FastAPI's default encoder."""
+    for size in payload_sizes:
+        query_length, inputs = PAYLOAD_SIZES[size]
+        response = PortiaRunResponse(
+            status=ResponsePlanRunState.COMPLETE,
+            result={"text": "x" * query_length, "items": list(range(inputs))},
+            plan_run_id="prun-benchmark",
+            metadata={
+                "execution_time": 1.2,
+                "tools_used": ["bench_tool_0000", "bench_tool_0001"],
+                "tools_available": 100,
+            },
+        )
+        yield (
+            "response_serialization",
+            {"payload": size, "encoder": "pydantic"},
+            response.model_dump_json,
+        )
+        yield (
+            "response_serialization",
+            {"payload": size, "encoder": "fastapi"},
+            lambda response=response: json.dumps(jsonable_encoder(response)).encode(),
+        )
+
+
+def catalog_cases(registry_sizes: list[int]) -> Iterator[Case]:
+    """Generate the /tools catalog body and its ETag."""
+    for size in registry_sizes:
+        registry = make_registry(size)
+        yield (
+            "tools_catalog",
+            {"registry": size},
+            lambda registry=registry: build_tool_catalog(registry),
+        )
+
+
+def log_path_cases(payload_sizes: list[str]) -> Iterator[Case]:
+    """Log the line written for every run request, and one filtered out by level.
+
+    The lines go to a handler added for these cases only and removed after them.
+    """
+    with open(os.devnull, "w") as sink:
+        handler_id = logger.add(sink, format=LOG_FORMAT, level="INFO", colorize=False)
+        try:
+            for size in payload_sizes:
+                query = make_payload(size)["query"]
+                yield (
+                    "log_path",
+                    {"payload": size, "level": "info"},
+                    lambda query=query: logger.info(f"Executing query: {query}"),
+                )
+            yield "log_path", {"level": "debug"}, lambda: logger.debug("Filtered out at INFO")
+        finally:
+            logger.remove(handler_id)
+
+
+def all_cases(registry_sizes: list[int], payload_sizes: list[str]) -> Iterator[Case]:
+    """Yield every benchmark case."""
+    yield from request_parsing_cases(payload_sizes)
+    yield from filter_tools_cases(registry_sizes)
+    yield from process_result_cases()
+    yield from serialization_cases(payload_sizes)
+    yield from catalog_cases(registry_sizes)
+    yield from log_path_cases(payload_sizes)
@@ -0,0 +1,124 @@
+"""Timing, storage and comparison of benchmark results."""
+
+import json
+import platform
+import statistics
+import time
+import timeit
+from collections.abc import Callable, Iterable
+from dataclasses import asdict, dataclass, field
+from pathlib import Path
+from typing import Any
+
+
+@dataclass(frozen=True)
+class BenchmarkResult:
+    """Timings of one benchmark case, in seconds per call."""
+
+    name: str
+    params: dict[str, Any]
+    loops: int
+    repeat: int
+    best: float
+    median: float
+    mean: float
+
+    @property
+    def key(self) -> str:
+        """Identify the case across runs, for example ``filter_tools[registry=100]``."""
+        if not self.params:
+            return self.name
+        params = ",".join(f"{name}={value}" for name, value in self.params.items())
+        return f"{self.name}[{params}]"
+
+
+@dataclass(frozen=True)
+class Comparison:
+    """Change in one benchmark's median time against a baseline."""
+
+    key: str
+    baseline: float
+    current: float
+
+    @property
+    def ratio(self) -> float:
+        """Current time as a multiple of the baseline time."""
+        return self.current / self.baseline if self.baseline else float("inf")
+
+
+@dataclass
+class BenchmarkRun:
+    """Every result of one benchmark run, with where it ran."""
+
+    version: str
+    results: list[BenchmarkResult] = field(default_factory=list)
+    created_at: float = field(default_factory=time.time)
+    python: str = field(default_factory=platform.python_version)
+    platform: str = field(default_factory=platform.platform)
+
+    def save(self, path: str | Path) -> None:
+        """Write the run to ``path`` as JSON."""
+        data = asdict(self)
+        for result, record in zip(self.results, data["results"], strict=True):
+            record["key"] = result.key
+        Path(path).write_text(json.dumps(data, indent=2) + "\n")
+
+    @classmethod
+    def load(cls, path: str | Path) -> "BenchmarkRun":
+        """Read a run written by ``save``."""
+        data = json.loads(Path(path).read_text())
+        results = [
+            BenchmarkResult(**{k: v for k, v in record.items() if k != "key"})
+            for record in data.pop("results")
+        ]
+        return cls(results=results, **data)
+
+
+def measure(
+    name: str,
+    func: Callable[[], Any],
+    params: dict[str, Any] | None = None,
+    *,
+    repeat: int = 5,
+) -> BenchmarkResult:
+    """Time ``func``, calling it enough times per repeat to take at least 0.2 seconds."""
+    timer = timeit.Timer(func)
+    loops, _ = timer.autorange()
+    per_call = [total / loops for total in timer.repeat(repeat=repeat, number=loops)]
+
+    return BenchmarkResult(
+        name=name,
+        params=dict(params or {}),
+        loops=loops,
+        repeat=repeat,
+        best=min(per_call),
+        median=statistics.median(per_call),
+        mean=statistics.fmean(per_call),
+    )
+
+
+def compare(baseline: BenchmarkRun, current: BenchmarkRun) -> list[Comparison]:
+    """Pair up the cases present in both runs by their key."""
+    baseline_times = {result.key: result.median for result in baseline.results}
+    return [
+        Comparison(result.key, baseline_times[result.key], result.median)
+        for result in current.results
+        if result.key in baseline_times
+    ]
+
+
+def format_time(seconds: float) -> str:
+    """Format a duration with a unit that suits its size."""
+    for unit, scale in (("s", 1.0), ("ms", 1e-3), ("us", 1e-6)):
+        if seconds >= scale:
+            return f"{seconds / scale:.2f}{unit}"
+    return f"{seconds / 1e-9:.0f}ns"
+
+
+def print_results(results: Iterable[BenchmarkResult]) -> None:
+    """Print a table of results."""
+    for result in results:
+        print(
+            f"{result.key:<55} median {format_time(result.median):>10}  "
+            f"best {format_time(result.best):>10}  ({result.loops} loops x {result.repeat})"
+        )
@@ -0,0 +1,198 @@
+"""Load test for the run endpoint.
+
+Sends ``POST /api/v1/run`` requests at a fixed rate for a fixed time and
+reports throughput and latency percentiles. Requests are started on schedule
+whether or not earlier ones have finished, so a slow server shows up as
+higher latency rather than as a lower request rate.
+
+With ``--in-process`` the app is served from this process with the fake LLM
+(``LLM_MODE=FAKE``), so scheduler, cache and executor changes can be measured
+without a running server or API keys.
+
+Usage:
+    python load_test.py --in-process --rps 50 --duration 30
+    python load_test.py --url http://localhost:{{ cookiecutter.port }} --rps 5 --json results.json
+"""
+
+import asyncio
+import json
+import math
+import os
+import sys
+import time
+from collections import Counter
+from dataclasses import asdict, dataclass, field
+from typing import Any
+
+import httpx
+from loguru import logger
+
+logger.remove()
+logger.add(sys.stderr, level="INFO", format="{time:HH:mm:ss} | {level} | {message}")
+
+
+@dataclass
+class LoadTestResult:
+    """Outcome of a load test run."""
+
+    target_rps: float
+    duration: float
+    sent: int = 0
+    elapsed: float = 0.0
+    status_codes: dict[str, int] = field(default_factory=dict)
+    latencies: list[float] = field(default_factory=list, repr=False)
+
+    @property
+    def succeeded(self) -> int:
+        """Number of requests answered with a 2xx status."""
+        return sum(count for code, count in self.status_codes.items() if code.startswith("2"))
+
+    @property
+    def throughput(self) -> float:
+        """Successful requests per second over the whole run."""
+        return self.succeeded / self.elapsed if self.elapsed else 0.0
+
+    def percentile(self, percent: float) -> float:
+        """Latency in seconds below which ``percent`` of requests finished."""
+        if not self.latencies:
+            return 0.0
+        ordered = sorted(self.latencies)
+        rank = max(1, math.ceil(percent / 100 * len(ordered)))
+        return ordered[rank - 1]
+
+    def summary(self) -> dict[str, Any]:
+        """Summarize the run as JSON-serializable values, latencies in milliseconds."""
+        result = asdict(self)
+        del result["latencies"]
+        result.update(
+            elapsed=round(self.elapsed, 3),
+            succeeded=self.succeeded,
+            throughput=round(self.throughput, 2),
+            latency_ms={
+                name: round(self.percentile(percent) * 1000, 1)
+                for name, percent in (("p50", 50), ("p95", 95), ("p99", 99), ("max", 100))
+            },
+        )
+        return result
+
+
+async def run_load_test(
+    client: httpx.AsyncClient,
+    payload: dict[str, Any],
+    rps: float,
+    duration: float,
+    max_in_flight: int,
+) -> LoadTestResult:
+    """Send ``payload`` to the run endpoint at ``rps`` requests per second for ``duration`` seconds."""
+    result = LoadTestResult(target_rps=rps, duration=duration)
+    status_codes: Counter[str] = Counter()
+    in_flight = asyncio.Semaphore(max_in_flight)
+
+    async def send(scheduled_at: float) -> None:
+        # Latency counts from when the request was due, including time spent
+        # waiting for an in-flight slot
+        async with in_flight:
+            try:
+                response = await client.post("/api/v1/run", json=payload)
+                status_codes[str(response.status_code)] += 1
+            except httpx.HTTPError as e:
+                status_codes[type(e).__name__] += 1
+        result.latencies.append(time.perf_counter() - scheduled_at)
+
+    started_at = time.perf_counter()
+    total = max(1, round(rps * duration))
+    tasks = []
+    for i in range(total):
+        scheduled_at = started_at + i / rps
+        await asyncio.sleep(max(0.0, scheduled_at - time.perf_counter()))
+        tasks.append(asyncio.create_task(send(scheduled_at)))
+    await asyncio.gather(*tasks)
+
+    result.sent = total
+    result.elapsed = time.perf_counter() - started_at
+    result.status_codes = dict(status_codes)
+    return result
+
+
+def _client(url: str | None, timeout: float) -> httpx.AsyncClient:
+    if url is not None:
+        return httpx.AsyncClient(base_url=url, timeout=timeout)
+
+    # Serve the app from this process, answering with the fake LLM unless
+    # the environment says otherwise
+    os.environ.setdefault("LLM_MODE", "FAKE")
+    from app.main import create_app
+
+    transport = httpx.ASGITransport(app=create_app())
+    return httpx.AsyncClient(transport=transport, base_url="http://load-test", timeout=timeout)
+
+
+async def main(args: Any) -> LoadTestResult:
+    """Run the load test described by the command-line arguments."""
+    payload: dict[str, Any] = {"query": args.query}
+    if args.tools:
+        payload["tools"] = args.tools
+    if args.priority:
+        payload["priority"] = args.priority
+
+    async with _client(None if args.in_process else args.url, args.timeout) as client:
+        return await run_load_test(client, payload, args.rps, args.duration, args.max_in_flight)
+
+
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Load test the run endpoint")
+    parser.add_argument(
+        "--url",
+        default="http://localhost:{{ cookiecutter.port }}",
+        help="Base URL of the API (default: http://localhost:{{ cookiecutter.port }})",
+    )
+    parser.add_argument(
+        "--in-process",
+        action="store_true",
+        help="Serve the app from this process instead of calling --url (uses LLM_MODE=FAKE)",
+    )
+    parser.add_argument("--rps", type=float, default=10.0, help="Requests per second (default: 10)")
+    parser.add_argument(
+        "--duration", type=float, default=10.0, help="Seconds to send requests for (default: 10)"
+    )
+    parser.add_argument(
+        "--max-in-flight",
+        type=int,
+        default=1000,
+        help="Most requests outstanding at once (default: 1000)",
+    )
+    parser.add_argument(
+        "--timeout", type=float, default=300.0, help="Per-request timeout (default: 300)"
+    )
+    parser.add_argument("--query", default="Add 1 and 2", help="Query sent with every request")
+    parser.add_argument("--tools", nargs="*", help="Tool IDs sent with every request")
+    parser.add_argument("--priority", help="Priority sent with every request")
+    parser.add_argument("--json", help="Also write the results to this JSON file")
+
+    args = parser.parse_args()
+    if args.rps <= 0 or args.duration <= 0:
+        parser.error("--rps and --duration must be positive")
+
+    target = "in-process app" if args.in_process else args.url
+    logger.info(f"Sending {args.rps:g} requests/s to {target} for {args.duration:g}s")
+
+    try:
+        summary = asyncio.run(main(args)).summary()
+    except KeyboardInterrupt:
+        logger.warning("Load test interrupted by user")
+        sys.exit(1)
+
+    latency = summary["latency_ms"]
+    logger.info(f"Sent {summary['sent']} requests in {summary['elapsed']:.1f}s")
+    logger.info(f"Status codes: {summary['status_codes']}")
+    logger.info(f"Throughput: {summary['throughput']} successful requests/s")
+    logger.info(
+        f"Latency p50 {latency['p50']}ms, p95 {latency['p95']}ms, "
+        f"p99 {latency['p99']}ms, max {latency['max']}ms"
+    )
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump(summary, f, indent=2)
+        logger.info(f"Results written to {args.json}")
@@ -1,7 +1,7 @@
 """Shared test configuration and fixtures."""
 
 import os
-from unittest.mock import patch
+from unittest.mock import Mock, patch
 
 import pytest
 
@@ -46,6 +46,51 @@ def mock_valid_api_key():
         yield
 
 
+@pytest.fixture
+def mock_portia():
+    """Mock Portia instance for testing."""
+    with patch('app.api.routes.get_portia') as mock:
+        portia_instance = Mock()
+        {%- if cookiecutter.include_example_tools == 'y' %}
+        # Mock tool registry with example tools
+        mock_tools = [
+            Mock(id="reverse_text", name="Reverse Text", description="Reverse text"),
+            Mock(id="roll_dice", name="Roll Dice", description="Roll a dice"),
+            Mock(id="add_numbers", name="Add Numbers", description="Add two numbers"),
+        ]
+        portia_instance.tool_registry = Mock()
+        portia_instance.tool_registry.get_tools.return_value = mock_tools
+        {%- else %}
+        portia_instance.tool_registry = Mock()
+        portia_instance.tool_registry.get_tools.return_value = []
+        {%- endif %}
+        mock.return_value = portia_instance
+        yield portia_instance
+
+
+
+@pytest.fixture
+def completed_plan_run():
+    """Mock plan run that completed with the output "Done"."""
+    from portia import PlanRunState
+    from portia.plan_run import PlanRun
+
+    plan_run = Mock(spec=PlanRun)
+    plan_run.state = PlanRunState.COMPLETE
+    plan_run.id = "prun-test-id"
+    plan_run.outputs = Mock()
+    plan_run.outputs.final_output.get_value.return_value = "Done"
+    plan_run.plan = None
+    return plan_run
+
+
+@pytest.fixture
+def completing_portia(mock_portia, completed_plan_run):
+    """Make every mocked plan run complete."""
+    mock_portia.run.return_value = completed_plan_run
+    return mock_portia
+
+
 # Pytest markers
 def pytest_configure(config):
     """Configure pytest markers."""
@@ -1,13 +1,22 @@
 """Unit tests for the {{ cookiecutter.project_name }} API."""
 
-from unittest.mock import Mock, patch
+import asyncio
+import json
+import threading
+import time
+from unittest.mock import DEFAULT, AsyncMock, Mock, patch
 
+import httpx
 import pytest
 from fastapi.testclient import TestClient
 from portia import PlanRunState
 from portia.plan_run import PlanRun
 
+from app.executor import ExecutorSaturatedError
+from app.hooks import build_execution_hooks
 from app.main import create_app
+from app.schemas import PortiaRunRequest
+from app.storage import PlanRunFilter, PlanRunPage, PlanRunSummary, SQLiteStorage
 
 
 @pytest.fixture
@@ -17,28 +26,6 @@ def client():
     return TestClient(app)
 
 
-@pytest.fixture
-def mock_portia():
-    """Mock Portia instance for testing."""
-    with patch('app.api.routes.get_portia') as mock:
-        portia_instance = Mock()
-        {%- if cookiecutter.include_example_tools == 'y' %}
-        # Mock tool registry with example tools
-        mock_tools = [
-            Mock(id="reverse_text", name="Reverse Text", description="Reverse text"),
-            Mock(id="roll_dice", name="Roll Dice", description="Roll a dice"),
-            Mock(id="add_numbers", name="Add Numbers", description="Add two numbers"),
-        ]
-        portia_instance.tool_registry = Mock()
-        portia_instance.tool_registry.get_tools.return_value = mock_tools
-        {%- else %}
-        portia_instance.tool_registry = Mock()
-        portia_instance.tool_registry.get_tools.return_value = []
-        {%- endif %}
-        mock.return_value = portia_instance
-        yield portia_instance
-
-
 class TestRootEndpoints:
     """Test root and health endpoints."""
 
@@ -58,6 +45,23 @@ class TestRootEndpoints:
         assert response.status_code == 200
         assert response.json() == {"status": "healthy"}
 
+    def test_metrics_endpoint(self, client, mock_portia):
+        """Test that finished runs show up in the Prometheus metrics."""
+        mock_plan_run = Mock()
+        mock_plan_run.state = PlanRunState.COMPLETE
+        mock_plan_run.id = "prun-test-id"
+        mock_plan_run.outputs.final_output.get_value.return_value = "Done"
+        mock_plan_run.plan.steps = []
+        mock_portia.run.return_value = mock_plan_run
+
+        client.post("/api/v1/run", json={"query": "Test query"})
+        response = client.get("/metrics")
+
+        assert response.status_code == 200
+        assert response.headers["content-type"].startswith("text/plain")
+        assert 'portia_plan_runs_total{state="COMPLETE"}' in response.text
+        assert "portia_plan_run_duration_seconds_bucket" in response.text
+
 
 class TestAPIStatusEndpoint:
     """Test API status endpoint."""
@@ -87,6 +91,7 @@ class TestAPIStatusEndpoint:
         assert len(data["available_tools"]) == 0  # No tools in vanilla template
         {%- endif %}
         assert "timestamp" in data
+        assert set(data["executor"]) == {"max_workers", "queue_depth", "in_flight"}
 
     def test_api_status_missing_api_key(self, client):
         """Test API status when no LLM API key is configured."""
@@ -129,6 +134,20 @@ class TestToolsEndpoint:
         assert len(tools) == 0  # No tools in vanilla template
         {%- endif %}
 
+    def test_get_tools_etag(self, client):
+        """Test that a matching If-None-Match returns 304 without a body."""
+        response = client.get("/api/v1/tools")
+        etag = response.headers["etag"]
+
+        cached = client.get("/api/v1/tools", headers={"If-None-Match": etag})
+        assert cached.status_code == 304
+        assert cached.headers["etag"] == etag
+        assert cached.content == b""
+
+        stale = client.get("/api/v1/tools", headers={"If-None-Match": '"stale"'})
+        assert stale.status_code == 200
+        assert stale.json() == response.json()
+
 
 class TestRunEndpoint:
     """Test the main run endpoint."""
@@ -295,6 +314,25 @@ class TestRunEndpoint:
         assert response.status_code == 400
         assert "None of the requested tools found" in response.json()["detail"]
 
+    def test_run_query_partially_unknown_tools(self, client, mock_portia):  # noqa: ARG002
+        """Test that unknown tool IDs are rejected even when others exist."""
+        response = client.post(
+            "/api/v1/run",
+            json={"query": "Test query", "tools": ["nonexistent_tool", "another_missing_tool"]},
+        )
+        assert response.status_code == 400
+        assert "None of the requested tools found" in response.json()["detail"]
+
+        {%- if cookiecutter.include_example_tools == 'y' %}
+
+        response = client.post(
+            "/api/v1/run",
+            json={"query": "Test query", "tools": ["reverse_text", "nonexistent_tool"]},
+        )
+        assert response.status_code == 400
+        assert response.json()["detail"] == "Unknown tool IDs: ['nonexistent_tool']"
+        {%- endif %}
+
     def test_run_query_empty_query(self, client, mock_portia):  # noqa: ARG002
         """Test empty query handling."""
         # mock_portia fixture provides the Portia instance
@@ -338,6 +376,1017 @@ class TestRunEndpoint:
         assert response.status_code == 500
         assert "Error executing query" in response.json()["detail"]
 
+    def test_run_query_body_too_large(self, client, mock_portia):
+        """Test that bodies over MAX_REQUEST_SIZE are rejected before parsing."""
+        from app.config import get_settings
+
+        oversized = "x" * get_settings().max_request_size
+        response = client.post(
+            "/api/v1/run", json={"query": "test", "plan_run_inputs": {"$x": oversized}}
+        )
+
+        assert response.status_code == 413
+        mock_portia.run.assert_not_called()
+
+    def test_run_query_timeout(self, client, mock_portia):
+        """Test that a run past its deadline fails fast and is told to stop."""
+        hooks = build_execution_hooks()
+        stopped = threading.Event()
+        step = Mock(task="Slow step", tool_id=None)
+        slow_plan_run = Mock(id="prun-test-id", current_step_index=0)
+
+        def run(**_kwargs):
+            try:
+                while True:
+                    hooks.before_step_execution(Mock(), slow_plan_run, step)
+                    time.sleep(0.02)
+            finally:
+                stopped.set()
+
+        mock_portia.run.side_effect = run
+
+        response = client.post("/api/v1/run", json={"query": "Slow query", "timeout": 0.1})
+
+        assert response.status_code == 200
+        data = response.json()
+        assert data["status"] == "FAILED"
+        assert "timed out" in data["error"]
+        assert data["metadata"]["timed_out"] is True
+        # The worker thread stops at its next step instead of running forever
+        assert stopped.wait(timeout=2)
+
+    def test_run_query_overloaded(self, client, mock_portia):
+        """Test that runs are shed with 503 and Retry-After when the queue is full."""
+        executor = Mock(saturated=True)
+        executor.run = AsyncMock(side_effect=ExecutorSaturatedError("queue full"))
+
+        with patch("app.api.routes.get_executor", return_value=executor):
+            response = client.post("/api/v1/run", json={"query": "Test query"})
+            submitted = client.post("/api/v1/runs", json={"query": "Test query"})
+
+        assert response.status_code == 503
+        assert response.headers["Retry-After"] == "5"
+        assert "at capacity" in response.json()["detail"]
+        assert submitted.status_code == 503
+        assert submitted.headers["Retry-After"] == "5"
+        mock_portia.run.assert_not_called()
+
+        metrics = client.get("/metrics").text
+        assert "portia_plan_runs_rejected_total" in metrics
+        assert "portia_plan_run_max_queue" in metrics
+
+    def test_request_timeout_cannot_exceed_server_limit(self):
+        """Test that a request may only lower the configured timeout."""
+        from app.api.routes import _effective_timeout
+        from app.config import get_settings
+
+        limit = get_settings().request_timeout
+        assert _effective_timeout(PortiaRunRequest(query="q")) == limit
+        assert _effective_timeout(PortiaRunRequest(query="q", timeout=5)) == 5
+        assert _effective_timeout(PortiaRunRequest(query="q", timeout=limit * 10)) == limit
+
+
+class TestClarificationResume:
+    """Test resuming plan runs after a clarification."""
+
+    PLAN_RUN_ID = "prun-3b9f5b5e-2c6a-4f0e-9a57-8b3d6f7e1a22"
+
+    @pytest.fixture
+    def waiting_run(self, mock_portia):
+        """Store a plan run that is waiting for one clarification."""
+        clarification = Mock(id="clar-1")
+        waiting = Mock()
+        waiting.id = self.PLAN_RUN_ID
+        waiting.state = PlanRunState.NEED_CLARIFICATION
+        waiting.get_outstanding_clarifications.return_value = [clarification]
+
+        resolved = Mock()
+        resolved.get_outstanding_clarifications.return_value = []
+
+        finished = Mock()
+        finished.id = self.PLAN_RUN_ID
+        finished.state = PlanRunState.COMPLETE
+        finished.outputs.final_output.get_value.return_value = "Booked for London"
+        finished.plan.steps = []
+
+        mock_portia.storage.get_plan_run.return_value = waiting
+        mock_portia.resolve_clarification.return_value = resolved
+        mock_portia.resume.return_value = finished
+        return clarification, waiting, resolved
+
+    def test_resolve_and_resume(self, client, mock_portia, waiting_run):
+        """Test that answering a clarification resumes the stored run without planning."""
+        clarification, waiting, resolved = waiting_run
+
+        response = client.post(
+            f"/api/v1/runs/{self.PLAN_RUN_ID}/clarifications/clar-1",
+            json={"response": "London"},
+        )
+
+        assert response.status_code == 200
+        data = response.json()
+        assert data["status"] == "COMPLETE"
+        assert data["result"] == "Booked for London"
+        assert data["metadata"]["resumed"] is True
+        mock_portia.resolve_clarification.assert_called_once_with(clarification, "London", waiting)
+        mock_portia.resume.assert_called_once_with(resolved)
+        mock_portia.run.assert_not_called()
+        mock_portia.plan.assert_not_called()
+
+    def test_waits_for_remaining_clarifications(self, client, mock_portia, waiting_run):
+        """Test that the run is not resumed while other clarifications are open."""
+        _, _, resolved = waiting_run
+        resolved.state = PlanRunState.NEED_CLARIFICATION
+        resolved.id = self.PLAN_RUN_ID
+        resolved.plan.steps = []
+        resolved.get_outstanding_clarifications.return_value = [
+            Mock(id="clar-2", question="Which date?", description="", options=None)
+        ]
+
+        response = client.post(
+            f"/api/v1/runs/{self.PLAN_RUN_ID}/clarifications/clar-1",
+            json={"response": "London"},
+        )
+
+        assert response.json()["status"] == "NEED_CLARIFICATION"
+        assert response.json()["clarifications"][0]["id"] == "clar-2"
+        mock_portia.resume.assert_not_called()
+
+    def test_unknown_clarification(self, client, waiting_run):  # noqa: ARG002
+        """Test that unknown clarification IDs return 404."""
+        response = client.post(
+            f"/api/v1/runs/{self.PLAN_RUN_ID}/clarifications/clar-missing",
+            json={"response": "London"},
+        )
+        assert response.status_code == 404
+        assert "Clarification not found" in response.json()["detail"]
+
+    def test_run_not_waiting(self, client, waiting_run):
+        """Test that runs that are not waiting for clarification are rejected."""
+        _, waiting, _ = waiting_run
+        waiting.state = PlanRunState.COMPLETE
+
+        response = client.post(
+            f"/api/v1/runs/{self.PLAN_RUN_ID}/clarifications/clar-1",
+            json={"response": "London"},
+        )
+        assert response.status_code == 409
+
+    def test_unknown_plan_run(self, client, mock_portia):  # noqa: ARG002
+        """Test that malformed or unknown plan run IDs return 404."""
+        response = client.post(
+            "/api/v1/runs/not-a-plan-run/clarifications/clar-1",
+            json={"response": "London"},
+        )
+        assert response.status_code == 404
+        assert "Plan run not found" in response.json()["detail"]
+
+    def test_resume_is_admitted_like_a_run(self, client, waiting_run):
+        """Test that resuming takes the run owner's quota and waits in the requested lane."""
+        from app.api import routes
+        from app.config import Settings
+        from app.rate_limit import InMemoryQuotaBackend, QuotaPolicy, UserRateLimiter
+
+        _, waiting, _ = waiting_run
+        waiting.end_user_id = "alice"
+        limiter = UserRateLimiter(
+            InMemoryQuotaBackend(),
+            QuotaPolicy(rate=1 / 60, burst=5, max_concurrent=1, lease_ttl=60),
+        )
+        url = f"/api/v1/runs/{self.PLAN_RUN_ID}/clarifications/clar-1"
+        body = {"response": "London", "priority": "interactive"}
+
+        with (
+            patch("app.api.routes.get_settings", return_value=Settings(rate_limit_enabled=True)),
+            patch("app.api.routes.get_rate_limiter", return_value=limiter),
+            patch(
+                "app.api.routes._await_plan_run", wraps=routes._await_plan_run
+            ) as await_plan_run,
+        ):
+            lease, _ = limiter.acquire("alice")
+            rejected = client.post(url, json=body)
+            lease.release()
+            resumed = client.post(url, json=body)
+
+        assert rejected.status_code == 429
+        assert "in progress" in rejected.json()["detail"]
+        assert resumed.status_code == 200
+        assert resumed.headers["X-Concurrency-Limit"] == "1"
+        await_plan_run.assert_called_once()
+        assert await_plan_run.call_args.kwargs["lane"] == "interactive"
+        # The lease is given back once the resumed run finishes
+        assert limiter.acquire("alice")[1].running == 1
+
+    def test_timed_out_resume_keeps_plan_run_id(self, client, waiting_run):  # noqa: ARG002
+        """Test that a resume past its deadline still reports which plan run it was."""
+        with patch("app.api.routes._await_plan_run", AsyncMock(side_effect=TimeoutError)):
+            response = client.post(
+                f"/api/v1/runs/{self.PLAN_RUN_ID}/clarifications/clar-1",
+                json={"response": "London"},
+            )
+
+        data = response.json()
+        assert data["status"] == "FAILED"
+        assert data["metadata"]["timed_out"] is True
+        assert data["plan_run_id"] == self.PLAN_RUN_ID
+
+    def test_missing_response(self, client):
+        """Test that the answer is required."""
+        response = client.post(f"/api/v1/runs/{self.PLAN_RUN_ID}/clarifications/clar-1", json={})
+        assert response.status_code == 422
+
+
+class TestProfiling:
+    """Test opt-in profiling of plan runs."""
+
+    @pytest.fixture
+    def profiling(self):
+        """Enable profiling with a fresh sampler and store."""
+        from app.config import Settings
+        from app.profiling import ProfileSampler, ProfileStore
+
+        settings = Settings(profiling_enabled=True, profiling_interval=0.001)
+        with (
+            patch("app.api.routes.get_settings", return_value=settings),
+            patch(
+                "app.api.routes.get_profile_sampler",
+                return_value=ProfileSampler(sample_rate=1, max_per_minute=100),
+            ),
+            patch("app.api.routes.get_profile_store", return_value=ProfileStore(max_entries=10)),
+        ):
+            yield
+
+    @pytest.fixture
+    def slow_portia(self, mock_portia):
+        """Make the mocked plan run spend measurable time on the worker."""
+        mock_plan_run = Mock()
+        mock_plan_run.state = PlanRunState.COMPLETE
+        mock_plan_run.id = "prun-test-id"
+        mock_plan_run.outputs.final_output.get_value.return_value = "Done"
+        mock_plan_run.plan.steps = []
+
+        def slow_run(**_kwargs):
+            deadline = time.perf_counter() + 0.05
+            while time.perf_counter() < deadline:
+                pass
+            return mock_plan_run
+
+        mock_portia.run.side_effect = slow_run
+        return mock_portia
+
+    def test_profiled_run(self, client, profiling, slow_portia):  # noqa: ARG002
+        """Test that a flagged request returns a downloadable profile."""
+        response = client.post(
+            "/api/v1/run", json={"query": "Slow query"}, headers={"X-Portia-Profile": "1"}
+        )
+
+        assert response.status_code == 200
+        profile_id = response.json()["metadata"]["profile_id"]
+        assert response.headers["x-profile-id"] == profile_id
+
+        download = client.get(f"/api/v1/profiles/{profile_id}")
+        assert download.status_code == 200
+        assert int(download.headers["x-profile-samples"]) > 0
+        assert "slow_run" in download.text
+
+    def test_query_flag(self, client, profiling, slow_portia):  # noqa: ARG002
+        """Test that profiling can be requested with a query parameter."""
+        response = client.post("/api/v1/run?profile=true", json={"query": "Slow query"})
+        assert "profile_id" in response.json()["metadata"]
+
+    def test_unflagged_run_is_not_profiled(self, client, profiling, slow_portia):  # noqa: ARG002
+        """Test that requests are only profiled when they ask for it."""
+        response = client.post("/api/v1/run", json={"query": "Slow query"})
+        assert "profile_id" not in response.json()["metadata"]
+
+    def test_profiling_disabled(self, client, slow_portia):  # noqa: ARG002
+        """Test that the flag is ignored unless profiling is enabled."""
+        response = client.post(
+            "/api/v1/run", json={"query": "Slow query"}, headers={"X-Portia-Profile": "1"}
+        )
+        assert "profile_id" not in response.json()["metadata"]
+
+    def test_unknown_profile(self, client):
+        """Test that unknown profile IDs return 404."""
+        response = client.get("/api/v1/profiles/profile-missing")
+        assert response.status_code == 404
+
+
+class TestRateLimiting:
+    """Test per-user rate limits and concurrency quotas."""
+
+    @pytest.fixture
+    def limiter(self):
+        """Enable rate limiting with a fresh in-memory limiter."""
+        from app.config import Settings
+        from app.rate_limit import InMemoryQuotaBackend, QuotaPolicy, UserRateLimiter
+
+        settings = Settings(rate_limit_enabled=True)
+        limiter = UserRateLimiter(
+            InMemoryQuotaBackend(),
+            QuotaPolicy(rate=1 / 60, burst=2, max_concurrent=1, lease_ttl=60),
+        )
+        with (
+            patch("app.api.routes.get_settings", return_value=settings),
+            patch("app.api.routes.get_rate_limiter", return_value=limiter),
+        ):
+            yield limiter
+
+    def test_rate_limit_per_user(self, client, limiter, completing_portia):  # noqa: ARG002
+        """Test that a user's burst is enforced with 429 and budget headers."""
+        request = {"query": "Test query", "user_id": "alice"}
+        first = client.post("/api/v1/run", json=request)
+        second = client.post("/api/v1/run", json=request)
+        third = client.post("/api/v1/run", json=request)
+
+        assert first.status_code == 200
+        assert first.headers["X-RateLimit-Limit"] == "2"
+        assert first.headers["X-RateLimit-Remaining"] == "1"
+        assert second.headers["X-RateLimit-Remaining"] == "0"
+        assert third.status_code == 429
+        assert third.headers["X-RateLimit-Remaining"] == "0"
+        assert int(third.headers["Retry-After"]) > 0
+        assert "Rate limit exceeded" in third.json()["detail"]
+        assert completing_portia.run.call_count == 2
+
+        # Other users and anonymous requests have their own budget
+        assert client.post("/api/v1/run", json={**request, "user_id": "bob"}).status_code == 200
+        assert client.post("/api/v1/run", json={"query": "Test query"}).status_code == 200
+
+    def test_concurrency_quota(self, client, limiter, completing_portia):  # noqa: ARG002
+        """Test that a user over their concurrent runs gets 429 until a run finishes."""
+        lease, _ = limiter.acquire("alice")
+
+        response = client.post("/api/v1/run", json={"query": "Test query", "user_id": "alice"})
+        assert response.status_code == 429
+        assert response.headers["X-Concurrency-Remaining"] == "0"
+        assert "in progress" in response.json()["detail"]
+
+        lease.release()
+        response = client.post("/api/v1/run", json={"query": "Test query", "user_id": "alice"})
+        assert response.status_code == 200
+
+    def test_batch_stays_within_concurrency_quota(self, client, limiter, completing_portia):  # noqa: ARG002
+        """Test that a user's batch items wait for their slot instead of getting 429s."""
+
+        def slow_run(*_args, **_kwargs):
+            time.sleep(0.1)
+            return DEFAULT
+
+        completing_portia.run.side_effect = slow_run
+        request = {"query": "Test query", "user_id": "alice"}
+        response = client.post(
+            "/api/v1/run/batch", json={"requests": [request, request], "concurrency": 2}
+        )
+
+        assert response.status_code == 200
+        assert [item["status_code"] for item in response.json()["results"]] == [200, 200]
+        assert completing_portia.run.call_count == 2
+
+    def test_stream_disconnect_releases_slot(self, limiter, completing_portia):
+        """Test that a client dropping the stream right after ``started`` frees its slot."""
+        finish_run = threading.Event()
+
+        def slow_run(*_args, **_kwargs):
+            finish_run.wait(5)
+            return DEFAULT
+
+        completing_portia.run.side_effect = slow_run
+        app = create_app()
+        body = json.dumps({"query": "Test query", "user_id": "alice"}).encode()
+        scope = {
+            "type": "http",
+            "asgi": {"version": "3.0"},
+            "http_version": "1.1",
+            "method": "POST",
+            "scheme": "http",
+            "path": "/api/v1/run/stream",
+            "raw_path": b"/api/v1/run/stream",
+            "root_path": "",
+            "query_string": b"",
+            "headers": [
+                (b"content-type", b"application/json"),
+                (b"content-length", str(len(body)).encode()),
+            ],
+            "client": ("testclient", 50000),
+            "server": ("testserver", 80),
+        }
+
+        async def scenario():
+            started = asyncio.Event()
+            messages = [{"type": "http.request", "body": body, "more_body": False}]
+
+            async def receive():
+                if messages:
+                    return messages.pop(0)
+                # Hang up as soon as the first event has been sent
+                await started.wait()
+                return {"type": "http.disconnect"}
+
+            async def send(message):
+                if b"event: started" in message.get("body", b""):
+                    started.set()
+
+            await app(scope, receive, send)
+
+        try:
+            asyncio.run(scenario())
+            # The run is still going on its worker thread, but its slot is free
+            lease, decision = limiter.acquire("alice")
+            assert decision.running == 1
+            lease.release()
+        finally:
+            finish_run.set()
+
+
+class TestIdempotency:
+    """Test Idempotency-Key handling on the run endpoint."""
+
+    @pytest.fixture
+    def store(self):
+        """Use a fresh idempotency store for the test."""
+        from app.idempotency import IdempotencyStore
+
+        store = IdempotencyStore(ttl=60, max_entries=10)
+        with patch("app.api.routes.get_idempotency_store", return_value=store):
+            yield store
+
+    def test_retry_replays_response(self, client, store, completing_portia):  # noqa: ARG002
+        """Test that a repeated key returns the stored response without running again."""
+        request = {"query": "Test query", "user_id": "alice"}
+        headers = {"Idempotency-Key": "retry-1"}
+        first = client.post("/api/v1/run", json=request, headers=headers)
+        second = client.post("/api/v1/run", json=request, headers=headers)
+
+        assert first.status_code == 200
+        assert "Idempotent-Replayed" not in first.headers
+        assert second.status_code == 200
+        assert second.headers["Idempotent-Replayed"] == "true"
+        assert second.json() == first.json()
+        assert completing_portia.run.call_count == 1
+
+        # Without the header, or for another user, the query runs again
+        client.post("/api/v1/run", json=request)
+        client.post("/api/v1/run", json={**request, "user_id": "bob"}, headers=headers)
+        assert completing_portia.run.call_count == 3
+
+    def test_timed_out_run_executes_again(self, client, store, completing_portia):  # noqa: ARG002
+        """Test that a retry after a timed-out run runs the query instead of replaying it."""
+        hooks = build_execution_hooks()
+        step = Mock(task="Slow step", tool_id=None)
+        slow_plan_run = Mock(id="prun-test-id", current_step_index=0)
+        plan_run = completing_portia.run.return_value
+
+        def run(**_kwargs):
+            # Only the first run is slow; the worker stops at a step once it times out
+            if completing_portia.run.call_count == 1:
+                for _ in range(25):
+                    hooks.before_step_execution(Mock(), slow_plan_run, step)
+                    time.sleep(0.02)
+            return plan_run
+
+        completing_portia.run.side_effect = run
+        request = {"query": "Test query", "timeout": 0.1}
+        headers = {"Idempotency-Key": "retry-timeout"}
+
+        first = client.post("/api/v1/run", json=request, headers=headers)
+        assert first.json()["metadata"]["timed_out"] is True
+
+        second = client.post("/api/v1/run", json=request, headers=headers)
+        assert second.status_code == 200
+        assert "Idempotent-Replayed" not in second.headers
+        assert second.json()["status"] == "COMPLETE"
+        assert completing_portia.run.call_count == 2
+
+    def test_retry_attaches_to_running_plan_run(self, store, mock_portia, completed_plan_run):  # noqa: ARG002
+        """Test that a retry sent while the first request runs waits for its result."""
+        release = threading.Event()
+
+        def run(**_kwargs):
+            release.wait(timeout=5)
+            return completed_plan_run
+
+        mock_portia.run.side_effect = run
+        payload = {"query": "Test query", "coalesce": False}
+        headers = {"Idempotency-Key": "retry-2"}
+
+        async def scenario():
+            transport = httpx.ASGITransport(app=create_app())
+            async with httpx.AsyncClient(transport=transport, base_url="http://test") as client:
+
+                def post():
+                    return asyncio.create_task(
+                        client.post("/api/v1/run", json=payload, headers=headers)
+                    )
+
+                first = post()
+                while mock_portia.run.call_count == 0:
+                    await asyncio.sleep(0.01)
+                retry = post()
+                await asyncio.sleep(0.05)
+                release.set()
+                return await asyncio.gather(first, retry)
+
+        first, retry = asyncio.run(scenario())
+
+        assert mock_portia.run.call_count == 1
+        assert retry.json()["result"] == first.json()["result"] == "Done"
+        assert retry.headers["Idempotent-Replayed"] == "true"
+
+    def test_key_reused(self, client, store, completing_portia):  # noqa: ARG002
+        """Test that reusing a key with a different body is rejected with 409."""
+        headers = {"Idempotency-Key": "retry-3"}
+        client.post("/api/v1/run", json={"query": "Test query"}, headers=headers)
+        response = client.post("/api/v1/run", json={"query": "Other query"}, headers=headers)
+
+        assert response.status_code == 409
+        assert "different request" in response.json()["detail"]
+        assert completing_portia.run.call_count == 1
+
+    def test_invalid_key(self, client, store, completing_portia):  # noqa: ARG002
+        """Test that empty and overlong keys are rejected."""
+        for key in ("", "k" * 256):
+            response = client.post(
+                "/api/v1/run", json={"query": "Test query"}, headers={"Idempotency-Key": key}
+            )
+            assert response.status_code == 400
+        completing_portia.run.assert_not_called()
+
+
+class TestPlanCache:
+    """Test plan reuse through the run endpoint."""
+
+    @pytest.fixture
+    def plan_cache(self):
+        """Enable a fresh plan cache for the test."""
+        from app.config import Settings
+        from app.plan_cache import PlanCache
+
+        cache = PlanCache(max_size=10, ttl=60)
+        with (
+            patch("app.api.routes.get_settings", return_value=Settings(plan_cache_enabled=True)),
+            patch("app.api.routes.get_plan_cache", return_value=cache),
+        ):
+            yield cache
+
+    @pytest.fixture
+    def planning_portia(self, mock_portia):
+        """Make the mocked Portia plan and run plans separately."""
+        mock_plan_run = Mock(spec=PlanRun)
+        mock_plan_run.state = PlanRunState.COMPLETE
+        mock_plan_run.id = "prun-test-id"
+        mock_output = Mock()
+        mock_output.get_value.return_value = "Cached result"
+        mock_plan_run.outputs = Mock(final_output=mock_output)
+        mock_plan_run.plan = None
+        mock_portia.plan.return_value = Mock(id="plan-test-id")
+        mock_portia.run_plan.return_value = mock_plan_run
+        return mock_portia
+
+    def test_repeated_query_reuses_plan(self, client, plan_cache, planning_portia):
+        """Test that a second run of the same query skips planning."""
+        first = client.post(
+            "/api/v1/run",
+            json={"query": "Add $a and $b", "plan_run_inputs": {"$a": 1, "$b": 2}},
+        )
+        second = client.post(
+            "/api/v1/run",
+            json={"query": "Add  $a and $b ", "plan_run_inputs": {"$a": 3, "$b": 4}},
+        )
+
+        assert first.json()["metadata"]["plan_cache"] == "miss"
+        assert second.json()["metadata"]["plan_cache"] == "hit"
+        assert second.json()["result"] == "Cached result"
+        assert planning_portia.plan.call_count == 1
+        assert planning_portia.run_plan.call_count == 2
+        assert planning_portia.run_plan.call_args.kwargs["plan_run_inputs"] == {"$a": 3, "$b": 4}
+        planning_portia.run.assert_not_called()
+        assert plan_cache.stats()["hits"] == 1
+
+        # Case is kept in keys, so a query that differs in case is planned again
+        third = client.post(
+            "/api/v1/run",
+            json={"query": "add $a and $b", "plan_run_inputs": {"$a": 5, "$b": 6}},
+        )
+        assert third.json()["metadata"]["plan_cache"] == "miss"
+        assert planning_portia.plan.call_count == 2
+
+    def test_opt_out_bypasses_cache(self, client, plan_cache, planning_portia):
+        """Test that use_plan_cache=false plans from scratch."""
+        planning_portia.run.return_value = planning_portia.run_plan.return_value
+
+        response = client.post(
+            "/api/v1/run",
+            json={"query": "Test query", "use_plan_cache": False},
+        )
+
+        assert response.json()["metadata"]["plan_cache"] == "bypass"
+        planning_portia.run.assert_called_once()
+        planning_portia.plan.assert_not_called()
+        assert len(plan_cache) == 0
+
+
+class TestSingleFlight:
+    """Test coalescing of identical concurrent runs."""
+
+    def test_identical_concurrent_runs_share_execution(self, mock_portia):
+        """Test that identical in-flight requests run Portia once."""
+        release = threading.Event()
+        mock_plan_run = Mock(spec=PlanRun)
+        mock_plan_run.state = PlanRunState.COMPLETE
+        mock_plan_run.id = "prun-test-id"
+        mock_output = Mock()
+        mock_output.get_value.return_value = "olleh"
+        mock_plan_run.outputs = Mock(final_output=mock_output)
+        mock_plan_run.plan = None
+
+        def run(**_kwargs):
+            release.wait(timeout=5)
+            return mock_plan_run
+
+        mock_portia.run.side_effect = run
+        {%- if cookiecutter.include_example_tools == 'y' %}
+        payload = {"query": "Reverse hello", "tools": ["reverse_text"]}
+        {%- else %}
+        payload = {"query": "Reverse hello"}
+        {%- endif %}
+
+        async def scenario():
+            transport = httpx.ASGITransport(app=create_app())
+            async with httpx.AsyncClient(transport=transport, base_url="http://test") as client:
+                requests = [
+                    asyncio.create_task(client.post("/api/v1/run", json=payload)) for _ in range(3)
+                ]
+                while mock_portia.run.call_count == 0:
+                    await asyncio.sleep(0.01)
+                await asyncio.sleep(0.05)
+                release.set()
+                return await asyncio.gather(*requests)
+
+        responses = asyncio.run(scenario())
+
+        assert mock_portia.run.call_count == 1
+        assert [response.json()["result"] for response in responses] == ["olleh"] * 3
+        assert sum(bool(r.json()["metadata"].get("coalesced")) for r in responses) == 2
+
+    def test_opt_out_runs_separately(self, client, mock_portia):
+        """Test that coalesce=false always starts its own plan run."""
+        from app.api.routes import _can_coalesce
+
+        registry = Mock()
+        registry.get_tools.return_value = []
+        assert _can_coalesce(PortiaRunRequest(query="q"), registry) is True
+        assert _can_coalesce(PortiaRunRequest(query="q", coalesce=False), registry) is False
+
+        mock_plan_run = Mock(spec=PlanRun)
+        mock_plan_run.state = PlanRunState.COMPLETE
+        mock_plan_run.id = "prun-test-id"
+        mock_plan_run.outputs = Mock(final_output=None)
+        mock_plan_run.plan = None
+        mock_portia.run.return_value = mock_plan_run
+
+        response = client.post("/api/v1/run", json={"query": "q", "coalesce": False})
+        assert "coalesced" not in response.json()["metadata"]
+
+    def test_non_deterministic_tools_are_not_coalesced(self):
+        """Test that runs using tools outside the deterministic set never share."""
+        from app.api.routes import _can_coalesce
+
+        registry = Mock()
+        registry.get_tools.return_value = [Mock(id="send_email")]
+        assert _can_coalesce(PortiaRunRequest(query="q"), registry) is False
+
+
+class TestBatchEndpoint:
+    """Test the batch run endpoint."""
+
+    @pytest.fixture
+    def echo_portia(self, mock_portia):
+        """Make the mocked Portia echo each query back as its result."""
+
+        def run(query, **_kwargs):
+            if query == "explode":
+                raise Exception("Portia error")
+            mock_plan_run = Mock(spec=PlanRun)
+            mock_plan_run.state = PlanRunState.COMPLETE
+            mock_plan_run.id = f"prun-{query}"
+            mock_output = Mock()
+            mock_output.get_value.return_value = query.upper()
+            mock_plan_run.outputs = Mock(final_output=mock_output)
+            mock_plan_run.plan = None
+            return mock_plan_run
+
+        mock_portia.run.side_effect = run
+        return mock_portia
+
+    def test_batch_results_in_order(self, client, echo_portia):  # noqa: ARG002
+        """Test that batch results come back in request order."""
+        response = client.post(
+            "/api/v1/run/batch",
+            json={"requests": [{"query": "a"}, {"query": "b"}, {"query": "c"}], "concurrency": 2},
+        )
+
+        assert response.status_code == 200
+        data = response.json()
+        assert [item["index"] for item in data["results"]] == [0, 1, 2]
+        assert [item["response"]["result"] for item in data["results"]] == ["A", "B", "C"]
+        assert all(item["status_code"] == 200 for item in data["results"])
+        assert data["metadata"]["succeeded"] == 3
+        assert data["metadata"]["failed"] == 0
+
+    def test_batch_item_errors_do_not_fail_batch(self, client, echo_portia):  # noqa: ARG002
+        """Test that failing items are reported per item."""
+        response = client.post(
+            "/api/v1/run/batch",
+            json={
+                "requests": [
+                    {"query": "a"},
+                    {"query": "b", "tools": ["nonexistent_tool"]},
+                    {"query": "explode"},
+                ]
+            },
+        )
+
+        assert response.status_code == 200
+        results = response.json()["results"]
+        assert results[0]["response"]["result"] == "A"
+        assert results[1]["status_code"] == 400
+        assert "None of the requested tools found" in results[1]["error"]
+        assert results[2]["status_code"] == 500
+        assert "Portia error" in results[2]["error"]
+        assert response.json()["metadata"]["failed"] == 2
+
+    def test_batch_stream_ndjson(self, client, echo_portia):  # noqa: ARG002
+        """Test that streamed batches emit one JSON line per item."""
+        response = client.post(
+            "/api/v1/run/batch",
+            json={"requests": [{"query": "a"}, {"query": "b"}], "stream": True},
+        )
+
+        assert response.status_code == 200
+        assert response.headers["content-type"].startswith("application/x-ndjson")
+        items = [json.loads(line) for line in response.text.splitlines()]
+        assert sorted(item["index"] for item in items) == [0, 1]
+        assert {item["response"]["result"] for item in items} == {"A", "B"}
+
+    def test_batch_too_large(self, client, mock_portia):  # noqa: ARG002
+        """Test that batches over the configured limit are rejected."""
+        from app.config import get_settings
+
+        limit = get_settings().batch_max_size
+        response = client.post(
+            "/api/v1/run/batch",
+            json={"requests": [{"query": "a"}] * (limit + 1)},
+        )
+        assert response.status_code == 400
+
+    def test_batch_empty(self, client):
+        """Test that an empty batch is a validation error."""
+        response = client.post("/api/v1/run/batch", json={"requests": []})
+        assert response.status_code == 422
+
+
+class TestStreamEndpoint:
+    """Test Server-Sent Events streaming of plan runs."""
+
+    def _parse_events(self, body):
+        events = []
+        for message in body.strip().split("\n\n"):
+            event_line, data_line = message.split("\n")
+            events.append((event_line.removeprefix("event: "), json.loads(data_line[6:])))
+        return events
+
+    def test_stream_run_events(self, client, mock_portia):
+        """Test that plan and step progress is streamed before the final result."""
+        hooks = build_execution_hooks()
+        step = Mock(task="Reverse the text", tool_id="reverse_text")
+        plan = Mock(id="plan-test-id", steps=[step])
+
+        mock_plan_run = Mock(spec=PlanRun)
+        mock_plan_run.state = PlanRunState.COMPLETE
+        mock_plan_run.id = "prun-test-id"
+        mock_plan_run.current_step_index = 0
+        mock_output = Mock()
+        mock_output.get_value.return_value = "dlroW olleH"
+        mock_plan_run.outputs = Mock(final_output=mock_output)
+        mock_plan_run.plan = None
+
+        def run(**_kwargs):
+            hooks.before_plan_run(plan, mock_plan_run)
+            hooks.before_step_execution(plan, mock_plan_run, step)
+            hooks.after_step_execution(plan, mock_plan_run, step, mock_output)
+            return mock_plan_run
+
+        mock_portia.run.side_effect = run
+
+        response = client.post("/api/v1/run/stream", json={"query": "Test query"})
+
+        assert response.status_code == 200
+        assert response.headers["content-type"].startswith("text/event-stream")
+        events = self._parse_events(response.text)
+        assert [event for event, _ in events] == [
+            "started",
+            "plan",
+            "step_started",
+            "step_completed",
+            "complete",
+        ]
+        assert events[1][1]["steps"][0]["tool_id"] == "reverse_text"
+        assert events[2][1]["tool_id"] == "reverse_text"
+        assert events[-1][1]["status"] == "COMPLETE"
+        assert events[-1][1]["result"] == "dlroW olleH"
+
+    def test_stream_run_clarifications(self, client, mock_portia):
+        """Test that outstanding clarifications are streamed as their own events."""
+        mock_plan_run = Mock(spec=PlanRun)
+        mock_plan_run.state = PlanRunState.NEED_CLARIFICATION
+        mock_plan_run.id = "prun-test-id"
+        mock_plan_run.outputs = Mock(final_output=None)
+        mock_plan_run.plan = None
+        mock_clarification = Mock()
+        mock_clarification.id = "clarif-123"
+        mock_clarification.question = "Test question?"
+        mock_clarification.description = "Test description"
+        mock_clarification.options = None
+        mock_plan_run.get_outstanding_clarifications.return_value = [mock_clarification]
+        mock_portia.run.return_value = mock_plan_run
+
+        response = client.post("/api/v1/run/stream", json={"query": "Ambiguous query"})
+
+        events = self._parse_events(response.text)
+        assert [event for event, _ in events] == ["started", "clarification", "complete"]
+        assert events[1][1]["id"] == "clarif-123"
+        assert events[2][1]["status"] == "NEED_CLARIFICATION"
+
+    def test_stream_run_error(self, client, mock_portia):
+        """Test that execution errors end the stream with an error event."""
+        mock_portia.run.side_effect = Exception("Portia error")
+
+        response = client.post("/api/v1/run/stream", json={"query": "Test query"})
+
+        events = self._parse_events(response.text)
+        assert events[-1][0] == "error"
+        assert "Portia error" in events[-1][1]["detail"]
+
+    def test_stream_run_invalid_tools(self, client, mock_portia):  # noqa: ARG002
+        """Test that unknown tools are rejected before streaming starts."""
+        response = client.post(
+            "/api/v1/run/stream",
+            json={"query": "Test query", "tools": ["nonexistent_tool"]},
+        )
+        assert response.status_code == 400
+
+
+class TestRunJobsEndpoint:
+    """Test asynchronous runs submitted through /runs."""
+
+    @pytest.fixture
+    def lifespan_client(self, mock_portia):  # noqa: ARG002
+        """Client that keeps one event loop alive so background jobs can finish."""
+        with TestClient(create_app()) as client:
+            yield client
+
+    def _wait_for_run(self, client, plan_run_id):
+        for _ in range(100):
+            response = client.get(f"/api/v1/runs/{plan_run_id}")
+            if response.json()["status"] not in ("NOT_STARTED", "IN_PROGRESS"):
+                return response
+            time.sleep(0.02)
+        raise AssertionError(f"Run {plan_run_id} did not finish")
+
+    def test_submit_run_returns_immediately(self, lifespan_client, mock_portia):
+        """Test that submission returns a pollable ID before the run completes."""
+        mock_plan_run = Mock(spec=PlanRun)
+        mock_plan_run.state = PlanRunState.COMPLETE
+        mock_plan_run.id = "prun-test-id"
+        mock_output = Mock()
+        mock_output.get_value.return_value = "Background result"
+        mock_plan_run.outputs = Mock(final_output=mock_output)
+        mock_plan_run.plan = None
+        mock_portia.run.return_value = mock_plan_run
+
+        response = lifespan_client.post("/api/v1/runs", json={"query": "Test query"})
+
+        assert response.status_code == 202
+        data = response.json()
+        assert data["status"] == "NOT_STARTED"
+        assert data["plan_run_id"].startswith("job-")
+        assert response.headers["location"].endswith(f"/api/v1/runs/{data['plan_run_id']}")
+
+        result = self._wait_for_run(lifespan_client, data["plan_run_id"]).json()
+        assert result["status"] == "COMPLETE"
+        assert result["result"] == "Background result"
+        assert result["plan_run_id"] == "prun-test-id"
+        assert result["metadata"]["job_id"] == data["plan_run_id"]
+
+        # The Portia plan run ID resolves to the same job once it is known
+        by_plan_run_id = lifespan_client.get("/api/v1/runs/prun-test-id")
+        assert by_plan_run_id.json()["result"] == "Background result"
+
+    def test_submit_run_failure_is_reported(self, lifespan_client, mock_portia):
+        """Test that errors in the background surface as FAILED runs."""
+        mock_portia.run.side_effect = Exception("Portia error")
+
+        response = lifespan_client.post("/api/v1/runs", json={"query": "Test query"})
+        assert response.status_code == 202
+
+        result = self._wait_for_run(lifespan_client, response.json()["plan_run_id"]).json()
+        assert result["status"] == "FAILED"
+        assert "Portia error" in result["error"]
+
+    def test_submit_run_invalid_tools(self, lifespan_client):
+        """Test that unknown tools are rejected before a job is created."""
+        response = lifespan_client.post(
+            "/api/v1/runs",
+            json={"query": "Test query", "tools": ["nonexistent_tool"]},
+        )
+        assert response.status_code == 400
+
+    def test_get_unknown_run(self, client):
+        """Test polling for a run that does not exist."""
+        response = client.get("/api/v1/runs/job-does-not-exist")
+        assert response.status_code == 404
+
+
+class TestRunHistory:
+    """Test listing stored plan runs."""
+
+    @pytest.fixture
+    def storage(self, mock_portia):
+        """Give the mocked Portia instance a SQLite storage double."""
+        mock_portia.storage = Mock(spec=SQLiteStorage)
+        mock_portia.storage.list_plan_run_summaries.return_value = PlanRunPage(
+            summaries=[
+                PlanRunSummary(
+                    plan_run_id="prun-2",
+                    plan_id="plan-1",
+                    end_user_id="alice",
+                    state="COMPLETE",
+                    query="Add 1 and 2",
+                    created_at=1_700_000_100.0,
+                    updated_at=1_700_000_105.0,
+                )
+            ],
+            next_cursor="next-page",
+        )
+        return mock_portia.storage
+
+    def test_list_runs(self, client, storage):
+        """Test that runs are listed as compact summaries with a cursor."""
+        response = client.get(
+            "/api/v1/runs",
+            params={
+                "user_id": "alice",
+                "state": "COMPLETE",
+                "tool": "add_numbers",
+                "created_after": "2023-11-14T22:13:20Z",
+                "limit": 10,
+                "cursor": "this-page",
+            },
+        )
+
+        assert response.status_code == 200
+        data = response.json()
+        assert data["next_cursor"] == "next-page"
+        assert data["runs"] == [
+            {
+                "plan_run_id": "prun-2",
+                "plan_id": "plan-1",
+                "user_id": "alice",
+                "status": "COMPLETE",
+                "query": "Add 1 and 2",
+                "created_at": "2023-11-14T22:15:00Z",
+                "updated_at": "2023-11-14T22:15:05Z",
+            }
+        ]
+        storage.list_plan_run_summaries.assert_called_once_with(
+            PlanRunFilter(
+                end_user_id="alice",
+                state=PlanRunState.COMPLETE,
+                created_after=1_700_000_000.0,
+                tool_id="add_numbers",
+            ),
+            10,
+            "this-page",
+        )
+
+    def test_invalid_cursor(self, client, storage):
+        """Test that malformed cursors return 400."""
+        storage.list_plan_run_summaries.side_effect = ValueError("Invalid cursor: nope")
+        response = client.get("/api/v1/runs", params={"cursor": "nope"})
+        assert response.status_code == 400
+        assert "Invalid cursor" in response.json()["detail"]
+
+    def test_limit_is_bounded(self, client, storage):  # noqa: ARG002
+        """Test that page sizes above the maximum are rejected."""
+        response = client.get("/api/v1/runs", params={"limit": 100_000})
+        assert response.status_code == 422
+
+    def test_unsupported_storage(self, client, mock_portia):  # noqa: ARG002
+        """Test that storage classes without listings return 501."""
+        response = client.get("/api/v1/runs")
+        assert response.status_code == 501
+
 
 {%- if cookiecutter.include_example_tools == 'y' %}
 class TestExampleTools:
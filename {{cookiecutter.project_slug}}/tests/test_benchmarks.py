@@ -0,0 +1,69 @@
+"""Tests for the benchmark harness."""
+
+from loguru import logger
+
+from benchmarks.cases import log_path_cases
+from benchmarks.harness import BenchmarkResult, BenchmarkRun, compare, format_time, measure
+
+
+def _result(name, median, **params):
+    return BenchmarkResult(
+        name=name, params=params, loops=10, repeat=3, best=median, median=median, mean=median
+    )
+
+
+class TestBenchmarkHarness:
+    """Test timing, storage and comparison of benchmark results."""
+
+    def test_measure(self):
+        """Test that a measured case reports per-call times under its key."""
+        result = measure("sum", lambda: sum(range(10)), {"n": 10}, repeat=2)
+
+        assert result.key == "sum[n=10]"
+        assert result.repeat == 2
+        assert result.loops >= 1
+        assert 0 < result.best <= result.median
+
+    def test_save_and_load(self, tmp_path):
+        """Test that results survive a round trip through JSON."""
+        run = BenchmarkRun(version="1.0", results=[_result("a", 0.5, size=10), _result("b", 1.0)])
+        path = tmp_path / "results.json"
+        run.save(path)
+
+        loaded = BenchmarkRun.load(path)
+        assert loaded == run
+        assert '"key": "a[size=10]"' in path.read_text()
+
+    def test_compare(self):
+        """Test that cases are paired by key and missing ones are skipped."""
+        baseline = BenchmarkRun(version="1.0", results=[_result("a", 1.0), _result("b", 1.0)])
+        current = BenchmarkRun(version="1.1", results=[_result("a", 1.5), _result("c", 1.0)])
+
+        [comparison] = compare(baseline, current)
+        assert comparison.key == "a"
+        assert comparison.ratio == 1.5
+
+    def test_format_time(self):
+        """Test that durations get a readable unit."""
+        assert format_time(2.5) == "2.50s"
+        assert format_time(0.0025) == "2.50ms"
+        assert format_time(0.0000025) == "2.50us"
+        assert format_time(0.0000000025) == "2ns"
+
+
+class TestBenchmarkCases:
+    """Test the benchmark cases."""
+
+    def test_log_path_keeps_other_handlers(self):
+        """Test that the log cases add and remove only their own handler."""
+        messages = []
+        handler_id = logger.add(messages.append, level="INFO", format="{message}")
+        try:
+            for _name, _params, func in log_path_cases(["small"]):
+                func()
+            logger.info("After the cases")
+        finally:
+            logger.remove(handler_id)
+
+        assert len(messages) == 2
+        assert messages[-1].strip() == "After the cases"
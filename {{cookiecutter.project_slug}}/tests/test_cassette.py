@@ -0,0 +1,217 @@
+"""Tests for record and replay of LLM and tool calls."""
+
+import json
+import time
+from typing import Annotated
+from unittest.mock import Mock, patch
+
+import pytest
+from langchain_core.messages import HumanMessage, ToolMessage
+from langchain_core.tools import tool as langchain_tool
+from portia import ToolSoftError, tool
+from portia.model import Message
+from pydantic import BaseModel
+
+from app.cassette import (
+    Cassette,
+    CassetteGenerativeModel,
+    CassetteMissError,
+    CassetteReplayedError,
+    CassetteTool,
+    call_key,
+)
+from app.fake_llm import FakeGenerativeModel
+
+
+class Answer(BaseModel):
+    """Schema used to test structured responses."""
+
+    value: int
+
+
+@langchain_tool
+def add(a: int, b: int) -> int:
+    """Add two numbers."""
+    return a + b
+
+
+@tool
+def shout(text: Annotated[str, "Text to shout"]) -> str:
+    """Shout the given text."""
+    if not text:
+        raise ToolSoftError("Nothing to shout")
+    return text.upper()
+
+
+def _record(path, calls):
+    cassette = Cassette(path, recording=True)
+    for request, response in calls:
+        cassette.call("test", request, lambda response=response: response)
+    cassette.close()
+
+
+class TestCassette:
+    """Test recording calls to a file and replaying them."""
+
+    def test_record_and_replay(self, tmp_path):
+        """Test that replay returns what was recorded without calling anything."""
+        path = tmp_path / "cassette.jsonl"
+        _record(path, [({"q": "a"}, 1), ({"q": "b"}, 2)])
+
+        with path.open() as f:
+            assert [json.loads(line)["response"] for line in f] == [1, 2]
+
+        cassette = Cassette(path, recording=False)
+        compute = Mock()
+        assert cassette.call("test", {"q": "b"}, compute) == 2
+        assert cassette.call("test", {"q": "a"}, compute) == 1
+        compute.assert_not_called()
+        assert cassette.stats() == {"entries": 2, "recorded": 0, "replayed": 2}
+
+    def test_repeated_calls_replay_in_order(self, tmp_path):
+        """Test that identical calls replay in order, then repeat the last answer."""
+        path = tmp_path / "cassette.jsonl"
+        _record(path, [("same", "first"), ("same", "second")])
+
+        cassette = Cassette(path, recording=False)
+        answers = [cassette.call("test", "same", Mock()) for _ in range(3)]
+        assert answers == ["first", "second", "second"]
+
+    def test_replay_latency(self, tmp_path):
+        """Test that replay waits for the recorded duration only when asked to."""
+        path = tmp_path / "cassette.jsonl"
+        recorder = Cassette(path, recording=True)
+        recorder.call("test", "slow", lambda: time.sleep(0.05) or "done")
+        recorder.close()
+
+        with path.open() as f:
+            duration = json.loads(f.readline())["duration"]
+        assert duration >= 0.05
+
+        with patch("app.cassette.time.sleep") as sleep:
+            assert Cassette(path, recording=False).call("test", "slow", Mock()) == "done"
+            sleep.assert_not_called()
+            replay = Cassette(path, recording=False, replay_latency=True)
+            assert replay.call("test", "slow", Mock()) == "done"
+            sleep.assert_called_once_with(duration)
+
+    def test_missing_call(self, tmp_path):
+        """Test that replaying an unrecorded call fails instead of calling out."""
+        path = tmp_path / "cassette.jsonl"
+        _record(path, [("recorded", 1)])
+
+        with pytest.raises(CassetteMissError):
+            Cassette(path, recording=False).call("test", "not recorded", Mock())
+
+    def test_recorder_died_mid_write(self, tmp_path):
+        """Test that a cassette cut off mid-line replays and records past the partial line."""
+        path = tmp_path / "cassette.jsonl"
+        recorder = Cassette(path, recording=True)
+        recorder.call("test", "first", lambda: 1)
+        recorder.call("test", "second", lambda: 2)
+        # The recording process dies partway through writing its last call, without closing
+        with path.open("r+b") as f:
+            f.truncate(path.stat().st_size - 5)
+
+        replay = Cassette(path, recording=False)
+        assert replay.call("test", "first", Mock()) == 1
+        with pytest.raises(CassetteMissError):
+            replay.call("test", "second", Mock())
+
+        _record(path, [("third", 3)])
+        replay = Cassette(path, recording=False)
+        assert len(replay) == 2
+        assert replay.call("test", "third", Mock()) == 3
+
+    def test_keys_ignore_ids_and_timestamps(self):
+        """Test that run IDs and times do not change the key of a call."""
+        first = call_key("llm", "prun-123e4567-e89b-12d3-a456-426614174000 at 2025-01-01T10:00:00Z")
+        second = call_key("llm", "prun-9f8e7d6c-5b4a-4f3e-8d2c-1b0a9f8e7d6c at 2025-06-30 23:59:59")
+        assert first == second
+        assert call_key("llm", "query") != call_key("tool", "query")
+
+    def test_errors_are_replayed(self, tmp_path):
+        """Test that recorded errors are raised again on replay."""
+        path = tmp_path / "cassette.jsonl"
+        cassette = Cassette(path, recording=True)
+        for kind in ("soft", "other"):
+            with pytest.raises(ValueError, match="boom"):
+                cassette.call(kind, "request", Mock(side_effect=ValueError("boom")))
+        cassette.close()
+
+        replay = Cassette(path, recording=False)
+        with pytest.raises(ToolSoftError, match="boom"):
+            replay.call("soft", "request", Mock(), errors={"ValueError": ToolSoftError})
+        with pytest.raises(CassetteReplayedError, match="boom"):
+            replay.call("other", "request", Mock())
+
+
+class TestCassetteGenerativeModel:
+    """Test recording and replaying a model through a cassette."""
+
+    def test_record_and_replay(self, tmp_path):
+        """Test that plain and structured responses replay without the model."""
+        path = tmp_path / "cassette.jsonl"
+        messages = [Message(role="user", content="What is 1 + 2?")]
+        fake = FakeGenerativeModel(script={"text": "3", "structured": {"Answer": {"value": 3}}})
+
+        recorder = CassetteGenerativeModel(Cassette(path, recording=True), fake)
+        assert recorder.get_response(messages).content == "3"
+        assert recorder.get_structured_response(messages, Answer) == Answer(value=3)
+        assert str(recorder) == str(fake)
+        recorder.cassette.close()
+
+        replay = CassetteGenerativeModel(Cassette(path, recording=False))
+        assert replay.get_response(messages).content == "3"
+        assert replay.get_structured_response(messages, Answer) == Answer(value=3)
+        assert fake.calls == 2
+
+    def test_recording_needs_a_model(self, tmp_path):
+        """Test that recording without a model to record is rejected."""
+        with pytest.raises(ValueError):
+            CassetteGenerativeModel(Cassette(tmp_path / "cassette.jsonl", recording=True))
+
+    def test_langchain_tool_calls_replay(self, tmp_path):
+        """Test that a LangChain tool-calling exchange replays with its tool calls."""
+        path = tmp_path / "cassette.jsonl"
+        fake = FakeGenerativeModel(script={"text": "3", "tool_args": {"add": {"a": 1, "b": 2}}})
+
+        def converse(model):
+            chat = model.to_langchain().bind_tools([add])
+            first = chat.invoke([HumanMessage(content="Add 1 and 2")])
+            result = ToolMessage(content="3", tool_call_id=first.tool_calls[0]["id"])
+            second = chat.invoke([HumanMessage(content="Add 1 and 2"), first, result])
+            return first, second
+
+        recorder = CassetteGenerativeModel(Cassette(path, recording=True), fake)
+        recorded = converse(recorder)
+        recorder.cassette.close()
+
+        first, second = converse(CassetteGenerativeModel(Cassette(path, recording=False)))
+        assert first.tool_calls[0]["args"] == {"a": 1, "b": 2}
+        assert first.tool_calls == recorded[0].tool_calls
+        assert second.content == "3"
+
+
+class TestCassetteTool:
+    """Test recording and replaying tool calls through a cassette."""
+
+    def test_record_and_replay(self, tmp_path):
+        """Test that results and tool errors replay without running the tool."""
+        path = tmp_path / "cassette.jsonl"
+        original = shout()
+
+        recorder = CassetteTool.wrap(original, Cassette(path, recording=True))
+        assert recorder.id == original.id
+        assert recorder.args_schema is original.args_schema
+        assert recorder.run(Mock(), text="hi") == "HI"
+        with pytest.raises(ToolSoftError):
+            recorder.run(Mock(), text="")
+        recorder.cassette.close()
+
+        replay = CassetteTool.wrap(original, Cassette(path, recording=False))
+        with patch.object(type(original), "run") as run:
+            assert replay.run(Mock(), text="hi") == "HI"
+            with pytest.raises(ToolSoftError, match="Nothing to shout"):
+                replay.run(Mock(), text="")
+        run.assert_not_called()
@@ -6,7 +6,7 @@ from unittest.mock import patch
 import pytest
 from pydantic import ValidationError
 
-from app.config import Settings, get_settings
+from app.config import LatencyDistribution, LLMMode, Settings, StorageBackend, get_settings
 
 
 class TestSettings:
@@ -22,6 +22,12 @@ class TestSettings:
             assert settings.host == "0.0.0.0"
             assert settings.port == {{ cookiecutter.port }}
             assert settings.log_level == "INFO"
+            assert settings.plan_run_max_workers == 8
+            assert settings.plan_run_max_queue == 64
+            assert settings.plan_cache_enabled is False
+            assert settings.llm_mode == LLMMode.LIVE
+            assert settings.llm_http2 is True
+            assert settings.llm_http_max_connections == 100
 
     def test_settings_from_env(self):
         """Test settings loading from environment variables."""
@@ -41,6 +47,38 @@ class TestSettings:
             assert settings.log_level == "DEBUG"
             assert settings.openai_api_key == "test-key"
 
+    def test_fake_llm_mode_from_env(self):
+        """Test selecting the fake LLM and its latency through the environment."""
+        env_vars = {
+            "LLM_MODE": "FAKE",
+            "FAKE_LLM_LATENCY_DISTRIBUTION": "LOGNORMAL",
+            "FAKE_LLM_LATENCY_MEAN": "0.8",
+        }
+        with patch.dict(os.environ, env_vars, clear=True):
+            settings = Settings()
+            assert settings.llm_mode == LLMMode.FAKE
+            assert settings.fake_llm_latency_distribution == LatencyDistribution.LOGNORMAL
+            assert settings.fake_llm_latency_mean == 0.8
+            assert settings.has_llm_api_key() is False
+
+    def test_cassette_mode_from_env(self):
+        """Test selecting cassette replay and its file through the environment."""
+        env_vars = {"LLM_MODE": "REPLAY", "CASSETTE_PATH": "recordings/prod.jsonl"}
+        with patch.dict(os.environ, env_vars, clear=True):
+            settings = Settings()
+            assert settings.llm_mode == LLMMode.REPLAY
+            assert settings.cassette_path == "recordings/prod.jsonl"
+
+    def test_llm_routing_from_env(self):
+        """Test enabling multi-provider routing through the environment."""
+        env_vars = {"LLM_ROUTING_ENABLED": "true", "LLM_ROUTING_TIMEOUT": "30"}
+        with patch.dict(os.environ, env_vars, clear=True):
+            settings = Settings()
+            assert settings.llm_routing_enabled is True
+            assert settings.llm_routing_timeout == 30.0
+            assert settings.llm_routing_max_error_rate == 0.5
+            assert settings.llm_routing_max_pending_calls == 64
+
     def test_has_llm_api_key_openai(self):
         """Test LLM API key detection for OpenAI."""
         with patch.dict(os.environ, {"OPENAI_API_KEY": "test-key"}, clear=True):
@@ -85,6 +123,14 @@ class TestSettings:
             from portia.config import StorageClass
             assert settings.get_portia_storage_class() == StorageClass.DISK
 
+    def test_get_storage_backend_sqlite(self):
+        """Test that SQLite storage runs over Portia's in-memory storage class."""
+        with patch.dict(os.environ, {"PORTIA_STORAGE_CLASS": "SQLITE"}, clear=True):
+            settings = Settings()
+            from portia.config import StorageClass
+            assert settings.get_storage_backend() == StorageBackend.SQLITE
+            assert settings.get_portia_storage_class() == StorageClass.MEMORY
+
     def test_get_portia_storage_class_invalid(self):
         """Test getting Portia storage class with invalid value."""
         with patch.dict(os.environ, {"PORTIA_STORAGE_CLASS": "INVALID"}, clear=True):
@@ -104,6 +150,12 @@ class TestSettings:
             with pytest.raises(ValidationError):
                 Settings()
 
+    def test_settings_validation_plan_cache_ttl(self):
+        """Test that a plan cache TTL that would expire every plan at once is rejected."""
+        with patch.dict(os.environ, {"PLAN_CACHE_TTL": "0"}, clear=True):
+            with pytest.raises(ValidationError):
+                Settings()
+
     def test_settings_validation_invalid_log_level(self):
         """Test settings validation with invalid log level."""
         with patch.dict(os.environ, {"LOG_LEVEL": "INVALID"}, clear=True):
@@ -0,0 +1,180 @@
+"""Tests for the plan-run executor."""
+
+import asyncio
+import threading
+import time
+
+import pytest
+
+from app.executor import ExecutorSaturatedError, PlanRunExecutor
+
+
+@pytest.fixture
+def executor():
+    """Create a small executor and shut it down after the test."""
+    pool = PlanRunExecutor(max_workers=2)
+    yield pool
+    pool.shutdown()
+
+
+class TestPlanRunExecutor:
+    """Test the PlanRunExecutor class."""
+
+    def test_invalid_max_workers(self):
+        """Test that an empty pool is rejected."""
+        with pytest.raises(ValueError):
+            PlanRunExecutor(max_workers=0)
+        with pytest.raises(ValueError):
+            PlanRunExecutor(max_workers=1, max_queue=-1)
+
+    def test_run_returns_result(self, executor):
+        """Test that results and arguments pass through the pool."""
+        result = asyncio.run(executor.run(lambda a, b=0: a + b, 1, b=2))
+        assert result == 3
+
+    def test_run_propagates_exceptions(self, executor):
+        """Test that exceptions raised in the pool reach the caller."""
+
+        def fail():
+            raise RuntimeError("boom")
+
+        with pytest.raises(RuntimeError, match="boom"):
+            asyncio.run(executor.run(fail))
+
+        assert executor.stats()["in_flight"] == 0
+
+    def test_event_loop_stays_responsive(self, executor):
+        """Test that a blocking run does not stall other coroutines."""
+
+        async def scenario():
+            run = asyncio.create_task(executor.run(time.sleep, 0.3))
+            started = time.perf_counter()
+            await asyncio.sleep(0.01)
+            elapsed = time.perf_counter() - started
+            await run
+            return elapsed
+
+        assert asyncio.run(scenario()) < 0.2
+
+    def test_gauges_track_queue_and_in_flight(self, executor):
+        """Test queue depth and in-flight gauges under saturation."""
+        release = threading.Event()
+
+        async def scenario():
+            runs = [asyncio.create_task(executor.run(release.wait)) for _ in range(3)]
+            while executor.in_flight < 2:
+                await asyncio.sleep(0.01)
+            snapshot = executor.stats()
+            release.set()
+            await asyncio.gather(*runs)
+            return snapshot
+
+        snapshot = asyncio.run(scenario())
+        assert snapshot == {"max_workers": 2, "queue_depth": 1, "in_flight": 2}
+        assert executor.stats() == {"max_workers": 2, "queue_depth": 0, "in_flight": 0}
+
+    def test_full_queue_rejects_runs(self):
+        """Test that runs beyond the workers and queue are rejected at once."""
+        executor = PlanRunExecutor(max_workers=1, max_queue=1)
+        release = threading.Event()
+
+        async def scenario():
+            runs = [asyncio.create_task(executor.run(release.wait)) for _ in range(2)]
+            while executor.in_flight < 1:
+                await asyncio.sleep(0.01)
+            assert executor.saturated
+            with pytest.raises(ExecutorSaturatedError):
+                await executor.run(release.wait)
+            release.set()
+            await asyncio.gather(*runs)
+
+        try:
+            asyncio.run(scenario())
+        finally:
+            executor.shutdown()
+        assert executor.rejected == 1
+        assert not executor.saturated
+        assert executor.stats() == {"max_workers": 1, "queue_depth": 0, "in_flight": 0}
+
+
+def _start_order(executor, lanes):
+    """Queue one run per entry of ``lanes`` behind a busy worker; return the order they start."""
+    release = threading.Event()
+    started = []
+
+    async def scenario():
+        blocker = asyncio.create_task(executor.run(release.wait))
+        while executor.in_flight < 1:
+            await asyncio.sleep(0.01)
+        runs = [
+            asyncio.create_task(executor.run(started.append, index, lane=lane))
+            for index, lane in enumerate(lanes)
+        ]
+        await asyncio.sleep(0.01)
+        assert executor.queue_depth == len(lanes)
+        release.set()
+        await asyncio.gather(blocker, *runs)
+
+    try:
+        asyncio.run(scenario())
+    finally:
+        executor.shutdown()
+    return [lanes[index] for index in started]
+
+
+class TestPriorityLanes:
+    """Test weighted fair scheduling across priority lanes."""
+
+    def test_unknown_lane(self, executor):
+        """Test that runs must name a configured lane."""
+        with pytest.raises(ValueError, match="Unknown lane"):
+            asyncio.run(executor.run(lambda: None, lane="urgent"))
+
+    def test_invalid_weights(self):
+        """Test that lane weights must be positive."""
+        with pytest.raises(ValueError):
+            PlanRunExecutor(max_workers=1, lane_weights={"default": 0})
+
+    def test_weighted_fair_share(self):
+        """Test that lanes get workers in proportion to their weights."""
+        executor = PlanRunExecutor(
+            max_workers=1, lane_weights={"default": 1, "interactive": 3, "batch": 1}
+        )
+        order = _start_order(executor, ["batch"] * 4 + ["interactive"] * 6)
+
+        # Interactive runs queued later still go first, three for every batch run
+        assert order[:4] == ["interactive", "interactive", "interactive", "batch"]
+        assert order[4:8] == ["interactive", "interactive", "interactive", "batch"]
+
+    def test_waiting_runs_are_not_starved(self):
+        """Test that a run waiting past max_wait starts next whatever its lane."""
+        executor = PlanRunExecutor(
+            max_workers=1,
+            lane_weights={"default": 1, "interactive": 100, "batch": 1},
+            max_wait=0.001,
+        )
+        order = _start_order(executor, ["batch", "interactive", "interactive"])
+
+        assert order == ["batch", "interactive", "interactive"]
+
+    def test_cancelled_runs_leave_the_queue(self, executor):
+        """Test that a queued run whose caller gave up never starts."""
+        release = threading.Event()
+        started = []
+
+        async def scenario():
+            blockers = [asyncio.create_task(executor.run(release.wait)) for _ in range(2)]
+            while executor.in_flight < 2:
+                await asyncio.sleep(0.01)
+            queued = asyncio.create_task(executor.run(started.append, "cancelled"))
+            await asyncio.sleep(0.01)
+            assert executor.lane_depths() == {"default": 1}
+            queued.cancel()
+            await asyncio.sleep(0.01)
+            assert executor.queue_depth == 0
+            release.set()
+            await asyncio.gather(*blockers)
+
+        asyncio.run(scenario())
+        assert started == []
+        assert executor.stats() == {"max_workers": 2, "queue_depth": 0, "in_flight": 0}
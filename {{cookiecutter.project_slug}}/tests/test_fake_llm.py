@@ -0,0 +1,164 @@
+"""Tests for the fake LLM."""
+
+import random
+import statistics
+from enum import StrEnum
+from typing import Literal
+from unittest.mock import patch
+
+import pytest
+from langchain_core.messages import HumanMessage, ToolMessage
+from langchain_core.tools import tool
+from pydantic import BaseModel
+
+from app.config import LatencyDistribution, Settings
+from app.fake_llm import (
+    DEFAULT_FAKE_TEXT,
+    FakeGenerativeModel,
+    LatencyModel,
+    build_fake_model,
+    placeholder,
+)
+
+
+class Color(StrEnum):
+    """Enum used to test placeholders."""
+
+    RED = "red"
+    BLUE = "blue"
+
+
+class Inner(BaseModel):
+    """Nested schema used to test placeholders."""
+
+    name: str
+    count: int
+
+
+class Outer(BaseModel):
+    """Schema used to test placeholders."""
+
+    inner: Inner
+    items: list[str]
+    color: Color
+    kind: Literal["a", "b"]
+    flag: bool
+    note: str | None
+    optional: int = 5
+
+
+@tool
+def add(a: int, b: int) -> int:
+    """Add two numbers."""
+    return a + b
+
+
+class TestLatencyModel:
+    """Test simulated latency distributions."""
+
+    def test_constant(self):
+        """Test that a constant distribution always returns the mean."""
+        latency = LatencyModel(LatencyDistribution.CONSTANT, mean=0.2, stddev=1.0)
+        assert {latency.sample(random.Random(seed)) for seed in range(5)} == {0.2}
+
+    @pytest.mark.parametrize(
+        "distribution",
+        [LatencyDistribution.UNIFORM, LatencyDistribution.NORMAL, LatencyDistribution.LOGNORMAL],
+    )
+    def test_mean_and_stddev(self, distribution):
+        """Test that samples have about the configured mean and are never negative."""
+        latency = LatencyModel(distribution, mean=0.5, stddev=0.1)
+        rng = random.Random(0)
+        samples = [latency.sample(rng) for _ in range(5000)]
+
+        assert min(samples) >= 0
+        assert statistics.mean(samples) == pytest.approx(0.5, rel=0.05)
+        assert statistics.stdev(samples) == pytest.approx(0.1, rel=0.1)
+
+    def test_seeded_samples_repeat(self):
+        """Test that the same seed gives the same latencies."""
+        latency = LatencyModel(LatencyDistribution.LOGNORMAL, mean=0.5, stddev=0.3)
+        first, second = random.Random(7), random.Random(7)
+        assert [latency.sample(first) for _ in range(10)] == [
+            latency.sample(second) for _ in range(10)
+        ]
+
+
+class TestFakeGenerativeModel:
+    """Test the FakeGenerativeModel class."""
+
+    def test_placeholder(self):
+        """Test that placeholders fill every required field with a valid value."""
+        values = placeholder(Outer)
+
+        assert values == {
+            "inner": {"name": DEFAULT_FAKE_TEXT, "count": 0},
+            "items": [],
+            "color": "red",
+            "kind": "a",
+            "flag": False,
+            "note": None,
+        }
+        assert Outer.model_validate(values).optional == 5
+
+    def test_structured_response_uses_script(self):
+        """Test that scripted fields override placeholders."""
+        model = FakeGenerativeModel(script={"structured": {"Outer": {"items": ["x"]}}})
+
+        response = model.get_structured_response([], Outer)
+
+        assert response.items == ["x"]
+        assert response.inner.count == 0
+        assert model.calls == 1
+
+    def test_text_response(self):
+        """Test that plain responses return the scripted text."""
+        assert FakeGenerativeModel().get_response([]).content == DEFAULT_FAKE_TEXT
+        model = FakeGenerativeModel(script={"text": "42"})
+        assert model.get_response([]).content == "42"
+        assert str(model) == "fake/fake"
+
+    def test_latency_is_simulated(self):
+        """Test that each call sleeps for a sampled latency."""
+        model = FakeGenerativeModel(latency=LatencyModel(mean=0.25))
+        with patch("app.fake_llm.time.sleep") as sleep:
+            model.get_response([])
+        sleep.assert_called_once_with(0.25)
+
+    def test_langchain_calls_tool_then_answers(self):
+        """Test that the LangChain model calls its bound tool before answering."""
+        model = FakeGenerativeModel(script={"text": "3", "tool_args": {"add": {"a": 1, "b": 2}}})
+        chat = model.to_langchain().bind_tools([add])
+
+        first = chat.invoke([HumanMessage(content="Add 1 and 2")])
+        assert first.tool_calls[0]["name"] == "add"
+        assert first.tool_calls[0]["args"] == {"a": 1, "b": 2}
+
+        result = ToolMessage(content="3", tool_call_id=first.tool_calls[0]["id"])
+        second = chat.invoke([HumanMessage(content="Add 1 and 2"), first, result])
+        assert second.content == "3"
+        assert not second.tool_calls
+
+    def test_langchain_placeholder_tool_args(self):
+        """Test that unscripted tool calls get placeholder arguments."""
+        chat = FakeGenerativeModel().to_langchain().bind_tools([add])
+        message = chat.invoke([HumanMessage(content="Add")])
+        assert message.tool_calls[0]["args"] == {"a": 0, "b": 0}
+
+    def test_build_from_settings(self, tmp_path):
+        """Test that the settings choose the latency and script."""
+        script = tmp_path / "script.json"
+        script.write_text('{"text": "scripted"}')
+        settings = Settings(
+            llm_mode="FAKE",
+            fake_llm_latency_distribution="NORMAL",
+            fake_llm_latency_mean=0.1,
+            fake_llm_latency_stddev=0.02,
+            fake_llm_script_path=str(script),
+        )
+
+        with patch("app.fake_llm.get_settings", return_value=settings):
+            model = build_fake_model()
+
+        assert model.latency == LatencyModel(LatencyDistribution.NORMAL, mean=0.1, stddev=0.02)
+        assert model.text == "scripted"
@@ -0,0 +1,133 @@
+"""Tests for the plan-run progress hooks."""
+
+import asyncio
+import threading
+from types import SimpleNamespace
+from unittest.mock import Mock
+
+import pytest
+from portia.execution_hooks import BeforeStepExecutionOutcome
+
+from app.executor import PlanRunExecutor
+from app.hooks import (
+    PlanRunCancelledError,
+    build_execution_hooks,
+    cancellation_scope,
+    observe_run,
+)
+
+
+def _plan_and_run():
+    steps = [
+        SimpleNamespace(task="Reverse the text", tool_id="reverse_text"),
+        SimpleNamespace(task="Summarise", tool_id=None),
+    ]
+    plan = SimpleNamespace(id="plan-1", steps=steps)
+    plan_run = SimpleNamespace(id="prun-1", current_step_index=0)
+    return plan, plan_run
+
+
+class TestExecutionHooks:
+    """Test the execution hooks installed on Portia."""
+
+    def test_events_reach_bound_listener(self):
+        """Test that hook callbacks become events for the bound listener."""
+        hooks = build_execution_hooks()
+        plan, plan_run = _plan_and_run()
+        output = Mock()
+        output.get_value.return_value = "olleh"
+        events = []
+
+        with observe_run(lambda event, data: events.append((event, data))):
+            hooks.before_plan_run(plan, plan_run)
+            outcome = hooks.before_step_execution(plan, plan_run, plan.steps[0])
+            hooks.after_step_execution(plan, plan_run, plan.steps[0], output)
+
+        assert outcome == BeforeStepExecutionOutcome.CONTINUE
+        assert [event for event, _ in events] == ["plan", "step_started", "step_completed"]
+        assert events[0][1]["steps"][0] == {
+            "index": 0,
+            "task": "Reverse the text",
+            "tool_id": "reverse_text",
+        }
+        assert events[1][1]["tool_id"] == "reverse_text"
+        assert events[2][1]["output"] == "olleh"
+
+    def test_no_listener_is_a_noop(self):
+        """Test that hooks do nothing outside observe_run."""
+        hooks = build_execution_hooks()
+        plan, plan_run = _plan_and_run()
+        hooks.before_plan_run(plan, plan_run)
+
+    def test_listener_errors_are_swallowed(self):
+        """Test that a failing listener does not break the plan run."""
+        hooks = build_execution_hooks()
+        plan, plan_run = _plan_and_run()
+
+        def broken(_event, _data):
+            raise RuntimeError("listener gone")
+
+        with observe_run(broken):
+            outcome = hooks.before_step_execution(plan, plan_run, plan.steps[0])
+
+        assert outcome == BeforeStepExecutionOutcome.CONTINUE
+
+    def test_listener_follows_executor_threads(self):
+        """Test that the executor propagates the bound listener to its workers."""
+        hooks = build_execution_hooks()
+        plan, plan_run = _plan_and_run()
+        executor = PlanRunExecutor(max_workers=1)
+        events = []
+
+        async def scenario():
+            with observe_run(lambda event, _data: events.append(event)):
+                await executor.run(hooks.before_plan_run, plan, plan_run)
+            await executor.run(hooks.before_plan_run, plan, plan_run)
+
+        try:
+            asyncio.run(scenario())
+        finally:
+            executor.shutdown()
+
+        assert events == ["plan"]
+
+
+class TestCancellation:
+    """Test cooperative cancellation through the hooks."""
+
+    def test_unset_event_lets_run_continue(self):
+        """Test that steps proceed while the cancel event is clear."""
+        hooks = build_execution_hooks()
+        plan, plan_run = _plan_and_run()
+
+        with cancellation_scope(threading.Event()):
+            outcome = hooks.before_step_execution(plan, plan_run, plan.steps[0])
+
+        assert outcome == BeforeStepExecutionOutcome.CONTINUE
+
+    def test_set_event_stops_next_step_and_tool_call(self):
+        """Test that a cancelled run raises at its next checkpoint."""
+        hooks = build_execution_hooks()
+        plan, plan_run = _plan_and_run()
+        cancel_event = threading.Event()
+        cancel_event.set()
+
+        with cancellation_scope(cancel_event):
+            with pytest.raises(PlanRunCancelledError):
+                hooks.before_plan_run(plan, plan_run)
+            with pytest.raises(PlanRunCancelledError):
+                hooks.before_step_execution(plan, plan_run, plan.steps[0])
+            with pytest.raises(PlanRunCancelledError):
+                hooks.before_tool_call(Mock(), {}, plan_run, plan.steps[0])
+
+    def test_cancellation_is_scoped_to_context(self):
+        """Test that other runs are unaffected by a cancelled scope."""
+        hooks = build_execution_hooks()
+        plan, plan_run = _plan_and_run()
+        cancel_event = threading.Event()
+        cancel_event.set()
+
+        with cancellation_scope(cancel_event):
+            pass
+
+        hooks.before_step_execution(plan, plan_run, plan.steps[0])
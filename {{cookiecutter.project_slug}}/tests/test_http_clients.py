@@ -0,0 +1,158 @@
+"""Tests for the shared LLM provider connection pools."""
+
+import asyncio
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from unittest.mock import Mock
+
+import pytest
+from portia import Config, LLMProvider
+from portia.model import GenerativeModel, MistralAIGenerativeModel, OpenAIGenerativeModel
+from pydantic import SecretStr
+
+from app.http_clients import (
+    ProviderPool,
+    close_http_pools,
+    get_http_pool,
+    get_http_pool_stats,
+    pooled_model,
+)
+from app.metrics import LLM_HTTP_CONNECTIONS, LLM_HTTP_REQUESTS
+
+
+class _Handler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+
+    def do_GET(self):
+        self.send_response(200)
+        self.send_header("Content-Length", "2")
+        self.end_headers()
+        self.wfile.write(b"ok")
+
+    def log_message(self, *_args):
+        pass
+
+
+@pytest.fixture
+def server_url():
+    """Serve keep-alive HTTP/1.1 responses on a local port."""
+    server = ThreadingHTTPServer(("127.0.0.1", 0), _Handler)
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    yield f"http://127.0.0.1:{server.server_port}/"
+    server.shutdown()
+    server.server_close()
+
+
+class TestProviderPool:
+    """Test connection reuse by the shared provider pools."""
+
+    def test_sync_requests_reuse_connection(self, server_url):
+        """Test that sequential requests share one kept-alive connection."""
+        pool = ProviderPool("test-sync")
+        requests_before = LLM_HTTP_REQUESTS.labels(provider="test-sync")._value.get()
+        try:
+            for _ in range(4):
+                assert pool.client.get(server_url).text == "ok"
+        finally:
+            pool.close()
+
+        assert pool.stats() == {
+            "requests": 4,
+            "connections": 1,
+            "tls_handshakes": 0,
+            "reuse_rate": 0.75,
+        }
+        assert LLM_HTTP_REQUESTS.labels(provider="test-sync")._value.get() == requests_before + 4
+        assert LLM_HTTP_CONNECTIONS.labels(provider="test-sync")._value.get() >= 1
+
+    def test_async_requests_reuse_connection(self, server_url):
+        """Test that the async client counts requests and connections too."""
+        pool = ProviderPool("test-async")
+
+        async def scenario():
+            try:
+                for _ in range(3):
+                    response = await pool.async_client.get(server_url)
+                    assert response.status_code == 200
+            finally:
+                await pool.aclose()
+
+        asyncio.run(scenario())
+        assert pool.requests == 3
+        assert pool.connections == 1
+
+    def test_idle_connections_expire(self, server_url):
+        """Test that no idle connections are kept when keep-alive is disabled."""
+        pool = ProviderPool("test-no-keepalive", max_keepalive_connections=0)
+        try:
+            for _ in range(3):
+                pool.client.get(server_url)
+        finally:
+            pool.close()
+
+        assert pool.connections == 3
+        assert pool.reuse_rate == 0.0
+
+    def test_global_pools(self):
+        """Test that each provider gets one pool until the pools are closed."""
+        pool = get_http_pool("openai")
+        assert get_http_pool("openai") is pool
+        assert get_http_pool("anthropic") is not pool
+        assert set(get_http_pool_stats()) >= {"openai", "anthropic"}
+
+        asyncio.run(close_http_pools())
+        assert pool.client.is_closed
+        assert pool.async_client.is_closed
+        assert get_http_pool_stats() == {}
+
+
+class TestPooledModel:
+    """Test moving provider models onto the shared pools."""
+
+    def test_openai_model_keeps_its_settings(self):
+        """Test that a rebuilt OpenAI model keeps its settings and uses the shared client."""
+        api_key = SecretStr("sk-test")
+        model = OpenAIGenerativeModel(
+            model_name="gpt-4.1",
+            api_key=api_key,
+            temperature=0.5,
+            base_url="https://llm.example.com/v1",
+        )
+        config = Config.from_default(llm_provider=LLMProvider.OPENAI, openai_api_key=api_key)
+
+        try:
+            chat = pooled_model(model, config).to_langchain()
+            assert chat.temperature == 0.5
+            assert chat.seed == model.to_langchain().seed
+            assert chat.openai_api_base == "https://llm.example.com/v1"
+            assert chat.http_client is get_http_pool("openai").client
+        finally:
+            asyncio.run(close_http_pools())
+
+    def test_mistral_model_sends_requests_through_pool(self, server_url):
+        """Test that a rebuilt Mistral model keeps its settings and sends relative requests."""
+        api_key = SecretStr("mistral-test")
+        model = MistralAIGenerativeModel(
+            model_name="mistral-large-latest", api_key=api_key, temperature=0.3, base_url=server_url
+        )
+        config = Config.from_default(llm_provider=LLMProvider.MISTRALAI, mistralai_api_key=api_key)
+
+        try:
+            chat = pooled_model(model, config).to_langchain()
+            pool = get_http_pool("mistralai")
+            assert chat.temperature == 0.3
+            assert chat.client is pool.client
+            assert chat.async_client is pool.async_client
+            assert chat.client.get("ping").text == "ok"
+            assert chat.client.headers["Authorization"] == "Bearer mistral-test"
+            assert pool.requests == 1
+        finally:
+            asyncio.run(close_http_pools())
+
+    def test_other_providers_are_unchanged(self):
+        """Test that models whose integration takes no HTTP client are returned as they are."""
+        model = Mock(spec=GenerativeModel)
+        config = Config.from_default(llm_provider=LLMProvider.ANTHROPIC)
+
+        assert pooled_model(model, config) is model
@@ -0,0 +1,152 @@
+"""Tests for idempotency keys."""
+
+import asyncio
+
+import pytest
+
+from app.idempotency import IdempotencyKeyReusedError, IdempotencyStore
+
+
+class TestIdempotencyStore:
+    """Test the IdempotencyStore class."""
+
+    def test_repeats_attach_to_running_execution(self):
+        """Test that repeats of a key in flight wait for the first execution."""
+        store: IdempotencyStore[str] = IdempotencyStore(ttl=60, max_entries=10)
+        calls = []
+
+        async def work():
+            calls.append(1)
+            await asyncio.sleep(0.05)
+            return "result"
+
+        async def scenario():
+            return await asyncio.gather(*(store.run("key", "fp", work) for _ in range(3)))
+
+        results = asyncio.run(scenario())
+        assert len(calls) == 1
+        assert [result for result, _ in results] == ["result"] * 3
+        assert sorted(replayed for _, replayed in results) == [False, True, True]
+        assert store.stats() == {"entries": 1, "executions": 1, "replays": 2}
+
+    def test_finished_results_are_replayed(self):
+        """Test that a repeat after the execution finished returns the stored result."""
+        store: IdempotencyStore[int] = IdempotencyStore(ttl=60, max_entries=10)
+        calls = []
+
+        async def work():
+            calls.append(1)
+            return len(calls)
+
+        async def scenario():
+            first = await store.run("key", "fp", work)
+            second = await store.run("key", "fp", work)
+            other = await store.run("other", "fp", work)
+            return first, second, other
+
+        assert asyncio.run(scenario()) == ((1, False), (1, True), (2, False))
+
+    def test_results_not_kept_run_again(self):
+        """Test that results rejected by ``keep`` are forgotten, so a retry executes again."""
+        store: IdempotencyStore[str] = IdempotencyStore(ttl=60, max_entries=10)
+        calls = []
+
+        async def work():
+            calls.append(1)
+            return "failed" if len(calls) == 1 else "done"
+
+        def keep(result):
+            return result != "failed"
+
+        async def scenario():
+            first = await store.run("key", "fp", work, keep=keep)
+            second = await store.run("key", "fp", work, keep=keep)
+            third = await store.run("key", "fp", work, keep=keep)
+            return first, second, third
+
+        assert asyncio.run(scenario()) == (("failed", False), ("done", False), ("done", True))
+
+    def test_results_expire(self):
+        """Test that a key executes again once its result is older than the TTL."""
+        store: IdempotencyStore[int] = IdempotencyStore(ttl=0.01, max_entries=10)
+        calls = []
+
+        async def work():
+            calls.append(1)
+            return len(calls)
+
+        async def scenario():
+            first = await store.run("key", "fp", work)
+            await asyncio.sleep(0.02)
+            second = await store.run("key", "fp", work)
+            return first, second
+
+        assert asyncio.run(scenario()) == ((1, False), (2, False))
+
+    def test_oldest_finished_results_are_evicted(self):
+        """Test that the store stays within max_entries."""
+        store: IdempotencyStore[str] = IdempotencyStore(ttl=60, max_entries=2)
+
+        async def work():
+            return "result"
+
+        async def scenario():
+            for key in ("a", "b", "c"):
+                await store.run(key, "fp", work)
+            return await store.run("a", "fp", work)
+
+        assert asyncio.run(scenario()) == ("result", False)
+        assert len(store) == 2
+
+    def test_key_reused_for_different_request(self):
+        """Test that a key cannot be replayed for a different request."""
+        store: IdempotencyStore[str] = IdempotencyStore(ttl=60, max_entries=10)
+
+        async def work():
+            return "result"
+
+        async def scenario():
+            await store.run("key", "fp", work)
+            await store.run("key", "other-fp", work)
+
+        with pytest.raises(IdempotencyKeyReusedError, match="'key'"):
+            asyncio.run(scenario())
+
+    def test_failures_are_not_stored(self):
+        """Test that a failed execution can be retried with the same key."""
+        store: IdempotencyStore[str] = IdempotencyStore(ttl=60, max_entries=10)
+        calls = []
+
+        async def work():
+            calls.append(1)
+            if len(calls) == 1:
+                raise RuntimeError("boom")
+            return "result"
+
+        async def scenario():
+            with pytest.raises(RuntimeError):
+                await store.run("key", "fp", work)
+            return await store.run("key", "fp", work)
+
+        assert asyncio.run(scenario()) == ("result", False)
+
+    def test_cancelled_caller_does_not_cancel_execution(self):
+        """Test that a client going away leaves the execution running for its retry."""
+        store: IdempotencyStore[str] = IdempotencyStore(ttl=60, max_entries=10)
+        calls = []
+
+        async def work():
+            calls.append(1)
+            await asyncio.sleep(0.05)
+            return "result"
+
+        async def scenario():
+            first = asyncio.create_task(store.run("key", "fp", work))
+            await asyncio.sleep(0.01)
+            first.cancel()
+            with pytest.raises(asyncio.CancelledError):
+                await first
+            return await store.run("key", "fp", work)
+
+        assert asyncio.run(scenario()) == ("result", True)
+        assert len(calls) == 1
@@ -0,0 +1,118 @@
+"""Tests for the background job store."""
+
+import asyncio
+
+from fastapi import HTTPException
+
+from app.jobs import RunJobStore
+from app.schemas import PortiaRunRequest, PortiaRunResponse
+from app.schemas.response import PlanRunState
+
+
+async def _complete(request: PortiaRunRequest) -> PortiaRunResponse:
+    return PortiaRunResponse(
+        status=PlanRunState.COMPLETE, result=request.query, plan_run_id="prun-1"
+    )
+
+
+async def _reject(_request: PortiaRunRequest) -> PortiaRunResponse:
+    raise HTTPException(status_code=400, detail="Bad tools")
+
+
+class TestRunJobStore:
+    """Test the RunJobStore class."""
+
+    def test_submit_returns_pending_job(self):
+        """Test that a submitted job starts out NOT_STARTED with its own ID."""
+
+        async def scenario():
+            store = RunJobStore(result_ttl=60, max_jobs=10)
+            job = store.submit(PortiaRunRequest(query="hello"), _complete)
+            pending = job.response
+            await job.task
+            return job, pending
+
+        job, pending = asyncio.run(scenario())
+        assert pending.status == PlanRunState.NOT_STARTED
+        assert pending.plan_run_id == job.id
+        assert job.id.startswith("job-")
+
+    def test_finished_job_resolves_by_both_ids(self):
+        """Test lookup by the job ID and by the Portia plan run ID."""
+
+        async def scenario():
+            store = RunJobStore(result_ttl=60, max_jobs=10)
+            job = store.submit(PortiaRunRequest(query="hello"), _complete)
+            await job.task
+            return store, job
+
+        store, job = asyncio.run(scenario())
+        assert job.done
+        assert job.response.status == PlanRunState.COMPLETE
+        assert job.response.result == "hello"
+        assert job.response.metadata["job_id"] == job.id
+        assert store.get(job.id) is job
+        assert store.get("prun-1") is job
+        assert store.get("prun-unknown") is None
+
+    def test_handler_response_is_not_modified(self):
+        """Test that the job ID is added to a copy of the handler's response."""
+        shared = PortiaRunResponse(status=PlanRunState.COMPLETE, plan_run_id="prun-1")
+
+        async def _shared(_request: PortiaRunRequest) -> PortiaRunResponse:
+            return shared
+
+        async def scenario():
+            store = RunJobStore(result_ttl=60, max_jobs=10)
+            job = store.submit(PortiaRunRequest(query="hello"), _shared)
+            await job.task
+            return job
+
+        job = asyncio.run(scenario())
+        assert job.response.metadata["job_id"] == job.id
+        assert "job_id" not in shared.metadata
+
+    def test_handler_errors_become_failed_responses(self):
+        """Test that handler exceptions are reported as FAILED runs."""
+
+        async def scenario():
+            store = RunJobStore(result_ttl=60, max_jobs=10)
+            job = store.submit(PortiaRunRequest(query="hello"), _reject)
+            await job.task
+            return job
+
+        job = asyncio.run(scenario())
+        assert job.response.status == PlanRunState.FAILED
+        assert job.response.error == "Bad tools"
+
+    def test_expired_results_are_evicted(self):
+        """Test that finished jobs are dropped after their TTL."""
+
+        async def scenario():
+            store = RunJobStore(result_ttl=0, max_jobs=10)
+            job = store.submit(PortiaRunRequest(query="hello"), _complete)
+            await job.task
+            await asyncio.sleep(0.01)
+            return store, job
+
+        store, job = asyncio.run(scenario())
+        assert store.get(job.id) is None
+        assert store.get("prun-1") is None
+
+    def test_capacity_evicts_oldest_finished_job(self):
+        """Test that the oldest finished job makes room for new ones."""
+
+        async def scenario():
+            store = RunJobStore(result_ttl=60, max_jobs=2)
+            first = store.submit(PortiaRunRequest(query="first"), _complete)
+            await first.task
+            second = store.submit(PortiaRunRequest(query="second"), _complete)
+            await second.task
+            third = store.submit(PortiaRunRequest(query="third"), _complete)
+            await third.task
+            return store, first, third
+
+        store, first, third = asyncio.run(scenario())
+        assert len(store) == 2
+        assert store.get(first.id) is None
+        assert store.get(third.id) is third
@@ -0,0 +1,113 @@
+"""Tests for the Prometheus metrics."""
+
+import pytest
+
+from app import metrics
+
+
+def _sample(name, labels=None):
+    return metrics.REGISTRY.get_sample_value(name, labels or {}) or 0.0
+
+
+@pytest.fixture(autouse=True)
+def registered_tools():
+    """Register the tools used as labels in these tests."""
+    metrics.set_labelled_tool_ids(["reverse_text", "add_numbers"])
+    yield
+    metrics.set_labelled_tool_ids([])
+
+
+class TestStageTimings:
+    """Test the stage timings recorded from the execution hooks."""
+
+    def test_stages_recorded_inside_timed_run(self):
+        """Test that planning, step and tool timings are observed for a timed run."""
+        planning_before = _sample("portia_planning_duration_seconds_count")
+        step_before = _sample("portia_step_duration_seconds_count", {"tool_id": "reverse_text"})
+        tool_before = _sample(
+            "portia_tool_call_duration_seconds_count", {"tool_id": "reverse_text"}
+        )
+
+        with metrics.time_plan_run():
+            metrics.observe_planning_finished()
+            metrics.mark_step_started()
+            metrics.mark_tool_call_started()
+            metrics.observe_tool_call_finished("reverse_text")
+            metrics.observe_step_finished("reverse_text")
+
+        assert _sample("portia_planning_duration_seconds_count") == planning_before + 1
+        assert (
+            _sample("portia_step_duration_seconds_count", {"tool_id": "reverse_text"})
+            == step_before + 1
+        )
+        assert (
+            _sample("portia_tool_call_duration_seconds_count", {"tool_id": "reverse_text"})
+            == tool_before + 1
+        )
+
+    def test_steps_without_tools_use_placeholder_label(self):
+        """Test that LLM-only steps are labelled as having no tool."""
+        before = _sample("portia_step_duration_seconds_count", {"tool_id": "none"})
+
+        with metrics.time_plan_run():
+            metrics.mark_step_started()
+            metrics.observe_step_finished(None)
+
+        assert _sample("portia_step_duration_seconds_count", {"tool_id": "none"}) == before + 1
+
+    def test_unregistered_tools_share_a_label(self):
+        """Test that tool IDs named by a plan but not registered are labelled "other"."""
+        before = _sample("portia_step_duration_seconds_count", {"tool_id": "other"})
+
+        with metrics.time_plan_run():
+            metrics.mark_step_started()
+            metrics.observe_step_finished("made_up_tool")
+
+        assert _sample("portia_step_duration_seconds_count", {"tool_id": "other"}) == before + 1
+        assert _sample("portia_step_duration_seconds_count", {"tool_id": "made_up_tool"}) == 0
+
+    def test_cached_plan_records_no_planning_time(self):
+        """Test that a plan run reusing a cached plan does not observe planning time."""
+        before = _sample("portia_planning_duration_seconds_count")
+
+        with metrics.time_plan_run():
+            metrics.skip_planning()
+            metrics.observe_planning_finished()
+
+        assert _sample("portia_planning_duration_seconds_count") == before
+
+    def test_nothing_recorded_outside_timed_run(self):
+        """Test that hooks firing without a timed run record nothing."""
+        before = _sample("portia_planning_duration_seconds_count")
+        metrics.observe_planning_finished()
+        metrics.mark_step_started()
+        metrics.observe_step_finished("reverse_text")
+        assert _sample("portia_planning_duration_seconds_count") == before
+
+
+class TestRecordPlanRun:
+    """Test run-level metrics."""
+
+    def test_record_plan_run(self):
+        """Test that runs are counted by state and tool."""
+        complete_before = _sample("portia_plan_runs_total", {"state": "COMPLETE"})
+        tool_before = _sample("portia_plan_run_tool_uses_total", {"tool_id": "add_numbers"})
+        timeouts_before = _sample("portia_plan_run_timeouts_total")
+
+        metrics.record_plan_run("COMPLETE", 1.5, ["add_numbers", "add_numbers", "made_up_tool"])
+        metrics.record_plan_run("FAILED", 30.0, timed_out=True)
+
+        assert _sample("portia_plan_runs_total", {"state": "COMPLETE"}) == complete_before + 1
+        assert (
+            _sample("portia_plan_run_tool_uses_total", {"tool_id": "add_numbers"})
+            == tool_before + 1
+        )
+        assert _sample("portia_plan_run_tool_uses_total", {"tool_id": "other"}) >= 1
+        assert _sample("portia_plan_run_timeouts_total") == timeouts_before + 1
+
+    def test_render_metrics(self):
+        """Test that metrics render in the Prometheus text format."""
+        content, media_type = metrics.render_metrics()
+        assert media_type.startswith("text/plain")
+        assert b"portia_plan_runs_in_flight" in content
+        assert b"portia_plan_runs_queued" in content
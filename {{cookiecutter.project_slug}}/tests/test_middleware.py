@@ -0,0 +1,84 @@
+"""Tests for the ASGI middleware."""
+
+import asyncio
+
+import pytest
+from fastapi import FastAPI, Request
+from fastapi.testclient import TestClient
+
+from app.middleware import RequestBodyLimitMiddleware
+
+
+@pytest.fixture
+def limited_client():
+    """Client for a small app that echoes the size of the body it received."""
+    app = FastAPI()
+    app.add_middleware(RequestBodyLimitMiddleware, max_body_size=100)
+
+    @app.post("/echo")
+    async def echo(request: Request) -> dict[str, int]:
+        return {"size": len(await request.body())}
+
+    return TestClient(app)
+
+
+class TestRequestBodyLimitMiddleware:
+    """Test the RequestBodyLimitMiddleware class."""
+
+    def test_body_within_limit(self, limited_client):
+        """Test that bodies up to the limit reach the route."""
+        response = limited_client.post("/echo", content=b"x" * 100)
+        assert response.status_code == 200
+        assert response.json() == {"size": 100}
+
+    def test_declared_length_over_limit(self, limited_client):
+        """Test that an oversized Content-Length is rejected up front."""
+        response = limited_client.post("/echo", content=b"x" * 101)
+        assert response.status_code == 413
+        assert "maximum size of 100 bytes" in response.json()["detail"]
+
+    def test_streamed_body_over_limit(self, limited_client):
+        """Test that a chunked body without Content-Length is rejected."""
+
+        def chunks():
+            for _ in range(10):
+                yield b"x" * 40
+
+        response = limited_client.post("/echo", content=chunks())
+        assert response.status_code == 413
+
+    def test_streamed_body_stops_reading_early(self, limited_client):
+        """Test that no more chunks are read once the limit is crossed."""
+        chunks_read = 0
+        sent = []
+
+        async def receive():
+            nonlocal chunks_read
+            chunks_read += 1
+            return {"type": "http.request", "body": b"x" * 40, "more_body": True}
+
+        async def send(message):
+            sent.append(message)
+
+        scope = {
+            "type": "http",
+            "method": "POST",
+            "path": "/echo",
+            "raw_path": b"/echo",
+            "root_path": "",
+            "scheme": "http",
+            "query_string": b"",
+            "headers": [(b"transfer-encoding", b"chunked")],
+            "server": ("testserver", 80),
+            "client": ("testclient", 50000),
+            "http_version": "1.1",
+        }
+        asyncio.run(limited_client.app(scope, receive, send))
+
+        assert chunks_read == 3
+        assert sent[0]["status"] == 413
+
+    def test_invalid_limit(self):
+        """Test that the limit must be positive."""
+        with pytest.raises(ValueError):
+            RequestBodyLimitMiddleware(FastAPI(), max_body_size=0)
@@ -0,0 +1,169 @@
+"""Tests for latency-aware routing of LLM calls across providers."""
+
+import threading
+import time
+from unittest.mock import Mock
+
+import pytest
+from langchain_core.messages import HumanMessage
+from langchain_core.tools import tool
+
+from app.fake_llm import FakeGenerativeModel
+from app.model_router import (
+    AllProvidersFailedError,
+    ProviderRouter,
+    RouterSaturatedError,
+    RoutingGenerativeModel,
+)
+
+
+@tool
+def add(a: int, b: int) -> int:
+    """Add two numbers."""
+    return a + b
+
+
+def _failing(error=None):
+    return Mock(side_effect=error or ConnectionError("provider down"))
+
+
+class TestProviderRouter:
+    """Test provider ordering, failover and cooldown."""
+
+    def test_untried_providers_in_configured_order(self):
+        """Test that providers without a latency are tried first, in order."""
+        router = ProviderRouter(["openai", "anthropic", "google"])
+        assert router.order() == ["openai", "anthropic", "google"]
+
+        router.record("openai", 1.0, ok=True)
+        assert router.order() == ["anthropic", "google", "openai"]
+
+    def test_fastest_provider_first(self):
+        """Test that the provider with the lowest moving-average latency goes first."""
+        router = ProviderRouter(["openai", "anthropic"], alpha=0.5)
+        router.record("openai", 2.0, ok=True)
+        router.record("anthropic", 1.0, ok=True)
+        assert router.order() == ["anthropic", "openai"]
+
+        # One slow call moves anthropic's average to 3.0, behind openai
+        router.record("anthropic", 5.0, ok=True)
+        assert router.order() == ["openai", "anthropic"]
+        assert router.stats()["anthropic"]["latency"] == 3.0
+
+    def test_fails_over_on_error(self):
+        """Test that a failed call is retried on the next provider."""
+        router = ProviderRouter(["openai", "anthropic"])
+        down = _failing()
+
+        assert router.call({"openai": down, "anthropic": lambda: "answer"}) == "answer"
+        down.assert_called_once()
+        stats = router.stats()
+        assert stats["openai"]["failures"] == 1
+        assert stats["anthropic"]["calls"] == 1
+
+    def test_fails_over_on_timeout(self):
+        """Test that a call over the timeout is abandoned for the next provider."""
+        router = ProviderRouter(["openai", "anthropic"], timeout=0.05)
+
+        def slow():
+            time.sleep(0.5)
+            return "late"
+
+        started_at = time.monotonic()
+        assert router.call({"openai": slow, "anthropic": lambda: "fast"}) == "fast"
+        assert time.monotonic() - started_at < 0.5
+        assert router.stats()["openai"]["latency"] == 0.05
+
+    def test_rejects_calls_when_threads_are_busy(self):
+        """Test that timed-out calls hold their thread and new calls are rejected while they do."""
+        router = ProviderRouter(["openai", "anthropic"], timeout=0.05, max_pending_calls=1)
+        finish = threading.Event()
+
+        def hung():
+            finish.wait(5)
+            return "late"
+
+        with pytest.raises(AllProvidersFailedError):
+            router.call({"openai": hung})
+        try:
+            with pytest.raises(RouterSaturatedError):
+                router.call({"anthropic": lambda: "fast"})
+            # Rejections are not the provider's fault
+            assert router.stats()["anthropic"]["calls"] == 0
+        finally:
+            finish.set()
+
+        deadline = time.monotonic() + 1
+        while time.monotonic() < deadline:
+            try:
+                assert router.call({"anthropic": lambda: "fast"}) == "fast"
+                break
+            except RouterSaturatedError:
+                time.sleep(0.01)
+        else:
+            pytest.fail("The call thread was not freed")
+
+    def test_all_providers_failed(self):
+        """Test that the errors of every provider are reported together."""
+        router = ProviderRouter(["openai", "anthropic"])
+        with pytest.raises(AllProvidersFailedError, match=r"openai.*anthropic"):
+            router.call({"openai": _failing(), "anthropic": _failing(ValueError("bad"))})
+
+    def test_unhealthy_provider_cools_down(self):
+        """Test that a provider over the error rate goes last until its cooldown ends."""
+        router = ProviderRouter(["openai", "anthropic"], alpha=0.5, cooldown=0.1)
+        router.record("openai", 0.5, ok=True)
+        router.record("anthropic", 1.0, ok=True)
+
+        router.record("openai", None, ok=False)
+        assert router.stats()["openai"]["available"] is True
+        router.record("openai", None, ok=False)
+        assert router.stats()["openai"]["available"] is False
+        assert router.order() == ["anthropic", "openai"]
+
+        time.sleep(0.15)
+        assert router.order() == ["openai", "anthropic"]
+
+    def test_failing_provider_without_latency_goes_last(self):
+        """Test that a provider that has only failed is not ranked as the fastest."""
+        router = ProviderRouter(["openai", "anthropic"], max_error_rate=0.9)
+        router.record("anthropic", 2.0, ok=True)
+
+        router.record("openai", None, ok=False)
+        router.record("openai", None, ok=False)
+        assert router.stats()["openai"]["available"] is True
+        assert router.order() == ["anthropic", "openai"]
+
+    def test_needs_a_provider(self):
+        """Test that a router without providers is rejected."""
+        with pytest.raises(ValueError):
+            ProviderRouter([])
+
+
+class TestRoutingGenerativeModel:
+    """Test routing model calls between providers."""
+
+    def test_fails_over_to_next_model(self):
+        """Test that model calls fail over to the next provider's model."""
+        down = Mock()
+        down.get_response.side_effect = ConnectionError("provider down")
+        up = FakeGenerativeModel(script={"text": "42"})
+        model = RoutingGenerativeModel(
+            {"openai": down, "anthropic": up}, ProviderRouter(["openai", "anthropic"])
+        )
+
+        assert model.get_response([]).content == "42"
+        assert up.calls == 1
+
+    def test_langchain_routes_with_bound_tools(self):
+        """Test that the LangChain model binds tools on every provider."""
+        fast = FakeGenerativeModel(script={"tool_args": {"add": {"a": 1, "b": 2}}})
+        router = ProviderRouter(["openai", "anthropic"])
+        router.record("openai", 5.0, ok=True)
+        model = RoutingGenerativeModel({"openai": FakeGenerativeModel(), "anthropic": fast}, router)
+
+        chat = model.to_langchain().bind_tools([add])
+        message = chat.invoke([HumanMessage(content="Add 1 and 2")])
+
+        assert message.tool_calls[0]["args"] == {"a": 1, "b": 2}
+        assert fast.calls == 1
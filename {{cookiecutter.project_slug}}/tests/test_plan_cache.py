@@ -0,0 +1,81 @@
+"""Tests for the plan cache."""
+
+import time
+
+from app.plan_cache import PlanCache, make_plan_cache_key, normalize_query
+
+
+class TestPlanCacheKey:
+    """Test plan cache key construction."""
+
+    def test_normalize_query(self):
+        """Test that whitespace is normalized."""
+        assert normalize_query("  Reverse   the TEXT\n") == "Reverse the TEXT"
+
+    def test_key_depends_on_case(self):
+        """Test that queries differing only in case do not share a plan."""
+        assert make_plan_cache_key("Reverse 'Hello'", [], [], "m") != make_plan_cache_key(
+            "reverse 'hello'", [], [], "m"
+        )
+
+    def test_key_ignores_tool_and_input_order(self):
+        """Test that tool and input ordering does not change the key."""
+        first = make_plan_cache_key("Add $a and $b", ["b_tool", "a_tool"], ["$b", "$a"], "m")
+        second = make_plan_cache_key("Add  $a and $b", ["a_tool", "b_tool"], ["$a", "$b"], "m")
+        assert first == second
+
+    def test_key_depends_on_model(self):
+        """Test that plans are not shared across planning models."""
+        assert make_plan_cache_key("q", [], [], "openai/gpt-4.1") != make_plan_cache_key(
+            "q", [], [], "anthropic/claude-sonnet-4"
+        )
+
+
+class TestPlanCache:
+    """Test the PlanCache class."""
+
+    def test_hit_and_miss_counters(self):
+        """Test that lookups are counted."""
+        cache = PlanCache(max_size=10, ttl=60)
+        key = make_plan_cache_key("q", [], [], "m")
+
+        assert cache.get(key) is None
+        cache.put(key, "plan")
+        assert cache.get(key) == "plan"
+
+        stats = cache.stats()
+        assert stats["hits"] == 1
+        assert stats["misses"] == 1
+        assert stats["size"] == 1
+
+    def test_lru_eviction(self):
+        """Test that the least recently used plan is evicted first."""
+        cache = PlanCache(max_size=2, ttl=60)
+        first, second, third = (make_plan_cache_key(q, [], [], "m") for q in "abc")
+
+        cache.put(first, "plan-a")
+        cache.put(second, "plan-b")
+        cache.get(first)
+        cache.put(third, "plan-c")
+
+        assert cache.get(second) is None
+        assert cache.get(first) == "plan-a"
+        assert cache.get(third) == "plan-c"
+        assert cache.stats()["evictions"] == 1
+
+    def test_ttl_expiry(self):
+        """Test that expired plans are treated as misses."""
+        cache = PlanCache(max_size=10, ttl=0.01)
+        key = make_plan_cache_key("q", [], [], "m")
+        cache.put(key, "plan")
+        time.sleep(0.02)
+
+        assert cache.get(key) is None
+        assert len(cache) == 0
+
+    def test_clear(self):
+        """Test that clear drops every entry."""
+        cache = PlanCache(max_size=10, ttl=60)
+        cache.put(make_plan_cache_key("q", [], [], "m"), "plan")
+        cache.clear()
+        assert len(cache) == 0
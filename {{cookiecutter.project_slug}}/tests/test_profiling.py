@@ -0,0 +1,87 @@
+"""Tests for the plan-run profiler."""
+
+import sys
+import time
+
+import pytest
+
+from app.profiling import (
+    ProfileSampler,
+    ProfileStore,
+    RunProfile,
+    collapse_stack,
+    profile_run,
+    sample_current_thread,
+)
+
+
+def _busy(seconds):
+    deadline = time.perf_counter() + seconds
+    while time.perf_counter() < deadline:
+        pass
+
+
+class TestSampling:
+    """Test stack sampling of the current thread."""
+
+    def test_collapse_stack(self):
+        """Test that stacks are rendered outermost frame first."""
+        stack = collapse_stack(sys._getframe())
+        assert stack.endswith("TestSampling.test_collapse_stack")
+        assert ";" in stack
+
+    def test_bound_profile_collects_samples(self):
+        """Test that a bound profile samples the thread it runs on."""
+        profile = RunProfile(interval=0.001)
+
+        with profile_run(profile), sample_current_thread():
+            _busy(0.05)
+
+        assert profile.sample_count > 0
+        assert profile.duration >= 0.05
+        lines = profile.to_collapsed().splitlines()
+        assert any("_busy" in line for line in lines)
+        assert all(line.rsplit(" ", 1)[1].isdigit() for line in lines)
+
+    def test_unbound_context_is_not_sampled(self):
+        """Test that sampling is a no-op without a bound profile."""
+        profile = RunProfile(interval=0.001)
+
+        with sample_current_thread():
+            _busy(0.01)
+
+        assert profile.sample_count == 0
+
+
+class TestProfileSampler:
+    """Test the ProfileSampler class."""
+
+    def test_sample_rate_zero_never_profiles(self):
+        """Test that a zero sample rate turns profiling off."""
+        sampler = ProfileSampler(sample_rate=0, max_per_minute=10)
+        assert not any(sampler.should_profile() for _ in range(20))
+
+    def test_per_minute_limit(self):
+        """Test that no more than max_per_minute requests are profiled."""
+        sampler = ProfileSampler(sample_rate=1, max_per_minute=2)
+        assert [sampler.should_profile() for _ in range(4)] == [True, True, False, False]
+
+    def test_invalid_sample_rate(self):
+        """Test that the sample rate must be a fraction."""
+        with pytest.raises(ValueError):
+            ProfileSampler(sample_rate=1.5, max_per_minute=10)
+
+
+class TestProfileStore:
+    """Test the ProfileStore class."""
+
+    def test_oldest_profile_is_dropped(self):
+        """Test that the store keeps only the most recent profiles."""
+        store = ProfileStore(max_entries=2)
+        profiles = [RunProfile(interval=0.01) for _ in range(3)]
+        for profile in profiles:
+            store.add(profile)
+
+        assert len(store) == 2
+        assert store.get(profiles[0].id) is None
+        assert store.get(profiles[2].id) is profiles[2]
@@ -0,0 +1,172 @@
+"""Tests for per-user rate limits and concurrency quotas."""
+
+import asyncio
+import threading
+
+import pytest
+
+from app.rate_limit import (
+    InMemoryQuotaBackend,
+    QuotaExceededError,
+    QuotaPolicy,
+    SQLiteQuotaBackend,
+    UserRateLimiter,
+)
+
+POLICY = QuotaPolicy(rate=1.0, burst=2, max_concurrent=2, lease_ttl=30)
+
+
+@pytest.fixture(params=["memory", "sqlite"])
+def backend(request, tmp_path):
+    """Each quota backend, empty."""
+    if request.param == "memory":
+        return InMemoryQuotaBackend()
+    return SQLiteQuotaBackend(tmp_path / "quotas.sqlite3")
+
+
+class TestQuotaBackends:
+    """Test the behaviour shared by every quota backend."""
+
+    def test_token_bucket(self, backend):
+        """Test that the burst is spent and then refills at the configured rate."""
+        first = backend.acquire("alice", "a", 100.0, POLICY)
+        backend.release("alice", "a")
+        second = backend.acquire("alice", "b", 100.0, POLICY)
+        backend.release("alice", "b")
+        third = backend.acquire("alice", "c", 100.0, POLICY)
+
+        assert (first.allowed, first.remaining) == (True, 1)
+        assert (second.allowed, second.remaining) == (True, 0)
+        assert not third.allowed
+        assert third.reason == "rate"
+        assert third.retry_after == pytest.approx(1.0)
+
+        assert backend.acquire("alice", "d", 101.0, POLICY).allowed
+        # Other users have their own bucket
+        assert backend.acquire("bob", "e", 100.0, POLICY).allowed
+
+    def test_concurrency_quota(self, backend):
+        """Test that runs in progress are capped until one is released."""
+        policy = QuotaPolicy(rate=1.0, burst=10, max_concurrent=1, lease_ttl=30)
+        assert backend.acquire("alice", "a", 100.0, policy).allowed
+
+        rejected = backend.acquire("alice", "b", 100.0, policy)
+        assert not rejected.allowed
+        assert rejected.reason == "concurrency"
+        assert rejected.running == 1
+        # Rejections do not spend tokens
+        assert rejected.remaining == 9
+
+        backend.release("alice", "a")
+        assert backend.acquire("alice", "c", 100.0, policy).allowed
+
+    def test_leases_expire(self, backend):
+        """Test that leases never released free their slot after the lease TTL."""
+        policy = QuotaPolicy(rate=1.0, burst=10, max_concurrent=1, lease_ttl=30)
+        assert backend.acquire("alice", "a", 100.0, policy).allowed
+        assert not backend.acquire("alice", "b", 129.0, policy).allowed
+        assert backend.acquire("alice", "c", 130.0, policy).allowed
+
+
+class TestInMemoryQuotaBackend:
+    """Test the InMemoryQuotaBackend class."""
+
+    def test_idle_users_are_pruned(self):
+        """Test that users with full buckets and nothing running are dropped."""
+        backend = InMemoryQuotaBackend(max_keys=2)
+        for user in ("alice", "bob"):
+            backend.acquire(user, user, 100.0, POLICY)
+            backend.release(user, user)
+        backend.acquire("carol", "carol", 200.0, POLICY)
+
+        assert len(backend) == 1
+
+
+class TestSQLiteQuotaBackend:
+    """Test the SQLiteQuotaBackend class."""
+
+    def test_state_is_shared_between_instances(self, tmp_path):
+        """Test that two processes opening the same file share one budget."""
+        path = tmp_path / "quotas.sqlite3"
+        first = SQLiteQuotaBackend(path)
+        second = SQLiteQuotaBackend(path)
+
+        assert first.acquire("alice", "a", 100.0, POLICY).allowed
+        assert second.acquire("alice", "b", 100.0, POLICY).allowed
+        rejected = first.acquire("alice", "c", 100.0, POLICY)
+        assert not rejected.allowed
+        assert rejected.running == 2
+
+
+class TestUserRateLimiter:
+    """Test the UserRateLimiter class."""
+
+    def test_lease_releases_once(self):
+        """Test that leases free their slot on exit and ignore repeat releases."""
+        limiter = UserRateLimiter(InMemoryQuotaBackend(), POLICY)
+        with limiter.acquire("alice")[0] as lease:
+            _, decision = limiter.acquire("alice")
+            assert decision.running == 2
+        lease.release()
+
+        with pytest.raises(QuotaExceededError) as excinfo:
+            limiter.acquire("alice")
+        # The second lease is still held, so this is a rate rejection with one run in progress
+        assert excinfo.value.decision.reason == "rate"
+        assert excinfo.value.decision.running == 1
+
+    def test_async_calls_run_off_the_event_loop(self, backend):
+        """Test that async acquire and release call the backend from a worker thread."""
+        limiter = UserRateLimiter(backend, POLICY)
+        threads = []
+        acquire, release = backend.acquire, backend.release
+
+        def record(method):
+            def wrapper(*args):
+                threads.append(threading.current_thread())
+                return method(*args)
+
+            return wrapper
+
+        backend.acquire, backend.release = record(acquire), record(release)
+
+        async def scenario():
+            lease, decision = await limiter.aacquire("alice")
+            assert decision.running == 1
+            await lease.arelease()
+            await lease.arelease()
+
+        asyncio.run(scenario())
+        assert len(threads) == 2
+        assert threading.main_thread() not in threads
+
+    def test_cancelled_acquire_releases_its_lease(self):
+        """Test that a lease granted after its caller was cancelled is given back."""
+        backend = InMemoryQuotaBackend()
+        limiter = UserRateLimiter(backend, POLICY)
+        deciding, decide, released = threading.Event(), threading.Event(), threading.Event()
+        acquire, release = backend.acquire, backend.release
+
+        def slow_acquire(*args):
+            deciding.set()
+            decide.wait(5)
+            return acquire(*args)
+
+        def record_release(*args):
+            release(*args)
+            released.set()
+
+        backend.acquire, backend.release = slow_acquire, record_release
+
+        async def scenario():
+            task = asyncio.create_task(limiter.aacquire("alice"))
+            await asyncio.to_thread(deciding.wait, 5)
+            task.cancel()
+            with pytest.raises(asyncio.CancelledError):
+                await task
+            decide.set()
+            return await asyncio.to_thread(released.wait, 5)
+
+        assert asyncio.run(scenario())
+        _, decision = limiter.acquire("alice")
+        assert decision.running == 1
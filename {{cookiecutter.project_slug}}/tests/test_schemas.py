@@ -3,7 +3,14 @@
 import pytest
 from pydantic import ValidationError
 
-from app.schemas.request import PortiaRunRequest
+from app.schemas.request import (
+    MAX_PLAN_RUN_INPUTS_SIZE,
+    MAX_QUERY_LENGTH,
+    PortiaBatchRunRequest,
+    PortiaClarificationRequest,
+    PortiaRunRequest,
+    RunPriority,
+)
 from app.schemas.response import (
     ClarificationResponse,
     PortiaRunResponse,
@@ -23,6 +30,8 @@ class TestPortiaRunRequest:
         assert request.user_id is None
         assert request.plan_run_inputs is None
         assert request.structured_output_schema is None
+        assert request.use_plan_cache is True
+        assert request.priority == RunPriority.DEFAULT
 
     def test_valid_request_full(self):
         """Test valid request with all fields."""
@@ -61,6 +70,70 @@ class TestPortiaRunRequest:
         with pytest.raises(ValidationError):
             PortiaRunRequest(query="test", tools="not_a_list")  # type: ignore[arg-type]  # Should be list
 
+    def test_invalid_request_timeout(self):
+        """Test that timeouts must be positive."""
+        with pytest.raises(ValidationError):
+            PortiaRunRequest(query="test", timeout=0)
+
+    def test_invalid_request_query_too_long(self):
+        """Test that the query length is capped."""
+        PortiaRunRequest(query="x" * MAX_QUERY_LENGTH)
+        with pytest.raises(ValidationError):
+            PortiaRunRequest(query="x" * (MAX_QUERY_LENGTH + 1))
+
+    def test_invalid_request_plan_run_inputs_too_large(self):
+        """Test that the serialized size of plan run inputs is capped."""
+        with pytest.raises(ValidationError, match="plan_run_inputs"):
+            PortiaRunRequest(
+                query="test", plan_run_inputs={"$blob": "x" * MAX_PLAN_RUN_INPUTS_SIZE}
+            )
+
+    def test_request_priority(self):
+        """Test that only the known priority lanes are accepted."""
+        assert (
+            PortiaRunRequest(query="q", priority="interactive").priority == RunPriority.INTERACTIVE
+        )
+        with pytest.raises(ValidationError):
+            PortiaRunRequest(query="q", priority="urgent")
+
+
+class TestPortiaBatchRunRequest:
+    """Test the PortiaBatchRunRequest schema."""
+
+    def test_valid_batch_request(self):
+        """Test valid batch request with defaults."""
+        request = PortiaBatchRunRequest(requests=[{"query": "a"}, {"query": "b"}])  # type: ignore[list-item]
+        assert len(request.requests) == 2
+        assert request.requests[0].query == "a"
+        assert request.concurrency is None
+        assert request.stream is False
+
+    def test_invalid_batch_request_empty(self):
+        """Test that an empty batch is rejected."""
+        with pytest.raises(ValidationError):
+            PortiaBatchRunRequest(requests=[])
+
+    def test_invalid_batch_request_concurrency(self):
+        """Test that concurrency must be positive."""
+        with pytest.raises(ValidationError):
+            PortiaBatchRunRequest(requests=[{"query": "a"}], concurrency=0)  # type: ignore[list-item]
+
+
+class TestPortiaClarificationRequest:
+    """Test PortiaClarificationRequest schema."""
+
+    def test_valid_clarification_request(self):
+        """Test that any JSON value is accepted as the answer."""
+        assert PortiaClarificationRequest(response="yes").response == "yes"
+        assert PortiaClarificationRequest(response={"date": "2025-01-01"}).response == {
+            "date": "2025-01-01"
+        }
+
+    def test_invalid_clarification_request_missing_response(self):
+        """Test that the answer is required."""
+        with pytest.raises(ValidationError):
+            PortiaClarificationRequest()  # type: ignore[call-arg]
+
 
 class TestPortiaStatusResponse:
     """Test the PortiaStatusResponse schema."""
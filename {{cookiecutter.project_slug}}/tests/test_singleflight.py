@@ -0,0 +1,99 @@
+"""Tests for single-flight coalescing."""
+
+import asyncio
+
+import pytest
+
+from app.schemas import PortiaRunRequest
+from app.singleflight import SingleFlight, request_fingerprint
+
+
+class TestRequestFingerprint:
+    """Test request fingerprinting."""
+
+    def test_identical_requests_match(self):
+        """Test that key order inside inputs does not matter."""
+        first = PortiaRunRequest(query="q", plan_run_inputs={"$a": 1, "$b": 2})
+        second = PortiaRunRequest(query="q", plan_run_inputs={"$b": 2, "$a": 1})
+        assert request_fingerprint(first) == request_fingerprint(second)
+
+    def test_different_requests_differ(self):
+        """Test that any field change produces a different key."""
+        first = PortiaRunRequest(query="q", user_id="alice")
+        second = PortiaRunRequest(query="q", user_id="bob")
+        assert request_fingerprint(first) != request_fingerprint(second)
+
+
+class TestSingleFlight:
+    """Test the SingleFlight class."""
+
+    def test_concurrent_calls_share_one_execution(self):
+        """Test that concurrent callers with one key run the function once."""
+        group: SingleFlight[str] = SingleFlight()
+        calls = []
+
+        async def work():
+            calls.append(1)
+            await asyncio.sleep(0.05)
+            return "result"
+
+        async def scenario():
+            return await asyncio.gather(*(group.do("key", work) for _ in range(3)))
+
+        results = asyncio.run(scenario())
+        assert len(calls) == 1
+        assert [result for result, _ in results] == ["result"] * 3
+        assert sorted(shared for _, shared in results) == [False, True, True]
+        assert group.stats() == {"in_flight": 0, "executions": 1, "coalesced": 2}
+
+    def test_sequential_calls_execute_again(self):
+        """Test that results are not cached after the execution finishes."""
+        group: SingleFlight[int] = SingleFlight()
+        calls = []
+
+        async def work():
+            calls.append(1)
+            return len(calls)
+
+        async def scenario():
+            first = await group.do("key", work)
+            second = await group.do("key", work)
+            return first, second
+
+        assert asyncio.run(scenario()) == ((1, False), (2, False))
+
+    def test_errors_reach_every_caller(self):
+        """Test that a failed execution raises for all waiting callers."""
+        group: SingleFlight[str] = SingleFlight()
+
+        async def work():
+            await asyncio.sleep(0.01)
+            raise RuntimeError("boom")
+
+        async def scenario():
+            return await asyncio.gather(
+                group.do("key", work), group.do("key", work), return_exceptions=True
+            )
+
+        results = asyncio.run(scenario())
+        assert all(isinstance(result, RuntimeError) for result in results)
+        assert len(group) == 0
+
+    def test_cancelled_caller_does_not_cancel_others(self):
+        """Test that one caller going away leaves the shared execution running."""
+        group: SingleFlight[str] = SingleFlight()
+
+        async def work():
+            await asyncio.sleep(0.05)
+            return "result"
+
+        async def scenario():
+            leader = asyncio.create_task(group.do("key", work))
+            follower = asyncio.create_task(group.do("key", work))
+            await asyncio.sleep(0.01)
+            leader.cancel()
+            with pytest.raises(asyncio.CancelledError):
+                await leader
+            return await follower
+
+        assert asyncio.run(scenario()) == ("result", True)
@@ -0,0 +1,301 @@
+"""Tests for the bounded in-memory and SQLite storage."""
+
+import sqlite3
+import time
+
+import pytest
+from portia.errors import PlanNotFoundError, PlanRunNotFoundError
+from portia.execution_agents.output import AgentMemoryValue, LocalDataValue
+from portia.plan import Plan, PlanContext, Step
+from portia.plan_run import PlanRun, PlanRunState
+
+from app.storage import BoundedInMemoryStorage, PlanRunFilter, SQLiteStorage
+
+
+def _plan(query="Add two numbers"):
+    return Plan(plan_context=PlanContext(query=query, tool_ids=[]), steps=[])
+
+
+def _plan_run(plan, end_user_id="test_user"):
+    return PlanRun(plan_id=plan.id, end_user_id=end_user_id)
+
+
+class TestBoundedInMemoryStorage:
+    """Test the BoundedInMemoryStorage class."""
+
+    def test_round_trip(self):
+        """Test that stored plans and plan runs can be read back."""
+        storage = BoundedInMemoryStorage(max_entries=10, max_bytes=1_000_000, ttl=60)
+        plan = _plan()
+        plan_run = _plan_run(plan)
+        storage.save_plan(plan)
+        storage.save_plan_run(plan_run)
+
+        assert storage.get_plan(plan.id) == plan
+        assert storage.get_plan_run(plan_run.id) == plan_run
+        stats = storage.stats()
+        assert stats["plans"] == 1
+        assert stats["plan_runs"] == 1
+        assert stats["bytes"] > 0
+
+    def test_least_recently_used_evicted_by_count(self):
+        """Test that the least recently used entries go first when over max_entries."""
+        storage = BoundedInMemoryStorage(max_entries=2, max_bytes=1_000_000, ttl=60)
+        first, second, third = _plan("a"), _plan("b"), _plan("c")
+        storage.save_plan(first)
+        storage.save_plan(second)
+        storage.get_plan(first.id)
+        storage.save_plan(third)
+
+        assert storage.get_plan(first.id) == first
+        assert storage.get_plan(third.id) == third
+        with pytest.raises(PlanNotFoundError):
+            storage.get_plan(second.id)
+
+    def test_plan_outlives_its_runs(self):
+        """Test that runs are evicted before the plan they reference."""
+        storage = BoundedInMemoryStorage(max_entries=2, max_bytes=1_000_000, ttl=60)
+        plan = _plan()
+        first_run, second_run = _plan_run(plan), _plan_run(plan)
+        storage.save_plan(plan)
+        storage.save_plan_run(first_run)
+        storage.save_plan_run(second_run)
+
+        assert storage.get_plan(plan.id) == plan
+        assert storage.get_plan_run(second_run.id) == second_run
+        with pytest.raises(PlanRunNotFoundError):
+            storage.get_plan_run(first_run.id)
+
+    def test_outputs_count_towards_bytes(self):
+        """Test that large outputs push older runs out and are evicted with their run."""
+        plan = _plan()
+        probe = BoundedInMemoryStorage(max_entries=10, max_bytes=1_000_000, ttl=60)
+        probe.save_plan(plan)
+        probe.save_plan_run(_plan_run(plan))
+        base_size = probe.stats()["bytes"]
+
+        storage = BoundedInMemoryStorage(max_entries=10, max_bytes=base_size + 5_000, ttl=60)
+        storage.save_plan(plan)
+        old_run, new_run = _plan_run(plan), _plan_run(plan)
+        storage.save_plan_run(old_run)
+        storage.save_plan_run_output("$big", LocalDataValue(value="x" * 2_000), old_run.id)
+        storage.save_plan_run(new_run)
+        storage.save_plan_run_output("$big", LocalDataValue(value="y" * 4_000), new_run.id)
+
+        with pytest.raises(PlanRunNotFoundError):
+            storage.get_plan_run(old_run.id)
+        assert storage.get_plan_run(new_run.id) == new_run
+        assert old_run.id not in storage.outputs
+        assert storage.stats()["bytes"] <= base_size + 5_000 + len(new_run.model_dump_json())
+
+    def test_unused_entries_expire(self):
+        """Test that entries unused for longer than the TTL are dropped."""
+        storage = BoundedInMemoryStorage(max_entries=10, max_bytes=1_000_000, ttl=0.01)
+        plan = _plan()
+        storage.save_plan(plan)
+        time.sleep(0.02)
+
+        with pytest.raises(PlanNotFoundError):
+            storage.get_plan(plan.id)
+        assert len(storage) == 0
+        assert storage.stats()["bytes"] == 0
+
+    def test_invalid_limits(self):
+        """Test that the limits must be positive."""
+        with pytest.raises(ValueError):
+            BoundedInMemoryStorage(max_entries=0, max_bytes=1, ttl=60)
+
+
+class TestSQLiteStorage:
+    """Test the SQLiteStorage class."""
+
+    def test_round_trip(self, tmp_path):
+        """Test that stored plans, plan runs and outputs can be read back."""
+        storage = SQLiteStorage(tmp_path / "portia.sqlite3")
+        plan = _plan()
+        plan_run = _plan_run(plan)
+        output = LocalDataValue(value="3")
+        storage.save_plan(plan)
+        storage.save_plan_run(plan_run)
+        storage.save_plan_run_output("$result", output, plan_run.id)
+
+        assert storage.get_plan(plan.id) == plan
+        assert storage.plan_exists(plan.id)
+        assert storage.get_plan_by_query(plan.plan_context.query) == plan
+        assert storage.get_plan_run(plan_run.id) == plan_run
+        assert storage.get_plan_run_output("$result", plan_run.id) == output
+
+    def test_outputs_keep_their_type(self, tmp_path):
+        """Test that outputs read back as the type they were saved as, with their summary."""
+        storage = SQLiteStorage(tmp_path / "portia.sqlite3")
+        plan_run = _plan_run(_plan())
+        local = LocalDataValue(value="3", summary="The sum")
+        reference = AgentMemoryValue(
+            output_name="$report", plan_run_id=plan_run.id, summary="A long report"
+        )
+
+        saved = storage.save_plan_run_output("$sum", local, plan_run.id)
+        storage.save_plan_run_output("$report", reference, plan_run.id)
+
+        assert isinstance(saved, AgentMemoryValue)
+        assert saved.output_name == "$sum"
+        assert saved.summary == "The sum"
+        assert storage.get_plan_run_output("$sum", plan_run.id) == local
+        loaded = storage.get_plan_run_output("$report", plan_run.id)
+        assert type(loaded) is AgentMemoryValue
+        assert loaded.output_name == "$report"
+        assert loaded.summary == "A long report"
+
+    def test_persists_across_instances(self, tmp_path):
+        """Test that a new storage on the same file sees earlier writes."""
+        path = tmp_path / "portia.sqlite3"
+        plan = _plan()
+        plan_run = _plan_run(plan)
+        storage = SQLiteStorage(path)
+        storage.save_plan(plan)
+        storage.save_plan_run(plan_run)
+
+        reopened = SQLiteStorage(path)
+        assert reopened.get_plan(plan.id) == plan
+        assert reopened.get_plan_run(plan_run.id) == plan_run
+
+    def test_plan_runs_filtered_by_state(self, tmp_path):
+        """Test that plan runs are listed newest first and filtered by state."""
+        storage = SQLiteStorage(tmp_path / "portia.sqlite3")
+        plan = _plan()
+        first = _plan_run(plan)
+        second = _plan_run(plan)
+        storage.save_plan_run(first)
+        storage.save_plan_run(second)
+        second.state = PlanRunState.COMPLETE
+        storage.save_plan_run(second)
+
+        assert [run.id for run in storage.get_plan_runs().results] == [second.id, first.id]
+        completed = storage.get_plan_runs(PlanRunState.COMPLETE)
+        assert [run.id for run in completed.results] == [second.id]
+
+    def test_plan_runs_paged(self, tmp_path):
+        """Test that plan runs are listed a page at a time, with the total across pages."""
+        storage = SQLiteStorage(tmp_path / "portia.sqlite3", page_size=2)
+        plan = _plan()
+        runs = [_plan_run(plan) for _ in range(5)]
+        for run in runs:
+            storage.save_plan_run(run)
+
+        first = storage.get_plan_runs()
+        assert [run.id for run in first.results] == [runs[4].id, runs[3].id]
+        assert (first.count, first.current_page, first.total_pages) == (5, 1, 3)
+        last = storage.get_plan_runs(page=3)
+        assert [run.id for run in last.results] == [runs[0].id]
+        assert storage.get_plan_runs(page=4).results == []
+        assert storage.get_plan_runs(PlanRunState.COMPLETE).total_pages == 1
+
+    def test_wal_mode_and_indexes(self, tmp_path):
+        """Test that the database uses WAL mode and indexes plan-run lookups."""
+        path = tmp_path / "portia.sqlite3"
+        SQLiteStorage(path)
+
+        connection = sqlite3.connect(path)
+        try:
+            assert connection.execute("PRAGMA journal_mode").fetchone()[0] == "wal"
+            indexes = {row[1] for row in connection.execute("PRAGMA index_list(plan_runs)")}
+        finally:
+            connection.close()
+        assert {
+            "idx_plan_runs_end_user",
+            "idx_plan_runs_state",
+            "idx_plan_runs_created",
+        } <= indexes
+
+    def test_missing_entries(self, tmp_path):
+        """Test that missing plans and plan runs raise Portia's not-found errors."""
+        storage = SQLiteStorage(tmp_path / "portia.sqlite3")
+        plan = _plan()
+
+        with pytest.raises(PlanNotFoundError):
+            storage.get_plan(plan.id)
+        with pytest.raises(PlanRunNotFoundError):
+            storage.get_plan_run(_plan_run(plan).id)
+        assert not storage.plan_exists(plan.id)
+
+
+class TestPlanRunListing:
+    """Test listing plan-run summaries from either storage backend."""
+
+    @pytest.fixture(params=["memory", "sqlite"])
+    def storage(self, request, tmp_path):
+        """Storage holding three plan runs for alice that use a tool and two for bob."""
+        if request.param == "memory":
+            storage = BoundedInMemoryStorage(max_entries=100, max_bytes=1_000_000, ttl=60)
+        else:
+            storage = SQLiteStorage(tmp_path / "portia.sqlite3")
+
+        tool_plan = Plan(
+            plan_context=PlanContext(query="Add 1 and 2", tool_ids=["add_numbers"]),
+            steps=[Step(task="Add 1 and 2", output="$sum", tool_id="add_numbers")],
+        )
+        plain_plan = _plan("Tell a joke")
+        storage.save_plan(tool_plan)
+        storage.save_plan(plain_plan)
+        for plan, end_user_id in [
+            (tool_plan, "alice"),
+            (plain_plan, "bob"),
+            (tool_plan, "alice"),
+            (plain_plan, "bob"),
+            (tool_plan, "alice"),
+        ]:
+            storage.save_plan_run(_plan_run(plan, end_user_id))
+        completed = storage.get_plan_runs().results[0]
+        completed.state = PlanRunState.COMPLETE
+        storage.save_plan_run(completed)
+        return storage
+
+    def test_pages_cover_every_run_once(self, storage):
+        """Test that following cursors visits every plan run once, newest first."""
+        everything = storage.list_plan_run_summaries(PlanRunFilter(), limit=100)
+        assert len(everything.summaries) == 5
+        assert everything.next_cursor is None
+        created = [summary.created_at for summary in everything.summaries]
+        assert created == sorted(created, reverse=True)
+
+        seen = []
+        cursor = None
+        while True:
+            page = storage.list_plan_run_summaries(PlanRunFilter(), limit=2, cursor=cursor)
+            assert len(page.summaries) <= 2
+            seen.extend(summary.plan_run_id for summary in page.summaries)
+            cursor = page.next_cursor
+            if cursor is None:
+                break
+        assert seen == [summary.plan_run_id for summary in everything.summaries]
+
+    def test_filters(self, storage):
+        """Test filtering by end user, state, tool and creation time."""
+
+        def count(**filters):
+            return len(storage.list_plan_run_summaries(PlanRunFilter(**filters), 100).summaries)
+
+        assert count(end_user_id="alice") == 3
+        assert count(end_user_id="carol") == 0
+        assert count(state=PlanRunState.COMPLETE) == 1
+        assert count(tool_id="add_numbers") == 3
+        assert count(tool_id="add_numbers", end_user_id="bob") == 0
+        assert count(created_after=time.time() + 60) == 0
+        assert count(created_before=time.time() + 60) == 5
+
+    def test_summary_fields(self, storage):
+        """Test that summaries carry the run's user, state and query."""
+        summary = storage.list_plan_run_summaries(
+            PlanRunFilter(state=PlanRunState.COMPLETE), limit=1
+        ).summaries[0]
+        assert summary.state == "COMPLETE"
+        assert summary.updated_at >= summary.created_at
+        if summary.end_user_id == "alice":
+            assert summary.query == "Add 1 and 2"
+        else:
+            assert summary.query == "Tell a joke"
+
+    def test_invalid_cursor(self, storage):
+        """Test that malformed cursors are rejected."""
+        with pytest.raises(ValueError, match="Invalid cursor"):
+            storage.list_plan_run_summaries(PlanRunFilter(), limit=10, cursor="not-a-cursor")
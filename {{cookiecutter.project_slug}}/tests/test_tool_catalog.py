@@ -0,0 +1,136 @@
+"""Tests for the precomputed tool catalog."""
+
+import json
+from types import SimpleNamespace
+from unittest.mock import Mock
+
+import pytest
+from pydantic import BaseModel
+
+from app.tool_catalog import (
+    ToolIndex,
+    UnknownToolsError,
+    build_tool_catalog,
+    etag_matches,
+    get_tool_catalog,
+    get_tool_index,
+    invalidate_tool_catalog,
+)
+
+
+class _ReverseArgs(BaseModel):
+    text: str
+
+
+def _registry(*tool_ids):
+    tools = [
+        SimpleNamespace(
+            id=tool_id,
+            name=tool_id.title(),
+            description=f"The {tool_id} tool",
+            args_schema=_ReverseArgs,
+        )
+        for tool_id in tool_ids
+    ]
+    registry = Mock()
+    registry.get_tools.return_value = tools
+    return registry
+
+
+class TestBuildToolCatalog:
+    """Test catalog serialization."""
+
+    def test_catalog_contents(self):
+        """Test that the body and tool IDs describe every tool."""
+        catalog = build_tool_catalog(_registry("reverse_text", "add_numbers"))
+
+        assert catalog.tool_ids == ("reverse_text", "add_numbers")
+        tools = json.loads(catalog.body)
+        assert [tool["id"] for tool in tools] == ["reverse_text", "add_numbers"]
+        assert tools[0]["args_schema"]["properties"]["text"]["type"] == "string"
+
+    def test_etag_follows_content(self):
+        """Test that the ETag is stable for equal content and changes otherwise."""
+        first = build_tool_catalog(_registry("reverse_text"))
+        second = build_tool_catalog(_registry("reverse_text"))
+        third = build_tool_catalog(_registry("add_numbers"))
+
+        assert first.etag == second.etag
+        assert first.etag != third.etag
+
+
+class TestGetToolCatalog:
+    """Test catalog caching."""
+
+    def test_catalog_built_once_per_registry(self):
+        """Test that the registry is only read again after it is replaced."""
+        invalidate_tool_catalog()
+        registry = _registry("reverse_text")
+
+        first = get_tool_catalog(registry)
+        assert get_tool_catalog(registry) is first
+        assert registry.get_tools.call_count == 1
+
+        replacement = _registry("add_numbers")
+        assert get_tool_catalog(replacement).tool_ids == ("add_numbers",)
+
+    def test_invalidate(self):
+        """Test that invalidation forces a rebuild of the same registry."""
+        registry = _registry("reverse_text")
+        get_tool_catalog(registry)
+        invalidate_tool_catalog()
+        get_tool_catalog(registry)
+        assert registry.get_tools.call_count == 2
+
+
+class TestEtagMatches:
+    """Test If-None-Match handling."""
+
+    def test_matching(self):
+        """Test strong, weak, listed and wildcard matches."""
+        assert etag_matches('"abc"', '"abc"')
+        assert etag_matches('W/"abc"', '"abc"')
+        assert etag_matches('"xyz", "abc"', '"abc"')
+        assert etag_matches("*", '"abc"')
+
+    def test_not_matching(self):
+        """Test missing and stale validators."""
+        assert not etag_matches(None, '"abc"')
+        assert not etag_matches('"xyz"', '"abc"')
+
+
+class TestToolIndex:
+    """Test the ToolIndex class."""
+
+    def test_filter_keeps_registry_order(self):
+        """Test that filtered registries list tools in registry order."""
+        index = ToolIndex(_registry("reverse_text", "roll_dice", "add_numbers"))
+        filtered = index.filter(["add_numbers", "reverse_text", "add_numbers"])
+        assert [tool.id for tool in filtered.get_tools()] == ["reverse_text", "add_numbers"]
+
+    def test_filtered_registries_are_cached(self):
+        """Test that the same tool set reuses one registry, least recently used first out."""
+        index = ToolIndex(_registry("a", "b", "c"), max_filtered=2)
+
+        first = index.filter(["a", "b"])
+        assert index.filter(["b", "a"]) is first
+
+        index.filter(["c"])
+        index.filter(["a"])
+        assert index.filter(["a", "b"]) is not first
+
+    def test_unknown_ids_are_reported(self):
+        """Test that every unknown ID is reported even when others match."""
+        index = ToolIndex(_registry("reverse_text"))
+
+        with pytest.raises(UnknownToolsError) as exc_info:
+            index.filter(["reverse_text", "send_email", "delete_files"])
+
+        assert exc_info.value.unknown == ["delete_files", "send_email"]
+
+    def test_index_follows_registry(self):
+        """Test that the global index is rebuilt when the registry is replaced."""
+        registry = _registry("reverse_text")
+        index = get_tool_index(registry)
+        assert get_tool_index(registry) is index
+        assert get_tool_index(_registry("add_numbers")) is not index